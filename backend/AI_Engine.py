@@ -7,6 +7,13 @@ import new_app as app
 import numpy as np
 import cv2
 import rc_main
+import dup_index
+import photo_hash
+import asset_model
+import artifacts
+import video_verify
+import media
+import evidence
 
 client = MongoClient("mongodb://localhost:27017/")
 db = client["sih_database"]
@@ -23,6 +30,14 @@ def _read_cv2_image(file_bytes: bytes):
 
 # ======================= FIXED RETRIEVE FUNCTION =================
 def retrive(loan_id, user_id, process_id):
+    # inside a job every step gets the same bytes (and decoded artifacts)
+    j = artifacts.current_job()
+    if j is not None:
+        return j.fetch((loan_id, user_id, process_id), lambda: _retrive(loan_id, user_id, process_id))
+    return _retrive(loan_id, user_id, process_id)
+
+
+def _retrive(loan_id, user_id, process_id):
     loan = collection.find_one(
         {"loan_id": loan_id, "user_id": user_id},
         {"process": 1}
@@ -39,7 +54,7 @@ def retrive(loan_id, user_id, process_id):
         print("❌ Process ID not found")
         return None
 
-    file_id = selected.get("file_id")
+    file_id = media.media_id(selected)
     if not file_id:
         print("⚠ No file uploaded for this process yet")
         return None
@@ -51,6 +66,76 @@ def retrive(loan_id, user_id, process_id):
         return None
 
 
+# ======================= DUPLICATE DOCUMENTS =====================
+def flag_duplicates(loan_id, user_id, process_id, doc_type, response):
+    """
+    Index this document's OCR text and record near-duplicates from other
+    loans as duplicate_flags on both process records (officer review).
+    """
+    this_id = f"{loan_id}:{user_id}:{process_id}"
+    lines = (response.get("ocr_extracted") or {}).get("raw_ocr_lines") or []
+    try:
+        matches = dup_index.get_dup_index().check(
+            this_id,
+            {"loan_id": loan_id, "user_id": user_id, "process_id": process_id, "doc_type": doc_type},
+            lines,
+        )
+    except Exception as e:
+        print(f"Duplicate check failed: {e}")
+        return []
+
+    # always overwrite: a re-upload clears flags raised by the old file
+    collection.update_one(
+        {"loan_id": loan_id, "user_id": user_id, "process.id": process_id},
+        {"$set": {"process.$.duplicate_flags": matches}}
+    )
+    for m in matches:
+        other = {"loan_id": m["loan_id"], "user_id": m["user_id"], "process.id": m["process_id"]}
+        back = {"doc_id": this_id, "loan_id": loan_id, "user_id": user_id, "process_id": process_id,
+                "doc_type": doc_type, "similarity": m["similarity"], "shared_numbers": m["shared_numbers"]}
+        collection.update_one(other, {"$pull": {"process.$.duplicate_flags": {"doc_id": this_id}}})
+        collection.update_one(other, {"$push": {"process.$.duplicate_flags": back}})
+    evidence.note(duplicate_flags=len(matches))
+    if matches:
+        print(f"⚠ {this_id}: {len(matches)} possible duplicate(s) in other loans")
+    return matches
+
+
+# ======================= REUSED PHOTOS ===========================
+def flag_reused_photo(loan_id, user_id, process_id, file_id, img_bytes):
+    """
+    Index this asset photo's perceptual hash and record near-identical photos
+    from other loans as photo_reuse_flags on both process records.
+    """
+    this_id = f"{loan_id}:{user_id}:{process_id}"
+    try:
+        matches = photo_hash.get_photo_index().check(
+            this_id,
+            {"loan_id": loan_id, "user_id": user_id, "process_id": process_id, "file_id": str(file_id)},
+            img_bytes,
+        )
+    except Exception as e:
+        print(f"Photo reuse check failed: {e}")
+        return []
+
+    # always overwrite: a re-upload clears flags raised by the old photo
+    collection.update_one(
+        {"loan_id": loan_id, "user_id": user_id, "process.id": process_id},
+        {"$set": {"process.$.photo_reuse_flags": matches}}
+    )
+    for m in matches:
+        other = {"loan_id": m["loan_id"], "user_id": m["user_id"], "process.id": m["process_id"]}
+        back = {"photo_id": this_id, "loan_id": loan_id, "user_id": user_id, "process_id": process_id,
+                "file_id": str(file_id), "phash_distance": m["phash_distance"],
+                "dhash_distance": m["dhash_distance"]}
+        collection.update_one(other, {"$pull": {"process.$.photo_reuse_flags": {"photo_id": this_id}}})
+        collection.update_one(other, {"$push": {"process.$.photo_reuse_flags": back}})
+    evidence.note(photo_reuse_flags=len(matches))
+    if matches:
+        print(f"⚠ {this_id}: photo matches {len(matches)} upload(s) in other loans")
+    return matches
+
+
 # ======================= SEMANTIC ANALYSIS =======================
 def semantic_Analysis(loan_id, user_id, process_id):
     result = retrive(loan_id, user_id, process_id)
@@ -68,41 +153,17 @@ def CNN(loan_id, user_id, process_id):
     print(item_name)
     _,req=item_name.split("-")
     item_to_be_verified=req.lower().strip()
-    from ultralytics import YOLO
-    from PIL import Image
-    import torch
-    from io import BytesIO
-
     img_bytes = retrive(loan_id, user_id, process_id)
     if img_bytes is None:
         print("❌ No DB Image")
         return None
 
-    print("🔍 Loading CNN model...")
-    model = YOLO("best.pt")
-    core = model.model
-    core.eval()
-
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    core.to(device)
-
-    try:
-        img = Image.open(BytesIO(img_bytes)).convert("RGB")
-    except:
+    result = asset_model.predict(asset_model.get_classifier(), img_bytes)
+    if result is None:
         print("❌ Image decode failed")
         return None
-
-    img_resized = img.resize((224, 224))
-    arr = np.array(img_resized, dtype="float32") / 255.0
-    t = torch.tensor(arr).permute(2, 0, 1).unsqueeze(0).to(device)
-
-    with torch.no_grad():
-        logits = core(t)[0]
-        probs = torch.softmax(logits, dim=1)[0]
-        top = int(torch.argmax(probs))
-
-    prediction = model.names[top]
-    confidence = round(float(probs[top]) * 100, 2)
+    prediction, confidence = result
+    evidence.note(expected=item_to_be_verified, prediction=prediction, confidence=confidence)
 
     print(f"\n========= CNN RESULT =========")
     print(f" Prediction : {prediction}")
@@ -139,6 +200,8 @@ def invoice(loan_id, user_id, process_id):
         return 0
 
     response = app.verify("invoice", agreement, img_bytes)
+    flag_duplicates(loan_id, user_id, process_id, "invoice", response)
+    evidence.note(**evidence.document(response))
     return response["comparison"]["final_score"]
 
 
@@ -157,6 +220,8 @@ def fee_reciept(loan_id, user_id, process_id):
     if img_bytes is None: return 0
 
     response = app.verify("fees_receipt", agreement, img_bytes)
+    flag_duplicates(loan_id, user_id, process_id, "fees_receipt", response)
+    evidence.note(**evidence.document(response))
     return response["comparison"]["final_score"]
 
 
@@ -175,6 +240,8 @@ def verify_marksheet(loan_id, user_id, process_id):
     if img_bytes is None: return 0
 
     response = app.verify("marksheet", agreement, img_bytes)
+    flag_duplicates(loan_id, user_id, process_id, "marksheet", response)
+    evidence.note(**evidence.document(response))
     return response["comparison"]["final_score"]
 
 
@@ -193,8 +260,61 @@ def verify_student_id(loan_id, user_id, process_id):
     if img_bytes is None: return 0
 
     response = app.verify("student_id", agreement, img_bytes)
+    flag_duplicates(loan_id, user_id, process_id, "student_id", response)
+    evidence.note(**evidence.document(response))
     return response["comparison"]["final_score"]
 
+# ======================= COURSE CERTIFICATE ======================
+def verify_course_certificate(loan_id, user_id, process_id):
+
+    loan = collection.find_one({"loan_id": loan_id, "user_id": user_id}, {"_id": 0})
+    if not loan: return 0
+
+    agreement = {
+        "name": loan.get("applicant_name"),
+        "course_name": loan.get("course_name"),
+        "provider": loan.get("course_provider_name")
+    }
+
+    img_bytes = retrive(loan_id, user_id, process_id)
+    if img_bytes is None: return 0
+
+    response = app.verify("course_certificate", agreement, img_bytes)
+    flag_duplicates(loan_id, user_id, process_id, "course_certificate", response)
+    evidence.note(**evidence.document(response))
+    return response["comparison"]["final_score"]
+
+# ======================= 360 MOVEMENT VIDEO ======================
+def verify_video(loan_id, user_id, process_id):
+    loan = collection.find_one({"loan_id": loan_id, "user_id": user_id}, {"loan_type": 1, "process": 1})
+    if not loan: return 0
+    selected = next((p for p in loan.get("process") or [] if p.get("id") == process_id), None)
+    if not selected or not selected.get("file_id"):
+        print("⚠ No video uploaded for this process yet")
+        return 0
+
+    req = (loan.get("loan_type") or "").split("-")[-1]
+
+    # streamed from GridFS: never read() whole, a 360 video can be hundreds of MB
+    try:
+        video = fs.get(ObjectId(media.media_id(selected)))
+    except Exception:
+        print("❌ Invalid GridFS ObjectId format")
+        return 0
+    try:
+        result = video_verify.verify_stream(video, req)
+    finally:
+        video.close()
+
+    collection.update_one(
+        {"loan_id": loan_id, "user_id": user_id, "process.id": process_id},
+        {"$set": {"process.$.video_analysis": result}}
+    )
+    evidence.note(**evidence.video(result))
+    print(f"🎥 {process_id}: {result.get('keyframes', 0)} keyframes, labels {result.get('labels')}, score {result['score']}")
+    return result["score"]
+
+
 # ======================= RC VERIFICATION ===========================
 def verify_rc(loan_id, user_id, process_id):
     # 1) Fetch loan
@@ -230,17 +350,39 @@ def verify_rc(loan_id, user_id, process_id):
     )
 
     # 5) Return final result
+    evidence.note(**evidence.rc(result))
     if result["status"]:
         return 100
     return 0
 
 
 
+# ======================= STEPS ===================================
+# processid entries of a process -> verification step
+STEPS = {
+    1: CNN,
+    2: invoice,
+    3: verify_marksheet,
+    4: fee_reciept,
+    5: verify_student_id,
+    6: verify_rc,
+    7: semantic_Analysis,
+    8: verify_course_certificate,
+    9: verify_video,
+    # add other steps as needed
+}
+
+
 # ======================= TEST ============================
 #print(invoice(loan_id="Mithun", user_id="9876543210", process_id="P1"))
+
 def main(loan_id, user_id, process_id):
     print("Starting AI Engine...")
+    with artifacts.job(), evidence.run():
+        return _run_steps(loan_id, user_id, process_id)
 
+
+def _run_steps(loan_id, user_id, process_id):
     # find loan with full process list (we need the index)
     loan = collection.find_one(
         {"loan_id": loan_id, "user_id": user_id},
@@ -261,36 +403,51 @@ def main(loan_id, user_id, process_id):
     # compute total score by reading the processid list from that element
     selected = proc_list[idx]
     process_steps = selected.get("processid", [])
+    try:
+        media.ingest(collection, fs, loan_id, user_id, selected)
+    except Exception as e:
+        print(f"Media normalization failed: {e}")
+    # asset photos only: ID / RC / receipt / certificate images share templates across loans
+    if 1 in process_steps and selected.get("data_type") == "image" and selected.get("file_id"):
+        img_bytes = retrive(loan_id, user_id, process_id)
+        if img_bytes:
+            flag_reused_photo(loan_id, user_id, process_id, selected["file_id"], img_bytes)
     total_score = 0
-    for step in process_steps:
-        if step == 1:
-            total_score += CNN(loan_id, user_id, process_id)
-        elif step == 2:
-            total_score += invoice(loan_id, user_id, process_id)
-        elif step == 3:
-            total_score += verify_marksheet(loan_id, user_id, process_id)
-        elif step == 4:
-            total_score += fee_reciept(loan_id, user_id, process_id)
-        elif step == 5:
-            total_score += verify_student_id(loan_id, user_id, process_id)
-        elif step == 6:
-            total_score += verify_rc(loan_id, user_id, process_id)
-        elif step == 7:
-            total_score += semantic_Analysis(loan_id, user_id, process_id)
-        # add other steps as needed
-
-    # Now update the exact array element by index
-    score_field = f"process.{idx}.score"
-
-    res = collection.update_one(
-        {"loan_id": loan_id, "user_id": user_id},
-        {"$set": {score_field: total_score}}
-    )
-
-    if res.modified_count:
-        print(f"Updated loan {loan_id} process[{idx}] with score {total_score}")
-    else:
-        print("Update did not modify any document (check filter)")
+    run = evidence.current_run() or evidence.Run()
+    error = None
+    try:
+        for step in process_steps:
+            fn = STEPS.get(step)
+            if fn is None:
+                continue
+            with run.step(step, fn.__name__) as rec:
+                score = fn(loan_id, user_id, process_id)
+                rec["score"] = score
+                total_score += score
+
+        # Now update the exact array element by index
+        score_field = f"process.{idx}.score"
+
+        res = collection.update_one(
+            {"loan_id": loan_id, "user_id": user_id},
+            {"$set": {score_field: total_score}}
+        )
+
+        if res.modified_count:
+            print(f"Updated loan {loan_id} process[{idx}] with score {total_score}")
+        else:
+            print("Update did not modify any document (check filter)")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # the why behind the score, so officer views never re-run OCR;
+        # failed runs most of all
+        try:
+            evidence.get_evidence_store(db).save(loan_id, user_id, selected,
+                                                 None if error else total_score, run, error=error)
+        except Exception as e:
+            print(f"Saving verification evidence failed: {e}")
 
     return total_score
 
@@ -0,0 +1,136 @@
+"""
+Decoded-image artifacts shared by the verification steps of one upload.
+
+A job (AI_Engine.main for one process) fetches the upload's bytes from GridFS
+once and registers an ImageArtifacts for them. Every step that is handed
+those same bytes (CNN, document OCR, plate OCR, photo hashing) asks
+for_bytes() for the variant it needs. Each variant is decoded / computed on
+first use and memoized for the rest of the job:
+
+    bgr        cv2.imdecode (EXIF orientation applied)
+    rgb        channel-reversed view of bgr (no copy)
+    gray       one cvtColor of bgr
+    resized    bgr resized with INTER_AREA, per size (RGB view)
+    binarized  preprocess.preprocess_image(bgr): the document-OCR input
+
+Arrays are read-only: they are shared, so callers copy before drawing on
+them. Outside a job for_bytes() still works, it just isn't shared.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+import cv2
+
+from preprocess import preprocess_image
+
+
+def _frozen(arr):
+    if isinstance(arr, np.ndarray):
+        arr.setflags(write=False)
+    return arr
+
+
+class ImageArtifacts:
+    def __init__(self, data: bytes):
+        self.data = data
+        self._memo: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, make: Callable[[], Any]):
+        """Memoized make() under key; callers add their own derived variants this way."""
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = _frozen(make())
+            return self._memo[key]
+
+    @property
+    def bgr(self) -> Optional[np.ndarray]:
+        return self.get("bgr", lambda: cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR))
+
+    @property
+    def rgb(self) -> Optional[np.ndarray]:
+        bgr = self.bgr
+        return None if bgr is None else bgr[..., ::-1]
+
+    @property
+    def gray(self) -> Optional[np.ndarray]:
+        return self.get("gray", lambda: None if self.bgr is None else cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, w: int, h: int) -> Optional[np.ndarray]:
+        """RGB at (w, h)."""
+        bgr = self.get(("resized", w, h), lambda: None if self.bgr is None
+                       else cv2.resize(self.bgr, (w, h), interpolation=cv2.INTER_AREA))
+        return None if bgr is None else bgr[..., ::-1]
+
+    @property
+    def binarized(self) -> Optional[np.ndarray]:
+        return self.get("binarized", lambda: preprocess_image(self.bgr))
+
+    def computed(self):
+        return sorted(str(k) for k in self._memo)
+
+
+# ===========================================================
+#   JOBS
+# ===========================================================
+# id(bytes) -> artifacts of bytes fetched by running jobs. Keyed by identity so
+# lookups from OCR pool threads need neither a hash of the upload nor the job.
+_live: Dict[int, ImageArtifacts] = {}
+_live_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self):
+        self._fetched: Dict[Hashable, Optional[bytes]] = {}
+        self._ids = []
+
+    def fetch(self, key: Hashable, load: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """load() once per key for this job; the bytes get a shared ImageArtifacts."""
+        if key in self._fetched:
+            return self._fetched[key]
+        data = load()
+        self._fetched[key] = data
+        if data:
+            with _live_lock:
+                _live[id(data)] = ImageArtifacts(data)
+            self._ids.append(id(data))
+        return data
+
+    def close(self):
+        with _live_lock:
+            for i in self._ids:
+                _live.pop(i, None)
+        self._ids = []
+        self._fetched.clear()
+
+
+_job: ContextVar[Optional[Job]] = ContextVar("artifacts_job", default=None)
+
+
+@contextmanager
+def job():
+    j = Job()
+    token = _job.set(j)
+    try:
+        yield j
+    finally:
+        _job.reset(token)
+        j.close()
+
+
+def current_job() -> Optional[Job]:
+    return _job.get()
+
+
+def for_bytes(data: bytes) -> ImageArtifacts:
+    a = _live.get(id(data))
+    if a is not None and a.data is data:
+        return a
+    return ImageArtifacts(data)
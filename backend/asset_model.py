@@ -0,0 +1,293 @@
+"""
+Asset photo classifier (AI_Engine.CNN) behind a selectable inference backend.
+
+    torch  - ultralytics YOLO classifier from best.pt (default; needs torch)
+    onnx   - the same network exported to ONNX, run by ONNX Runtime on the CPU;
+             workers need only onnxruntime, numpy and cv2
+
+CNN_BACKEND picks one; CNN_MODEL / CNN_ONNX name the weights and CNN_THREADS
+sets the intra-op threads (default: all cores). Both backends share the
+preprocessing (the job's decoded RGB from artifacts, 224x224, /255, CHW)
+and the softmax over the network output, so their predictions and
+confidences agree.
+
+    python asset_model.py export --pt best.pt --out best.onnx
+    python asset_model.py export --pt best.pt --out best.int8.onnx --int8 --calib photos/
+"""
+import os
+import sys
+import ast
+import inspect
+import json
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import cv2
+
+import artifacts
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+CNN_BACKEND = os.environ.get("CNN_BACKEND", "torch").strip().lower()
+CNN_MODEL = os.environ.get("CNN_MODEL", "best.pt")
+CNN_ONNX = os.environ.get("CNN_ONNX", "best.onnx")
+CNN_THREADS = int(os.environ.get("CNN_THREADS", str(os.cpu_count() or 1)))
+
+IMG_SIZE = 224
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+# ===========================================================
+#   PRE / POST PROCESSING
+# ===========================================================
+def _to_batch(rgb: np.ndarray) -> np.ndarray:
+    arr = rgb.transpose(2, 0, 1)[None].astype(np.float32)
+    arr *= 1.0 / 255.0
+    return arr
+
+
+def preprocess(img_bytes: bytes) -> Optional[np.ndarray]:
+    """1x3x224x224 float32 batch, or None if the bytes don't decode."""
+    rgb = artifacts.for_bytes(img_bytes).resized(IMG_SIZE, IMG_SIZE)
+    return None if rgb is None else _to_batch(rgb)
+
+
+def preprocess_frame(bgr: np.ndarray) -> np.ndarray:
+    """Same batch from an already decoded BGR frame (video keyframes)."""
+    return _to_batch(cv2.resize(bgr, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)[..., ::-1])
+
+
+def softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _parse_names(raw) -> Dict[int, str]:
+    # ours is JSON; ultralytics' own exports store a Python dict repr
+    if isinstance(raw, dict):
+        names = raw
+    else:
+        try:
+            names = json.loads(raw)
+        except ValueError:
+            names = ast.literal_eval(raw)
+    if isinstance(names, list):
+        names = dict(enumerate(names))
+    return {int(k): str(v) for k, v in names.items()}
+
+
+# ===========================================================
+#   BACKENDS
+# ===========================================================
+def _head_logits(out):
+    # ultralytics' Classify head in eval mode returns (probabilities, logits);
+    # in export mode, and in older releases, probabilities only. softmax(log p) == p.
+    if isinstance(out, (tuple, list)):
+        return out[1]
+    return out.clamp_min(1e-12).log()
+
+
+class TorchClassifier:
+    name = "torch"
+
+    def __init__(self, path: str = CNN_MODEL, threads: int = CNN_THREADS):
+        import torch
+        from ultralytics import YOLO
+
+        torch.set_num_threads(max(1, threads))
+        self._torch = torch
+        model = YOLO(path)
+        self.names = _parse_names(model.names)
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.core = model.model.eval().to(self.device)
+
+    def logits(self, batch: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.no_grad():
+            out = _head_logits(self.core(torch.from_numpy(batch).to(self.device)))
+        return out.float().cpu().numpy()
+
+
+class OnnxClassifier:
+    name = "onnx"
+
+    def __init__(self, path: str = CNN_ONNX, threads: int = CNN_THREADS):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = max(1, threads)
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if "names" not in meta:
+            raise ValueError(f"{path} has no class names in its metadata; export it with asset_model.py")
+        self.names = _parse_names(meta["names"])
+
+    def logits(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def predict(clf, img_bytes: bytes) -> Optional[Tuple[str, float]]:
+    """(class name, confidence %) for one photo, or None if it doesn't decode."""
+    batch = preprocess(img_bytes)
+    if batch is None:
+        return None
+    probs = softmax(clf.logits(batch))[0]
+    top = int(np.argmax(probs))
+    return clf.names[top], round(float(probs[top]) * 100, 2)
+
+
+def _resolve(path: str) -> str:
+    return path if os.path.isabs(path) or os.path.exists(path) else os.path.join(_HERE, path)
+
+
+def make_classifier(backend: str = CNN_BACKEND, threads: int = CNN_THREADS):
+    if backend == "onnx":
+        return OnnxClassifier(_resolve(CNN_ONNX), threads)
+    return TorchClassifier(_resolve(CNN_MODEL), threads)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = make_classifier()
+                print(f"Asset classifier: {_classifier.name} backend, {CNN_THREADS} threads")
+    return _classifier
+
+
+def set_classifier(clf):
+    global _classifier
+    _classifier = clf
+
+
+# ===========================================================
+#   EXPORT
+# ===========================================================
+def image_files(folder: str, limit: int = 0) -> List[str]:
+    files = sorted(
+        os.path.join(root, f)
+        for root, _, names in os.walk(folder)
+        for f in names if f.lower().endswith(_IMAGE_EXTS)
+    )
+    return files[:limit] if limit else files
+
+
+def _set_names(path: str, names: Dict[int, str]):
+    import onnx
+
+    model = onnx.load(path)
+    for p in list(model.metadata_props):
+        if p.key == "names":
+            model.metadata_props.remove(p)
+    model.metadata_props.add(key="names", value=json.dumps({str(k): v for k, v in names.items()}))
+    onnx.save(model, path)
+
+
+class _CalibrationReader:
+    """Feeds preprocessed calibration photos to quantize_static, one per call."""
+
+    def __init__(self, input_name: str, files: List[str]):
+        self.input_name = input_name
+        self._it: Iterator[np.ndarray] = self._batches(files)
+
+    @staticmethod
+    def _batches(files):
+        for f in files:
+            with open(f, "rb") as fh:
+                batch = preprocess(fh.read())
+            if batch is not None:
+                yield batch
+
+    def get_next(self):
+        batch = next(self._it, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def export(pt_path: str, out_path: str, int8: bool = False, calib: Optional[str] = None,
+           calib_limit: int = 200, opset: int = 17) -> str:
+    """
+    Export best.pt to ONNX (fp32, or int8 QDQ calibrated on the photos under
+    calib). The graph returns exactly what TorchClassifier.logits does.
+    """
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO(pt_path)
+    names = _parse_names(model.names)
+    core = model.model.float().eval()
+
+    class _Head(torch.nn.Module):
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, x):
+            return _head_logits(self.net(x))
+
+    fp32_path = out_path if not int8 else os.path.splitext(out_path)[0] + ".fp32.onnx"
+    dummy = torch.zeros(1, 3, IMG_SIZE, IMG_SIZE)
+    # torch >= 2.9 defaults to the dynamo exporter (needs onnxscript, ignores
+    # dynamic_axes); the TorchScript exporter handles this plain CNN fine
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        _Head(core), dummy, fp32_path, opset_version=opset,
+        input_names=["images"], output_names=["output"],
+        dynamic_axes={"images": {0: "batch"}, "output": {0: "batch"}}, **legacy,
+    )
+    _set_names(fp32_path, names)
+    print(f"Exported {pt_path} -> {fp32_path}")
+    if not int8:
+        return fp32_path
+
+    if not calib:
+        raise ValueError("--int8 needs --calib: a folder of representative asset photos")
+    files = image_files(calib, calib_limit)
+    if not files:
+        raise ValueError(f"no images under {calib}")
+
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prep_path = os.path.splitext(out_path)[0] + ".prep.onnx"
+    quant_pre_process(fp32_path, prep_path)
+    quantize_static(
+        prep_path, out_path, _CalibrationReader("images", files),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        activation_type=QuantType.QInt8, weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    os.remove(prep_path)
+    _set_names(out_path, names)
+    print(f"Quantized to int8 on {len(files)} photos -> {out_path}")
+    return out_path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Asset classifier export")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="convert best.pt to ONNX (optionally int8)")
+    ex.add_argument("--pt", default=_resolve(CNN_MODEL))
+    ex.add_argument("--out", default=os.path.join(_HERE, "best.onnx"))
+    ex.add_argument("--int8", action="store_true", help="static int8 quantization (needs --calib)")
+    ex.add_argument("--calib", help="folder of calibration photos")
+    ex.add_argument("--calib-limit", type=int, default=200)
+    ex.add_argument("--opset", type=int, default=17)
+    args = ap.parse_args(argv)
+
+    export(args.pt, args.out, int8=args.int8, calib=args.calib, calib_limit=args.calib_limit, opset=args.opset)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
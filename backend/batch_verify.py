@@ -0,0 +1,258 @@
+"""
+Batch re-verification of RC plate photos (quarterly audits).
+
+Streams images from a directory or GridFS, runs plate OCR in a process pool
+(one single-threaded Tesseract per core), looks the plates up in the registry
+in batches and runs compare_officer_vs_api, writing one NDJSON line per image
+plus a final summary line with throughput and per-stage timing.
+
+    python -m batch_verify --dir audits/q3 --manifest audits/q3.csv --out q3.ndjson
+    python -m batch_verify --gridfs --ids-file ids.txt --workers 32
+
+The manifest (CSV or NDJSON) maps an image id (file name relative to --dir,
+or GridFS file id) to the officer-entered fields: name, address, phone,
+vehicle_make, vehicle_model, vehicle_color.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from registry import get_registry, RegistryError
+from rc_main import OFFICER_FIELDS, officer_result, _registry_down
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+LOOKUP_BATCH = int(os.environ.get("BATCH_LOOKUP_SIZE", "256"))
+
+Item = Tuple[str, bytes]
+
+
+# ===========================================================
+#   SOURCES
+# ===========================================================
+def iter_dir(path: str) -> Iterator[Item]:
+    for root, _, files in os.walk(path):
+        for fn in sorted(files):
+            if fn.lower().endswith(IMAGE_EXTS):
+                full = os.path.join(root, fn)
+                with open(full, "rb") as f:
+                    yield os.path.relpath(full, path), f.read()
+
+
+def iter_gridfs(file_ids: Optional[Iterable[str]] = None, filename_regex: Optional[str] = None) -> Iterator[Item]:
+    from bson.objectid import ObjectId
+    from db_service import fs
+
+    if file_ids is not None:
+        for fid in file_ids:
+            fid = str(fid).strip()
+            if not fid:
+                continue
+            try:
+                yield fid, fs.get(ObjectId(fid)).read()
+            except Exception as e:
+                print(f"Skipping GridFS file {fid}: {e}", file=sys.stderr)
+        return
+
+    query = {"filename": {"$regex": filename_regex, "$options": "i"}} if filename_regex else {}
+    for f in fs.find(query, no_cursor_timeout=True):
+        yield str(f._id), f.read()
+
+
+def load_manifest(path: Optional[str]) -> Dict[str, Dict[str, str]]:
+    if not path:
+        return {}
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    return {str(r.get("id") or r.get("file_id") or r.get("file") or ""): r for r in rows}
+
+
+def officer_input_for(row: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    row = row or {}
+    return {k: str(row.get(k) or "") for k in OFFICER_FIELDS}
+
+
+# ===========================================================
+#   WORKERS
+# ===========================================================
+def _init_worker():
+    # one core per process: let the pool, not Tesseract's OpenMP, do the fan-out
+    from ocr_engine import set_tesseract_threads
+    set_tesseract_threads(1)
+
+
+def _ocr_one(item: Item):
+    from ocr_plate import ocr_plate_bytes
+
+    item_id, img_bytes = item
+    t0 = time.perf_counter()
+    try:
+        plate = ocr_plate_bytes(img_bytes)
+    except RegistryError as e:
+        plate = {"text": "", "vehicle_no": "", "variant": None, "psm": None, "registry_error": str(e)}
+    except Exception as e:
+        plate = {"text": "", "vehicle_no": "", "variant": None, "psm": None, "error": str(e)}
+    return item_id, plate, (time.perf_counter() - t0) * 1000.0
+
+
+# ===========================================================
+#   PIPELINE
+# ===========================================================
+class BatchStats:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.started = time.perf_counter()
+        self.images = 0
+        self.codes = Counter()
+        self.stage_s = Counter()
+
+    def summary(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self.started
+        return {
+            "summary": True,
+            "images": self.images,
+            "verified": self.codes["OK"],
+            "by_code": dict(self.codes),
+            "workers": self.workers,
+            "wall_s": round(wall, 3),
+            "images_per_s": round(self.images / wall, 2) if wall > 0 else 0.0,
+            # ocr is summed over workers; divide by workers for its share of wall time
+            "stage_s": {k: round(v, 3) for k, v in self.stage_s.items()},
+        }
+
+
+def _finish(done, manifest, stats: BatchStats):
+    """Registry lookup for a batch of OCR results, then compare each one."""
+    plates = [p["vehicle_no"] for _, p, _ in done if p["vehicle_no"]]
+    t0 = time.perf_counter()
+    down = None
+    try:
+        vehicles = get_registry().get_many(plates) if plates else {}
+    except RegistryError as e:
+        vehicles, down = {}, e
+    lookup_s = time.perf_counter() - t0
+    stats.stage_s["lookup"] += lookup_s
+    lookup_ms = lookup_s * 1000.0 / max(1, len(done))
+
+    for item_id, plate, ocr_ms in done:
+        t1 = time.perf_counter()
+        if plate.get("registry_error"):
+            res = _registry_down(RegistryError(plate.pop("registry_error")))
+        elif down is not None and plate["vehicle_no"]:
+            res = _registry_down(down, vehicle_no=plate["vehicle_no"], plate=plate)
+        else:
+            res = officer_result(plate, vehicles.get(plate["vehicle_no"]),
+                                 officer_input_for(manifest.get(item_id)))
+        compare_ms = (time.perf_counter() - t1) * 1000.0
+        stats.stage_s["compare"] += compare_ms / 1000.0
+        stats.images += 1
+        stats.codes[res.get("error_code") or "OK"] += 1
+        yield {
+            "id": item_id,
+            **res,
+            "timings_ms": {"ocr": round(ocr_ms, 1), "lookup": round(lookup_ms, 2), "compare": round(compare_ms, 2)},
+        }
+
+
+def run_batch(items: Iterable[Item], manifest: Optional[Dict[str, Dict[str, Any]]] = None,
+              workers: Optional[int] = None, lookup_batch: int = LOOKUP_BATCH,
+              stats: Optional[BatchStats] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one result per image (verify_officer's response + "id" and
+    "timings_ms") as soon as its lookup batch is done. Results come back in
+    completion order. At most 4 images per worker are held in memory at a time.
+    """
+    manifest = manifest or {}
+    workers = workers or os.cpu_count() or 1
+    stats = stats or BatchStats(workers)
+    window = workers * 4
+
+    # spawn: the server process holds a MongoClient, which is not fork-safe
+    ctx = multiprocessing.get_context("spawn")
+    src = iter(items)
+    inflight = set()
+    done = []
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+        while True:
+            while not exhausted and len(inflight) < window:
+                t0 = time.perf_counter()
+                try:
+                    item = next(src)
+                except StopIteration:
+                    exhausted = True
+                    break
+                finally:
+                    stats.stage_s["read"] += time.perf_counter() - t0
+                inflight.add(pool.submit(_ocr_one, item))
+
+            if not inflight:
+                break
+
+            finished, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                item_id, plate, ocr_ms = fut.result()
+                stats.stage_s["ocr"] += ocr_ms / 1000.0
+                done.append((item_id, plate, ocr_ms))
+
+            if len(done) >= lookup_batch or (exhausted and not inflight):
+                yield from _finish(done, manifest, stats)
+                done = []
+
+    if done:
+        yield from _finish(done, manifest, stats)
+
+
+# ===========================================================
+#   CLI
+# ===========================================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch plate verification (NDJSON out)")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dir", help="directory of plate photos (walked recursively)")
+    src.add_argument("--gridfs", action="store_true", help="read photos from GridFS")
+    ap.add_argument("--ids-file", help="GridFS file ids, one per line (default: every file)")
+    ap.add_argument("--filename-regex", help="GridFS filename filter when no --ids-file is given")
+    ap.add_argument("--manifest", help="CSV/NDJSON with id + officer-entered fields")
+    ap.add_argument("--out", help="output NDJSON (default: stdout)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--lookup-batch", type=int, default=LOOKUP_BATCH)
+    args = ap.parse_args(argv)
+
+    if args.dir:
+        items = iter_dir(args.dir)
+    else:
+        ids = None
+        if args.ids_file:
+            with open(args.ids_file, encoding="utf-8") as f:
+                ids = [line.strip() for line in f if line.strip()]
+        items = iter_gridfs(ids, args.filename_regex)
+
+    stats = BatchStats(args.workers)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for res in run_batch(items, load_manifest(args.manifest), args.workers, args.lookup_batch, stats):
+            out.write(json.dumps(res, default=str) + "\n")
+        summary = stats.summary()
+        out.write(json.dumps(summary) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
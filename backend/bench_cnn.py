@@ -0,0 +1,107 @@
+"""
+Benchmark: asset classifier on PyTorch vs ONNX Runtime (fp32 / int8).
+
+Each backend runs in its own process so import and model memory are measured
+separately. Reports load time, per-photo latency, peak RSS, and top-1
+agreement / max probability difference against the torch backend.
+
+    python bench_cnn.py --images photos/ --onnx best.onnx best.int8.onnx
+    python bench_cnn.py --images photos/ --onnx best.int8.onnx --threads 4 --runs 3
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+
+import asset_model
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def _worker(backend, path, threads, files, runs, out):
+    t0 = time.perf_counter()
+    if backend == "onnx":
+        clf = asset_model.OnnxClassifier(path, threads)
+    else:
+        clf = asset_model.TorchClassifier(path, threads)
+    load_s = time.perf_counter() - t0
+    rss_loaded = _rss_mb()
+
+    batches = []
+    for f in files:
+        with open(f, "rb") as fh:
+            b = asset_model.preprocess(fh.read())
+        if b is not None:
+            batches.append(b)
+
+    clf.logits(batches[0])  # warm-up
+    lat, probs = [], []
+    for r in range(runs):
+        for b in batches:
+            t = time.perf_counter()
+            p = asset_model.softmax(clf.logits(b))[0]
+            lat.append(time.perf_counter() - t)
+            if r == 0:
+                probs.append(p)
+
+    out.put({
+        "load_s": load_s,
+        "lat": lat,
+        "probs": np.stack(probs),
+        "rss_loaded_mb": rss_loaded,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    })
+
+
+def run(backend, path, threads, files, runs):
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_worker, args=(backend, path, threads, files, runs, q))
+    p.start()
+    res = q.get()
+    p.join()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", required=True, help="folder of asset photos")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--pt", default=asset_model.CNN_MODEL)
+    ap.add_argument("--onnx", nargs="*", default=[asset_model.CNN_ONNX])
+    ap.add_argument("--threads", type=int, default=asset_model.CNN_THREADS)
+    ap.add_argument("--runs", type=int, default=2, help="passes over the photos")
+    args = ap.parse_args()
+
+    files = asset_model.image_files(args.images, args.limit)
+    if not files:
+        raise SystemExit(f"no images under {args.images}")
+    print(f"{len(files)} photos x {args.runs} runs, {args.threads} threads\n")
+
+    results = [("torch", args.pt, run("torch", args.pt, args.threads, files, args.runs))]
+    for path in args.onnx:
+        results.append(("onnx", path, run("onnx", path, args.threads, files, args.runs)))
+
+    ref = results[0][2]["probs"]
+    ref_top = ref.argmax(axis=1)
+    print(f"{'backend':8s} {'model':28s} {'load s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'img/s':>7s} "
+          f"{'rss MB':>8s} {'peak MB':>8s} {'top-1 agree':>12s} {'max |dp|':>9s}")
+    for backend, path, r in results:
+        lat = np.array(r["lat"]) * 1e3
+        agree = float((r["probs"].argmax(axis=1) == ref_top).mean()) * 100
+        dp = float(np.abs(r["probs"] - ref).max())
+        print(f"{backend:8s} {path[-28:]:28s} {r['load_s']:7.2f} {np.percentile(lat, 50):8.2f} "
+              f"{np.percentile(lat, 95):8.2f} {1e3 / lat.mean():7.1f} {r['rss_loaded_mb']:8.0f} "
+              f"{r['peak_rss_mb']:8.0f} {agree:11.1f}% {dp:9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: compare_batch vs compare() in a loop, on a synthetic portfolio of
+agreement/extraction pairs with OCR-style noise. Also checks that both give
+identical results.
+
+    python bench_compare_batch.py
+    python bench_compare_batch.py --rows 200000 --doc-type fees_receipt
+"""
+import argparse
+import random
+import time
+
+from compare import compare, compare_batch
+
+FIRST = ["Ravi", "Priya", "Arun", "Lakshmi", "Mohammed", "Sneha", "Karthik", "Divya", "R.", "S"]
+LAST = ["Kumar", "Sharma", "Iyer", "Reddy", "Khan", "Nair", "Patel", "Das"]
+ITEMS = ["Mahindra 575 DI", "Swaraj 744 FE", "Rotavator 6ft", "Sonalika DI 35", "Power Tiller 12HP"]
+COLLEGES = ["Chennai Institute of Technology", "Anna University", "PSG College of Technology"]
+COLORS = ["Red", "Blue", "Grey", "Black"]
+
+
+def noisy(s, rnd, p=0.08):
+    out = []
+    for ch in s:
+        r = rnd.random()
+        if r < p / 2:
+            continue
+        out.append(rnd.choice("aeiou1l0O ") if r < p else ch)
+    return "".join(out)
+
+
+def synth_row(rnd):
+    name = f"{rnd.choice(FIRST)} {rnd.choice(LAST)}"
+    amount = round(rnd.uniform(5_000, 900_000), 2)
+    phone = "9" + "".join(rnd.choice("0123456789") for _ in range(9))
+    agreement = {
+        "name": name,
+        "phone": phone if rnd.random() > 0.1 else "",
+        "address": f"{rnd.randint(1, 99)}, Gandhi Street, Chennai 6000{rnd.randint(10, 99)}",
+        "amount": amount,
+        "vendor_name": "Sri Tractors Pvt Ltd",
+        "item": rnd.choice(ITEMS),
+        "color": rnd.choice(COLORS),
+        "college": rnd.choice(COLLEGES),
+    }
+    extracted = {
+        k: (noisy(v, rnd) if isinstance(v, str) and rnd.random() > 0.3 else v)
+        for k, v in agreement.items()
+    }
+    if rnd.random() < 0.2:
+        extracted["amount"] = round(amount * rnd.uniform(0.7, 1.3), 2)
+    if rnd.random() < 0.05:
+        extracted["amount"] = None
+    return agreement, extracted
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--doc-type", default="invoice")
+    ap.add_argument("--workers", type=int, default=-1)
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    pairs = [synth_row(rnd) for _ in range(args.rows)]
+    agreements = [a for a, _ in pairs]
+    extractions = [e for _, e in pairs]
+
+    t0 = time.perf_counter()
+    single = [compare(args.doc_type, a, e) for a, e in pairs]
+    t_single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = compare_batch(args.doc_type, agreements, extractions, workers=args.workers)
+    t_batch = time.perf_counter() - t0
+
+    diff = sum(1 for x, y in zip(single, batch) if x != y)
+    print(f"{args.rows} rows, doc_type={args.doc_type}")
+    print(f"  compare() loop  {t_single:8.2f} s   {args.rows / t_single:10.0f} rows/s")
+    print(f"  compare_batch   {t_batch:8.2f} s   {args.rows / t_batch:10.0f} rows/s   x{t_single / t_batch:.1f}")
+    print(f"  differing results: {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: indexed fuzzy plate search vs the brute-force scan in
+normalize.best_prefer_match, on synthetic registries.
+
+    python bench_plate_index.py                       # 10 .. 1,000,000 plates
+    python bench_plate_index.py --sizes 10 1000 10000000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from mock_db import STATE_CODES
+from normalize import CONF, best_prefer_match
+from plate_index import PlateIndex
+
+LETTERS = "ABCDEFGHJKLMNPRSTUVWXYZ"
+DIGITS = "0123456789"
+
+
+def synth_plate(rnd: random.Random) -> str:
+    st = rnd.choice(sorted(STATE_CODES))
+    rto = f"{rnd.randint(1, 99):02d}"
+    ser = "".join(rnd.choice(LETTERS) for _ in range(rnd.choice((1, 2, 2, 2))))
+    num = f"{rnd.randint(1, 9999):04d}"
+    return st + rto + ser + num
+
+
+def noisy(plate: str, rnd: random.Random) -> str:
+    # OCR-like damage: confusable swaps, 0-2 hard edits, junk around the plate
+    chars = list(plate)
+    for i, ch in enumerate(chars):
+        if ch in CONF and rnd.random() < 0.3:
+            chars[i] = rnd.choice(sorted(CONF[ch]))
+    for _ in range(rnd.choice((0, 0, 1, 2))):
+        op = rnd.choice(("sub", "ins", "del"))
+        i = rnd.randrange(len(chars))
+        if op == "sub":
+            chars[i] = rnd.choice(LETTERS + DIGITS)
+        elif op == "ins":
+            chars.insert(i, rnd.choice(LETTERS + DIGITS))
+        elif len(chars) > 6:
+            del chars[i]
+    return rnd.choice(("", "IND", "I")) + "".join(chars) + rnd.choice(("", "", "1"))
+
+
+def timed(fn, queries):
+    out, times = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append(fn(q))
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return out, times
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000, 1_000_000])
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--brute-max", type=int, default=1_000, help="skip brute force above this size")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    print(f"{'plates':>10} {'build_s':>8} {'idx_ms_p50':>10} {'idx_ms_mean':>11} "
+          f"{'brute_ms_mean':>13} {'agree':>6} {'recall':>6}")
+
+    for n in args.sizes:
+        rnd = random.Random(args.seed)
+        plates = set()
+        while len(plates) < n:
+            plates.add(synth_plate(rnd))
+        pool = sorted(plates)
+
+        t0 = time.perf_counter()
+        idx = PlateIndex(pool)
+        build = time.perf_counter() - t0
+
+        truth = [rnd.choice(pool) for _ in range(args.queries)]
+        queries = [noisy(p, rnd) for p in truth]
+
+        got, t_idx = timed(idx.best_match, queries)
+        recall = sum(g == t for g, t in zip(got, truth)) / len(truth)
+
+        brute_mean, agree = "-", "-"
+        if n <= args.brute_max:
+            ref, t_brute = timed(lambda q: best_prefer_match(q, plates), queries)
+            brute_mean = f"{statistics.mean(t_brute):.2f}"
+            agree = f"{sum(a == b for a, b in zip(got, ref)) / len(ref):.2f}"
+
+        print(f"{n:>10} {build:>8.2f} {statistics.median(t_idx):>10.2f} {statistics.mean(t_idx):>11.2f} "
+              f"{brute_mean:>13} {agree:>6} {recall:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: registry lookups through CachedRegistry vs straight to a slow
+registry API, using the local stand-in server from registry.py.
+
+    python bench_registry_cache.py
+    python bench_registry_cache.py --latency-ms 200 --jobs 500 --workers 32
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_db import MOCK_DB
+from registry import CachedRegistry, HttpRegistry, MemoryRegistry, make_app
+
+
+def run(reg, plates, workers):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(workers) as ex:
+        found = sum(1 for d in ex.map(reg.get, plates) if d)
+    return time.perf_counter() - t0, found
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=100.0)
+    ap.add_argument("--jobs", type=int, default=200, help="lookups to issue")
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--port", type=int, default=8091)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    app = make_app(MemoryRegistry(), latency_ms=args.latency_ms)
+    threading.Thread(target=lambda: app.run(port=args.port, threaded=True), daemon=True).start()
+    time.sleep(1.0)
+
+    # re-verifications: a few known plates over and over, plus some unknown ones
+    rnd = random.Random(args.seed)
+    pool = list(MOCK_DB) + ["XX00XX0000", "KA01AB0000"]
+    plates = [rnd.choice(pool) for _ in range(args.jobs)]
+
+    url = f"http://127.0.0.1:{args.port}"
+    t_raw, f_raw = run(HttpRegistry(url), plates, args.workers)
+    cached = CachedRegistry(HttpRegistry(url))
+    t_c, f_c = run(cached, plates, args.workers)
+    assert f_raw == f_c
+
+    print(f"{args.jobs} lookups, {args.workers} workers, {args.latency_ms:.0f} ms upstream latency")
+    print(f"  uncached  {t_raw:8.2f} s")
+    print(f"  cached    {t_c:8.2f} s   x{t_raw / t_c:.1f}")
+    print(f"  {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
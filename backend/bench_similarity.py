@@ -0,0 +1,117 @@
+"""
+Microbenchmarks for similarity.py against the hand-written DP loops it replaced.
+
+    python bench_similarity.py
+    python bench_similarity.py --pairs 20000 --choices 50000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import similarity
+from normalize import CONF, CONF_COSTS
+from bench_plate_index import synth_plate, noisy
+
+
+# ---------------- the old implementations, kept here only for comparison ----------------
+def old_levenshtein(a: str, b: str) -> int:
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    prev = list(range(len(b) + 1))
+    cur = [0] * (len(b) + 1)
+    for i in range(1, len(a) + 1):
+        cur[0] = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+        prev, cur = cur, prev
+    return prev[len(b)]
+
+
+def old_sub_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if b in CONF.get(a, set()) or a in CONF.get(b, set()):
+        return 0.25
+    return 1.0
+
+
+def old_wedit(a: str, b: str) -> float:
+    n, m = len(a), len(b)
+    dp = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dp[i][0] = float(i)
+    for j in range(1, m + 1):
+        dp[0][j] = float(j)
+    for i in range(1, n + 1):
+        ai = a[i - 1]
+        for j in range(1, m + 1):
+            bj = b[j - 1]
+            dp[i][j] = min(dp[i - 1][j] + 1.0, dp[i][j - 1] + 1.0, dp[i - 1][j - 1] + old_sub_cost(ai, bj))
+    return dp[n][m]
+
+
+def bench(label, fn, n_ops):
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    print(f"  {label:<42} {dt * 1000:>9.1f} ms  {dt * 1e6 / max(1, n_ops):>8.2f} us/op")
+    return out, dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=5000)
+    ap.add_argument("--choices", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    plates = [synth_plate(rnd) for _ in range(max(args.pairs, args.choices))]
+    pairs = [(noisy(p, rnd), rnd.choice(plates)) for p in plates[:args.pairs]]
+    names = [f"{p[:4]} {p[4:]} KUMAR" for p in plates]
+
+    print(f"unweighted levenshtein, {args.pairs} pairs (compare_rc.strict_similarity)")
+    a, t_old = bench("old pure-python DP", lambda: [old_levenshtein(x, y) for x, y in pairs], args.pairs)
+    b, t_new = bench("similarity.levenshtein (rapidfuzz)", lambda: [similarity.levenshtein(x, y) for x, y in pairs], args.pairs)
+    assert a == b
+    print(f"  speedup x{t_old / t_new:.1f}")
+
+    print(f"\nweighted edit distance, {args.pairs} pairs (normalize.wedit)")
+    a, t_old = bench("old 2-D list DP", lambda: [old_wedit(x, y) for x, y in pairs], args.pairs)
+    b, t_new = bench("similarity.weighted_distance", lambda: [similarity.weighted_distance(x, y, CONF_COSTS) for x, y in pairs], args.pairs)
+    c, t_cut = bench("similarity.weighted_distance cutoff=2.5",
+                     lambda: [similarity.weighted_distance(x, y, CONF_COSTS, 2.5) for x, y in pairs], args.pairs)
+    assert a == b
+    assert all((u <= 2.5 and u == v) or (u > 2.5 and v > 2.5) for u, v in zip(a, c))
+    print(f"  speedup x{t_old / t_new:.1f} (x{t_old / t_cut:.1f} with cutoff)")
+
+    q = pairs[0][0]
+    choices = plates[:args.choices]
+    print(f"\none-vs-many, 1 x {args.choices}")
+    a, t_old = bench("old_wedit loop", lambda: [old_wedit(q, c) for c in choices], args.choices)
+    b, t_new = bench("similarity.weighted_one_to_many (NumPy)",
+                     lambda: similarity.weighted_one_to_many(q, choices, CONF_COSTS), args.choices)
+    assert np.allclose(np.array(a, dtype=np.float32), b)
+    print(f"  speedup x{t_old / t_new:.1f}")
+    a, t_old = bench("old_levenshtein loop", lambda: [old_levenshtein(q, c) for c in choices], args.choices)
+    b, t_new = bench("similarity.levenshtein_one_to_many",
+                     lambda: similarity.levenshtein_one_to_many(q, choices), args.choices)
+    assert list(b) == a
+    print(f"  speedup x{t_old / t_new:.1f}")
+
+    qs = [x for x, _ in pairs[:50]]
+    cs = names[:500]
+    n = len(qs) * len(cs)
+    print(f"\nmany-vs-many, {len(qs)} x {len(cs)}")
+    _, t_old = bench("old_levenshtein nested loop", lambda: [[old_levenshtein(x, y) for y in cs] for x in qs], n)
+    _, t_new = bench("similarity.levenshtein_many_to_many", lambda: similarity.levenshtein_many_to_many(qs, cs), n)
+    print(f"  speedup x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -62,6 +62,8 @@ def verdict(score: float, hard_fail: bool) -> str:
 import re
 from rapidfuzz import fuzz
 from utils import norm_text
+from similarity import token_f1
+import doc_rules
 
 def _name_tokens(s: str):
     s = norm_text(str(s or ""))
@@ -69,65 +71,30 @@ def _name_tokens(s: str):
     toks = [t for t in s.split() if t and t not in {"mr", "mrs", "ms"}]
     return toks
 
-def _tok_match(a_tok: str, b_tok: str) -> bool:
-    if a_tok == b_tok:
-        return True
-    # initial match: "r" matches "reina" or "reina" matches "r"
-    if len(a_tok) == 1 and b_tok.startswith(a_tok):
-        return True
-    if len(b_tok) == 1 and a_tok.startswith(b_tok):
-        return True
-    return False
-
 def sim_name(a: str, b: str) -> float:
     A = _name_tokens(a)
     B = _name_tokens(b)
     if not A or not B:
         return 0.0
 
-    matched = 0
-    used = set()
-    for at in A:
-        for j, bt in enumerate(B):
-            if j in used:
-                continue
-            if _tok_match(at, bt):
-                matched += 1
-                used.add(j)
-                break
-
-    precision = matched / max(1, len(B))
-    recall = matched / max(1, len(A))
-    f1 = (2 * precision * recall / (precision + recall)) if (precision + recall) else 0.0
+    # token F1 with initials ("r" ~ "reina")
+    f1 = token_f1(A, B)
 
     # token_sort is stricter than token_set (doesn't give 100 for subsets)
     base = fuzz.token_sort_ratio(" ".join(A), " ".join(B)) / 100.0
 
     return max(f1, base)
 
+SIMS = {"phone": sim_phone, "amount": sim_amount, "item": sim_item, "name": sim_name}
+
+
 def compare(doc_type: str, agreement: dict, extracted: dict):
     
     dt = (doc_type or "").lower().strip()
 
-    # weights
-    if dt in ["invoice", "bill"]:
-        W = {
-            "name": 20,
-            "phone": 15,
-            "address": 15,
-            "amount": 20,
-            "vendor_name": 10,
-            "item": 15,
-            "color": 5,
-        }
-    elif dt in ["fees_receipt", "fee_receipt", "fee", "receipt"]:
-        W = {"name": 45, "college": 35, "amount": 20}
-    elif dt in ["marksheet", "mark_sheet", "result"]:
-        W = {"name": 60, "college": 40}
-    elif dt in ["student_id", "id_card", "id"]:
-        W = {"name": 40, "college": 60}
-    else:
-        W = {"name": 50, "college": 30, "amount": 20}
+    # weights and thresholds come from the doc type's rule (doc_rules.RULES)
+    rule = doc_rules.rule_for(dt)
+    W = rule.compare_weights
 
     fs = {}
     hard_fail = False
@@ -142,32 +109,11 @@ def compare(doc_type: str, agreement: dict, extracted: dict):
         # ALWAYS set s so it can never be unbound
         s = 0.0
 
+        kind = rule.sims.get(k, k)
         try:
-            if k == "phone":
-                s = sim_phone(a, b)
-                if a and b and s == 0.0:
-                    hard_fail = True
-
-            elif k == "amount":
-                s = sim_amount(a, b)
-                if a is not None and b is not None and s < 0.3:
-                    hard_fail = True
-
-            elif k == "item":
-                s = sim_item(a, b)
-                if a and b and s < 0.4:
-                    hard_fail = True
-
-            elif k == "name":
-                s = sim_name(a, b)
-                # student docs often miss first/last token in OCR
-                name_fail_thresh = 0.25 if dt in {"student_id","id_card","id","marksheet","mark_sheet","result"} else 0.4
-                if a and b and s < name_fail_thresh:
-                    hard_fail = True
-
-            else:
-                s = sim_text(a, b)
-
+            s = SIMS.get(kind, sim_text)(a, b)
+            if _hard_fail(kind, a, b, s, rule.name_fail):
+                hard_fail = True
         except Exception:
             s = 0.0  # safety
 
@@ -178,12 +124,31 @@ def compare(doc_type: str, agreement: dict, extracted: dict):
             "extracted": b,
         }
 
-    total_w = sum(v["weight"] for v in fs.values())
-    if total_w == 0:
-        final = 100.0
-    else:
-        weighted = sum((v["score"] / 100.0) * v["weight"] for v in fs.values())
-        final = (weighted / total_w) * 100.0
+    return _result(fs, hard_fail)
+
+
+def _hard_fail(kind: str, a, b, s: float, name_fail: float) -> bool:
+    if kind == "phone":
+        return bool(a and b and s == 0.0)
+    if kind == "amount":
+        return a is not None and b is not None and s < 0.3
+    if kind == "item":
+        return bool(a and b and s < 0.4)
+    if kind == "name":
+        # student docs often miss first/last token in OCR (rule.name_fail)
+        return bool(a and b and s < name_fail)
+    return False
+
+
+def _result(fs: dict, hard_fail: bool, final: float = None):
+    # compare_batch passes the weighted score it computed column-wise
+    if final is None:
+        total_w = sum(v["weight"] for v in fs.values())
+        if total_w == 0:
+            final = 100.0
+        else:
+            weighted = sum((v["score"] / 100.0) * v["weight"] for v in fs.values())
+            final = (weighted / total_w) * 100.0
 
     final = round(final, 2)
 
@@ -197,3 +162,179 @@ def compare(doc_type: str, agreement: dict, extracted: dict):
         "field_scores": fs,
         "reasons": reasons[:8],
     }
+
+
+# ===========================================================
+#   BATCH (re-scoring campaigns / audits)
+# ===========================================================
+# Same scores as compare(), one call per doc type for many
+# agreement/extraction pairs. The string kernels run pairwise in
+# rapidfuzz's C code (cpdist, float64 so rounding matches the single-pair
+# path); amounts and phones are NumPy. Only the per-row result dicts are
+# built in Python.
+import numpy as np
+
+try:
+    from rapidfuzz.process import cpdist
+except ImportError:  # rapidfuzz < 3.6
+    cpdist = None
+
+
+def _pair_ratio(scorer, A, B, workers: int) -> np.ndarray:
+    if not A:
+        return np.zeros(0)
+    if cpdist is not None:
+        return cpdist(A, B, scorer=scorer, dtype=np.float64, workers=workers) / 100.0
+    return np.array([scorer(a, b) for a, b in zip(A, B)], dtype=np.float64) / 100.0
+
+
+def _memo_map(fn, col):
+    # portfolios repeat the same vendor/college/item strings; normalize each once
+    memo = {}
+    out = []
+    for x in col:
+        key = str(x or "")
+        v = memo.get(key)
+        if v is None:
+            v = memo[key] = fn(key)
+        out.append(v)
+    return out
+
+
+def _norm_col(col):
+    return _memo_map(norm_text, col)
+
+
+def batch_sim_text(A, B, workers: int = -1) -> np.ndarray:
+    a, b = _norm_col(A), _norm_col(B)
+    s = _pair_ratio(fuzz.token_set_ratio, a, b, workers)
+    s[[not x or not y for x, y in zip(a, b)]] = 0.0
+    return s
+
+
+def batch_sim_name(A, B, workers: int = -1) -> np.ndarray:
+    ta = _memo_map(_name_tokens, A)
+    tb = _memo_map(_name_tokens, B)
+    s = _pair_ratio(fuzz.token_sort_ratio, [" ".join(t) for t in ta], [" ".join(t) for t in tb], workers)
+    for i, (x, y) in enumerate(zip(ta, tb)):
+        if not x or not y:
+            s[i] = 0.0
+        elif s[i] < 1.0:
+            s[i] = max(token_f1(x, y), s[i])
+    return s
+
+
+def batch_sim_item(A, B, workers: int = -1) -> np.ndarray:
+    a, b = _norm_col(A), _norm_col(B)
+    base = _pair_ratio(fuzz.token_sort_ratio, a, b, workers)
+    cov = np.zeros(len(a))
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x and y:
+            xt = set(x.split())
+            cov[i] = len(xt & set(y.split())) / len(xt)
+        else:
+            base[i] = 0.0
+    return np.minimum(base, np.minimum(1.0, cov + 0.10))
+
+
+def _floats(col) -> np.ndarray:
+    out = np.full(len(col), np.nan)
+    for i, x in enumerate(col):
+        if x is None:
+            continue
+        try:
+            out[i] = float(x)
+        except Exception:
+            pass
+    return out
+
+
+def batch_sim_amount(A, B, workers: int = -1) -> np.ndarray:
+    a, b = _floats(A), _floats(B)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ok = (a > 0) & (b > 0)
+        hi = np.maximum(a, b)
+        diff = np.abs(a - b)
+        fade = np.maximum(0.0, 1.0 - diff / (0.20 * hi))
+        s = np.where(diff <= np.maximum(1.0, 0.01 * hi), 1.0, fade)
+    return np.where(ok, s, 0.0)
+
+
+def batch_sim_phone(A, B, workers: int = -1) -> np.ndarray:
+    a = np.array([parse_phone(str(x or "")) for x in A], dtype=object)
+    b = np.array([parse_phone(str(x or "")) for x in B], dtype=object)
+    return ((a == b) & (a != "")).astype(np.float64)
+
+
+BATCH_SIMS = {"phone": batch_sim_phone, "amount": batch_sim_amount, "item": batch_sim_item,
+              "name": batch_sim_name}
+
+
+def _as_columns(data, keys, n=None):
+    """list of dicts or {field: column} -> ({field: list}, n rows)."""
+    if isinstance(data, dict):
+        if n is None:
+            n = max((len(v) for v in data.values()), default=0)
+        return {k: list(data[k]) if k in data else [None] * n for k in keys}, n
+    data = list(data)
+    return {k: [d.get(k) for d in data] for k in keys}, len(data)
+
+
+def compare_batch(doc_type: str, agreements, extractions, workers: int = -1):
+    """
+    compare() for many rows of one doc type at once. agreements/extractions
+    are row-aligned, either lists of dicts or {field: column} dicts.
+    Returns one compare() result per row, in order.
+    """
+    dt = (doc_type or "").lower().strip()
+    rule = doc_rules.rule_for(dt)
+    W = rule.compare_weights
+
+    A, n = _as_columns(agreements, W)
+    B, nb = _as_columns(extractions, W, n)
+    if nb != n:
+        raise ValueError(f"agreements ({n}) and extractions ({nb}) differ in length")
+
+    fields = []
+    hard = np.zeros(n, dtype=bool)
+    weighted = 0
+    total_w = 0
+    for k, w in W.items():
+        a, b = A[k], B[k]
+        present = np.array([not (x is None or (isinstance(x, str) and x.strip() == "")) for x in a], dtype=bool)
+        kind = rule.sims.get(k, k)
+        s = np.zeros(n)
+        idx = np.nonzero(present)[0].tolist()
+        if idx:
+            s[idx] = BATCH_SIMS.get(kind, batch_sim_text)([a[i] for i in idx], [b[i] for i in idx], workers)
+        hard |= present & _batch_hard_fail(kind, a, b, s, rule.name_fail)
+
+        # python round(), exactly as compare() rounds each field
+        score = np.where(present, [round(x * 100, 2) for x in s.tolist()], 100.0)
+        weight = np.where(present, w, 0)
+        weighted = weighted + (score / 100.0) * weight
+        total_w = total_w + weight
+        fields.append((k, score.tolist(), weight.tolist(), a, b))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        final = np.where(total_w == 0, 100.0, (weighted / np.maximum(total_w, 1)) * 100.0).tolist()
+
+    out = []
+    hard = hard.tolist()
+    for i in range(n):
+        fs = {k: {"score": sc[i], "weight": wt[i], "agreement": a[i], "extracted": b[i]}
+              for k, sc, wt, a, b in fields}
+        out.append(_result(fs, hard[i], final[i]))
+    return out
+
+
+def _batch_hard_fail(kind: str, A, B, s: np.ndarray, name_fail: float) -> np.ndarray:
+    """_hard_fail over columns (the caller masks out rows without an agreement value)."""
+    if kind == "amount":
+        both = np.array([x is not None and y is not None for x, y in zip(A, B)], dtype=bool)
+        return both & (s < 0.3)
+    limit = {"phone": None, "item": 0.4, "name": name_fail}.get(kind, -1)
+    if limit == -1:
+        return np.zeros(len(s), dtype=bool)
+    both = np.array([bool(x and y) for x, y in zip(A, B)], dtype=bool)
+    return both & ((s == 0.0) if limit is None else (s < limit))
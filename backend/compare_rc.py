@@ -1,37 +1,7 @@
 import re
 from typing import Dict, Any
 from normalize import normalize_make_model, canonical_color
-
-def norm_phone(p: str) -> str:
-    d = re.sub(r"\D", "", p or "")
-    return d[-10:] if len(d) >= 10 else d
-
-def levenshtein(a: str, b: str) -> int:
-    if not a:
-        return len(b)
-    if not b:
-        return len(a)
-    prev = list(range(len(b) + 1))
-    cur = [0] * (len(b) + 1)
-    for i in range(1, len(a) + 1):
-        cur[0] = i
-        for j in range(1, len(b) + 1):
-            cost = 0 if a[i - 1] == b[j - 1] else 1
-            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
-        prev, cur = cur, prev
-    return prev[len(b)]
-
-def strict_similarity(a: str, b: str) -> float:
-    a = normalize_make_model(a)
-    b = normalize_make_model(b)
-    if not a or not b:
-        return 0.0
-    mx = max(len(a), len(b))
-    return max(0.0, min(1.0, 1.0 - (levenshtein(a, b) / float(mx))))
-
-import re
-from typing import Dict, Any
-from normalize import normalize_make_model, canonical_color
+from similarity import normalized_similarity
 
 def norm_phone(p: str) -> str:
     d = re.sub(r"\D", "", p or "")
@@ -43,28 +13,8 @@ def norm_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
-def levenshtein(a: str, b: str) -> int:
-    if not a:
-        return len(b)
-    if not b:
-        return len(a)
-    prev = list(range(len(b) + 1))
-    cur = [0] * (len(b) + 1)
-    for i in range(1, len(a) + 1):
-        cur[0] = i
-        for j in range(1, len(b) + 1):
-            cost = 0 if a[i - 1] == b[j - 1] else 1
-            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
-        prev, cur = cur, prev
-    return prev[len(b)]
-
 def strict_similarity(a: str, b: str) -> float:
-    a = norm_text(a)
-    b = norm_text(b)
-    if not a or not b:
-        return 0.0
-    mx = max(len(a), len(b))
-    return max(0.0, min(1.0, 1.0 - (levenshtein(a, b) / float(mx))))
+    return normalized_similarity(norm_text(a), norm_text(b))
 
 def compare_officer_vs_api(officer: Dict[str, str], api_vehicle: Dict[str, str]) -> Dict[str, Any]:
     # officer
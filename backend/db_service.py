@@ -244,7 +244,7 @@ def _build_default_processes(data):
              "data_type": "scanner", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
-            {"id": "P4", "processid": [0], "what_to_do": "Record 360 Video", "data": None,
+            {"id": "P4", "processid": [9], "what_to_do": "Record 360 Video", "data": None,
              "data_type": "movement", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
@@ -269,7 +269,7 @@ def _build_default_processes(data):
              "data_type": "scanner", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
-            {"id": "P5", "processid": [5], "what_to_do": "Record 360 Video", "data": None,
+            {"id": "P5", "processid": [9], "what_to_do": "Record 360 Video", "data": None,
              "data_type": "movement", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
@@ -303,7 +303,7 @@ def _build_default_processes(data):
              "data_type": "scanner", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
-            {"id": "P4", "processid": [4], "what_to_do": "Record 360 Video", "data": None,
+            {"id": "P4", "processid": [9], "what_to_do": "Record 360 Video", "data": None,
                 "data_type": "movement", "score": 0, "process_status": "not verified",
                 "file_id": None, "is_required": True, "latitude": None, "longitude": None,
                 "location_confidence": None
@@ -313,7 +313,7 @@ def _build_default_processes(data):
     elif item_type in ["course"]:
         print(5)
         return [
-            {"id": "P1", "processid": [1], "what_to_do": "Upload Course Certificate", "data": None,
+            {"id": "P1", "processid": [8], "what_to_do": "Upload Course Certificate", "data": None,
              "data_type": "image", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
@@ -354,7 +354,7 @@ def _build_default_processes(data):
              "data_type": "scanner", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
-            {"id": "P4", "processid": [4], "what_to_do": "Record 360 Video", "data": None,
+            {"id": "P4", "processid": [9], "what_to_do": "Record 360 Video", "data": None,
              "data_type": "movement", "score": 0, "process_status": "not verified",
              "file_id": None, "is_required": True, "latitude": None, "longitude": None,
              "location_confidence": None},
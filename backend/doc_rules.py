@@ -0,0 +1,386 @@
+"""
+Declarative extraction rules per document type.
+
+A rule names the doc types it covers, the fields to pull and how to score
+them in compare.compare. Each field is either
+
+    {"builtin": ["extract_x", "extract_y"]}       tuned extractors in extractors.py,
+                                                  first non-empty result wins
+or a declarative spec:
+    {
+        "labels":  ["name", "awarded to"],        value follows the label on the
+                                                  same line (or on the next line)
+        "anchors": ["institute", "academy"],      the line itself is the value
+        "stop":    ["principal", "signature"],    lines to ignore
+        "until":   ["has", "for"],                words that end a labelled value
+        "region":  {"top": 8} | {"after": [...], "lines": 6} | "all",
+        "value":   "text" | "name" | "amount" | "date" | "id" | "phone",
+        "pattern": r"...",                        optional, overrides "value"
+        "weights": {"label": 80, "anchor": 50, "top": 10, "upper": 5, "length": 20},
+    }
+
+Rules are compiled once: every label/anchor/stop keyword goes into the
+extractors' shared KeywordAutomaton, each field's labels become one combined
+regex, and a keyword -> field map means a document is evaluated in a single
+pass over the LineIndex, touching only the fields a line's keywords hit.
+
+Extra rules can be loaded from a JSON list at DOC_RULES_PATH.
+"""
+import os
+import re
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import money_candidates, parse_phone
+
+DOC_RULES_PATH = os.environ.get("DOC_RULES_PATH", "")
+
+# Output keys every extractor has always returned, in this order
+BASE_FIELDS = ["name", "college", "phone", "address", "amount", "vendor_name", "item", "color"]
+
+RULES: List[Dict[str, Any]] = [
+    {
+        "doc_types": ["invoice", "bill"],
+        "builtin": "extract_invoice",
+        "compare": {"name": 20, "phone": 15, "address": 15, "amount": 20, "vendor_name": 10, "item": 15, "color": 5},
+    },
+    {
+        "doc_types": ["fees_receipt", "fee_receipt", "fee", "receipt"],
+        "fields": {
+            "name": {"builtin": ["extract_name"]},
+            "college": {"builtin": ["extract_college"]},
+            "amount": {"builtin": ["extract_fee_receipt_amount"]},
+        },
+        "compare": {"name": 45, "college": 35, "amount": 20},
+    },
+    {
+        "doc_types": ["student_id", "id_card", "id"],
+        "fields": {
+            "name": {"builtin": ["extract_student_id_name", "extract_name"]},
+            "college": {"builtin": ["extract_college_header", "extract_college"]},
+        },
+        "compare": {"name": 40, "college": 60},
+        "name_fail": 0.25,  # student docs often miss first/last token in OCR
+    },
+    {
+        "doc_types": ["marksheet", "mark_sheet", "result"],
+        "fields": {
+            "name": {"builtin": ["extract_marksheet_name", "extract_name"]},
+            "college": {"builtin": ["extract_college_header", "extract_college"]},
+        },
+        "compare": {"name": 60, "college": 40},
+        "name_fail": 0.25,
+    },
+    {
+        # "course" loan template: P1 Upload Course Certificate
+        "doc_types": ["course_certificate", "certificate", "course"],
+        "fields": {
+            "name": {
+                "labels": ["this is to certify that", "certify that", "certifies that", "awarded to",
+                           "presented to", "conferred on", "student name", "name"],
+                "stop": ["signature", "director", "principal", "instructor"],
+                "until": ["has", "have", "for", "of", "s/o", "d/o", "son", "daughter", "bearing", "with", "course"],
+                "value": "name",
+                "weights": {"label": 80, "upper": 5},
+            },
+            "course_name": {
+                "labels": ["successfully completed the course", "has successfully completed", "completed the course",
+                           "for completing", "in the course", "course name", "programme", "program", "course"],
+                "stop": ["signature", "certificate no", "certificate id"],
+                "until": ["conducted", "offered", "organised", "organized", "held", "during", "with", "securing", "from"],
+                "value": "text",
+                "weights": {"label": 80, "length": 10},
+            },
+            "provider": {
+                "anchors": ["academy", "institute", "university", "college", "school", "training", "centre",
+                            "center", "foundation", "private limited", "pvt", "ltd", "nptel", "coursera",
+                            "udemy", "edx", "skill india"],
+                "stop": ["certify", "awarded", "completed", "signature", "course"],
+                "region": {"top": 8},
+                "value": "text",
+                "weights": {"anchor": 50, "top": 15, "upper": 5, "length": 20},
+            },
+            "date": {
+                "labels": ["date of issue", "issued on", "issue date", "dated", "date"],
+                "value": "date",
+                "weights": {"label": 60},
+            },
+            "certificate_no": {
+                "labels": ["certificate no", "certificate number", "certificate id", "credential id",
+                           "serial no", "cert no"],
+                "value": "id",
+                "weights": {"label": 60},
+            },
+        },
+        "compare": {"name": 50, "course_name": 30, "provider": 20},
+    },
+]
+
+# Unknown doc types
+DEFAULT_RULE: Dict[str, Any] = {
+    "doc_types": [],
+    "fields": {
+        "name": {"builtin": ["extract_name"]},
+        "college": {"builtin": ["extract_college"]},
+        "amount": {"builtin": ["extract_amount_generic"]},
+    },
+    "compare": {"name": 50, "college": 30, "amount": 20},
+}
+
+
+# ===========================================================
+#   VALUE PARSERS
+# ===========================================================
+_SPACES_RE = re.compile(r"\s+")
+_LABEL_SEP_RE = re.compile(r"^[\s:\-–.,]+")
+_NAME_CHARS_RE = re.compile(r"[^A-Za-z.\s]")
+_DATE_RE = re.compile(
+    r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+\d{4}\b"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b",
+    re.I,
+)
+_ID_RE = re.compile(r"\b(?=[A-Z0-9/-]*\d)[A-Z0-9][A-Z0-9/-]{3,}\b", re.I)
+_LOOSE_NUM_RE = re.compile(r"\b\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?\b|\b\d+(?:\.\d{1,2})?\b")
+
+
+def _as_text(s: str) -> Optional[str]:
+    s = _SPACES_RE.sub(" ", s).strip(" :-–.,")
+    if len(s) < 2 or not any(ch.isalpha() for ch in s):
+        return None
+    return s
+
+
+def _as_name(s: str) -> Optional[str]:
+    if any(ch.isdigit() for ch in s):
+        return None
+    s = _SPACES_RE.sub(" ", _NAME_CHARS_RE.sub(" ", s)).strip(" .")
+    words = s.split()
+    if not (1 <= len(words) <= 5) or sum(ch.isalpha() for ch in s) < 3:
+        return None
+    return s.title()
+
+
+def _as_amount(s: str) -> Optional[float]:
+    vals = money_candidates(s)
+    if not vals:
+        vals = [float(x.replace(",", "")) for x in _LOOSE_NUM_RE.findall(s)]
+    vals = [v for v in vals if v > 0]
+    return max(vals) if vals else None
+
+
+def _search(rx):
+    def parse(s: str) -> Optional[str]:
+        m = rx.search(s)
+        return m.group(0) if m else None
+    return parse
+
+
+VALUE_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "text": _as_text,
+    "name": _as_name,
+    "amount": _as_amount,
+    "date": _search(_DATE_RE),
+    "id": _search(_ID_RE),
+    "phone": lambda s: parse_phone(s) or None,
+}
+
+DEFAULT_WEIGHTS = {"label": 80, "anchor": 50, "top": 0, "upper": 0, "length": 0}
+
+
+# ===========================================================
+#   COMPILED RULES
+# ===========================================================
+def _lower_all(xs: Iterable[str]) -> List[str]:
+    return [x.lower() for x in xs or []]
+
+
+def _alternation(phrases: List[str]) -> str:
+    return "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in sorted(phrases, key=len, reverse=True))
+
+
+class FieldRule:
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        builtin = spec.get("builtin")
+        self.builtins: List[str] = [builtin] if isinstance(builtin, str) else list(builtin or [])
+        self.labels = _lower_all(spec.get("labels"))
+        self.anchors = _lower_all(spec.get("anchors"))
+        self.stop = _lower_all(spec.get("stop"))
+        self.weights = {**DEFAULT_WEIGHTS, **(spec.get("weights") or {})}
+
+        region = spec.get("region") or "all"
+        self.top: Optional[int] = region.get("top") if isinstance(region, dict) else None
+        self.after = _lower_all(region.get("after")) if isinstance(region, dict) else []
+        self.after_lines = int(region.get("lines", 6)) if isinstance(region, dict) else 0
+
+        if spec.get("pattern"):
+            self.parse = _search(re.compile(spec["pattern"], re.I))
+        else:
+            self.parse = VALUE_PARSERS[spec.get("value", "text")]
+
+        # one regex for all labels: the last label on the line (closest to the
+        # value), longest first so "student name" beats "name"
+        self.label_re = None
+        if self.labels:
+            self.label_re = re.compile(rf"^.*\b(?:{_alternation(self.labels)})\b(?P<val>.*)$", re.I)
+        self.until_re = None
+        if spec.get("until"):
+            self.until_re = re.compile(rf"\s*\b(?:{_alternation(_lower_all(spec['until']))})\b.*$", re.I)
+
+        self.label_set = frozenset(self.labels)
+        self.anchor_set = frozenset(self.anchors)
+        self.stop_set = frozenset(self.stop)
+        self.after_set = frozenset(self.after)
+
+    @property
+    def declarative(self) -> bool:
+        return not self.builtins
+
+    @property
+    def keywords(self) -> Set[str]:
+        return set(self.labels) | set(self.anchors) | set(self.stop) | set(self.after)
+
+
+class DocRule:
+    def __init__(self, spec: Dict[str, Any]):
+        self.doc_types = [d.lower() for d in spec.get("doc_types", [])]
+        self.builtin: Optional[str] = spec.get("builtin")
+        self.fields = [FieldRule(k, v) for k, v in (spec.get("fields") or {}).items()]
+        self.compare_weights: Dict[str, int] = dict(spec.get("compare") or {})
+        self.name_fail: float = float(spec.get("name_fail", 0.4))
+        self.sims: Dict[str, str] = dict(spec.get("sims") or {})
+
+        decl = [f for f in self.fields if f.declarative]
+        # keyword -> fields it can trigger; fields with no keywords see every line
+        self._by_keyword: Dict[str, List[FieldRule]] = {}
+        self._always: List[FieldRule] = []
+        for f in decl:
+            trig = f.label_set | f.anchor_set
+            if not trig:
+                self._always.append(f)
+            for k in trig:
+                self._by_keyword.setdefault(k, []).append(f)
+        self._triggers = frozenset(self._by_keyword)
+        self._decl = decl
+
+    @property
+    def keywords(self) -> Set[str]:
+        out: Set[str] = set()
+        for f in self.fields:
+            out |= f.keywords
+        return out
+
+    # ---------------- evaluation ----------------
+    def _scan(self, view) -> Dict[str, Any]:
+        """One pass over the view; best declarative value per field."""
+        best: Dict[str, Tuple[float, int, Any]] = {}
+        if not self._decl:
+            return {}
+
+        n = len(view)
+        after_seen: Dict[str, int] = {}  # field -> line index of its region anchor
+
+        for i in range(n):
+            hits = view.hits[i]
+            text = view.texts[i]
+
+            for f in self._decl:
+                if f.after_set and f.name not in after_seen and not hits.isdisjoint(f.after_set):
+                    after_seen[f.name] = i
+
+            if hits.isdisjoint(self._triggers) and not self._always:
+                continue
+            fields = {id(f): f for k in (hits & self._triggers) for f in self._by_keyword[k]}
+            for f in self._always:
+                fields[id(f)] = f
+
+            for f in fields.values():
+                if not hits.isdisjoint(f.stop_set):
+                    continue
+                if f.top is not None and i >= f.top:
+                    continue
+                if f.after_set:
+                    start = after_seen.get(f.name)
+                    if start is None or not (start < i <= start + f.after_lines):
+                        continue
+
+                w = f.weights
+                cands = []
+                if f.label_re is not None and not hits.isdisjoint(f.label_set):
+                    m = f.label_re.match(text)
+                    if m:
+                        raw = _LABEL_SEP_RE.sub("", m.group("val"))
+                        if f.until_re is not None:
+                            raw = f.until_re.sub("", raw)
+                        val = f.parse(raw) if raw else None
+                        if val is None and i + 1 < n and view.hits[i + 1].isdisjoint(f.stop_set):
+                            val = f.parse(view.texts[i + 1])
+                        if val is not None:
+                            cands.append((w["label"], val))
+                if (f.anchor_set and not hits.isdisjoint(f.anchor_set)) or (not f.label_set and not f.anchor_set):
+                    val = f.parse(text)
+                    if val is not None:
+                        cands.append((w["anchor"], val))
+
+                for base, val in cands:
+                    score = base
+                    if f.top is not None or w["top"]:
+                        score += w["top"] * max(0.0, 1.0 - i / max(1, f.top or n))
+                    if w["upper"] and text.isupper():
+                        score += w["upper"]
+                    if w["length"] and isinstance(val, str):
+                        score += min(w["length"], len(val) // 4)
+                    # ties: earlier line wins
+                    if f.name not in best or score > best[f.name][0]:
+                        best[f.name] = (score, i, val)
+
+        return {k: v[2] for k, v in best.items()}
+
+    def evaluate(self, ix, view, raw_lines: List[str], builtins: Dict[str, Callable]) -> Dict[str, Any]:
+        if self.builtin:
+            return builtins[self.builtin](ix)
+
+        found = self._scan(view)
+        out: Dict[str, Any] = {k: ("" if k != "amount" else None) for k in BASE_FIELDS}
+        for f in self.fields:
+            if f.declarative:
+                out[f.name] = found.get(f.name, None if f.parse is _as_amount else "")
+                continue
+            val = None
+            for b in f.builtins:
+                val = builtins[b](ix)
+                if val:
+                    break
+            out[f.name] = val
+        out["raw_ocr_lines"] = raw_lines
+        return out
+
+
+def _load_rules() -> List[DocRule]:
+    specs = list(RULES)
+    if DOC_RULES_PATH and os.path.exists(DOC_RULES_PATH):
+        with open(DOC_RULES_PATH, encoding="utf-8") as f:
+            specs += json.load(f)
+    return [DocRule(s) for s in specs]
+
+
+COMPILED = _load_rules()
+DEFAULT = DocRule(DEFAULT_RULE)
+
+_BY_TYPE: Dict[str, DocRule] = {}
+for _r in COMPILED:
+    for _dt in _r.doc_types:
+        _BY_TYPE[_dt] = _r  # later (file) rules override built-in ones
+
+
+def rule_for(doc_type: str) -> DocRule:
+    return _BY_TYPE.get((doc_type or "").lower().strip(), DEFAULT)
+
+
+def keywords() -> Set[str]:
+    """Every keyword any rule checks, for the shared KeywordAutomaton."""
+    out: Set[str] = set()
+    for r in COMPILED + [DEFAULT]:
+        out |= r.keywords
+    return out
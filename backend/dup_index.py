@@ -0,0 +1,238 @@
+"""
+Cross-loan near-duplicate detection for uploaded documents.
+
+Each verified document's OCR text (extractors' raw_ocr_lines) is reduced to
+character 5-gram shingles, a 128-value MinHash signature and 32 LSH band keys
+(4 values each). Stores index the band keys, so finding earlier documents
+that share a band is an index lookup however many documents are stored.
+Candidates are confirmed on the Jaccard similarity estimated from the
+signatures and on the numbers both documents carry (invoice no., amounts,
+dates, phone), so two receipts printed from the same college template don't
+match each other.
+
+    mongo   - "doc_minhash" collection next to the loans (default)
+    sqlite  - a local file (DUP_INDEX_DB), for offline audits
+
+DUP_INDEX_BACKEND picks one; DUP_JACCARD / DUP_NUM_JACCARD set the thresholds.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils import norm_text
+
+DUP_INDEX_BACKEND = os.environ.get("DUP_INDEX_BACKEND", "mongo").strip().lower()
+DUP_INDEX_DB = os.environ.get("DUP_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dup_index.sqlite3"))
+DUP_JACCARD = float(os.environ.get("DUP_JACCARD", "0.6"))
+DUP_NUM_JACCARD = float(os.environ.get("DUP_NUM_JACCARD", "0.3"))
+
+NUM_PERM = 128
+BANDS, ROWS = 32, 4          # P(candidate) = 1 - (1 - J^4)^32: 0.5 -> 87%, 0.3 -> 23%
+SHINGLE = 5                  # characters: a misread letter only spoils the 5 grams around it
+MIN_SHINGLES = 40            # shorter texts say nothing about reuse
+MIN_NUMS = 3                 # number check only when both documents have this many
+MAX_NUMS = 64
+CANDIDATE_LIMIT = 200
+
+# Fixed seed: stored signatures are only comparable with the same permutations.
+_rng = np.random.RandomState(20240917)
+_PERM_A = _rng.randint(0, 2 ** 63 - 1, NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 63 - 1, NUM_PERM, dtype=np.int64).astype(np.uint64)
+_SHIFT = np.uint64(32)
+
+_NUM_RE = re.compile(r"\d[\d,./-]*\d")
+
+
+# ===========================================================
+#   FINGERPRINT
+# ===========================================================
+def shingles(text: str) -> np.ndarray:
+    """crc32 of the distinct character 5-grams of the normalized text."""
+    t = norm_text(text)
+    grams = {t[i:i + SHINGLE] for i in range(len(t) - SHINGLE + 1)}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(h: np.ndarray) -> np.ndarray:
+    # multiply-shift hashing, (a*x + b mod 2^64) >> 32 with odd a, for all
+    # permutations at once; uint64 arithmetic wraps, which is the "mod 2^64"
+    with np.errstate(over="ignore"):
+        return ((_PERM_A[:, None] * h[None, :] + _PERM_B[:, None]) >> _SHIFT).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[str]:
+    return [
+        f"{b:02d}:" + hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).hexdigest()
+        for b in range(BANDS)
+    ]
+
+
+def numbers(text: str) -> List[str]:
+    """Digit strings of 3+ digits (separators dropped), e.g. amounts, invoice and phone numbers."""
+    out = set()
+    for m in _NUM_RE.findall(text):
+        d = re.sub(r"\D", "", m)
+        if len(d) >= 3:
+            out.add(d)
+    return sorted(out)[:MAX_NUMS]
+
+
+def fingerprint(lines: List[str]) -> Optional[Dict[str, Any]]:
+    text = "\n".join(str(x) for x in lines or [] if x)
+    h = shingles(text)
+    if len(h) < MIN_SHINGLES:
+        return None
+    sig = minhash(h)
+    return {"sig": sig, "bands": band_keys(sig), "nums": numbers(text)}
+
+
+def _jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if (a or b) else 0.0
+
+
+# ===========================================================
+#   STORES
+# ===========================================================
+class MongoDupStore:
+    def __init__(self, coll=None):
+        if coll is None:
+            from db_service import db
+            coll = db["doc_minhash"]
+        self._coll = coll
+        self._coll.create_index("bands")
+
+    def put(self, doc_id: str, meta: Dict[str, Any], fp: Dict[str, Any]):
+        from bson.binary import Binary
+        self._coll.update_one({"_id": doc_id}, {"$set": {
+            **meta, "sig": Binary(fp["sig"].tobytes()), "bands": fp["bands"], "nums": fp["nums"],
+            "updated_at": time.time(),
+        }}, upsert=True)
+
+    def candidates(self, bands: List[str], limit: int = CANDIDATE_LIMIT) -> List[Dict[str, Any]]:
+        out = []
+        # most shared bands first: same-template documents share a few bands
+        # each and must not push the real near-duplicate past the limit
+        for d in self._coll.aggregate([
+            {"$match": {"bands": {"$in": bands}}},
+            {"$addFields": {"_shared": {"$size": {"$setIntersection": ["$bands", bands]}}}},
+            {"$sort": {"_shared": -1}},
+            {"$limit": limit},
+            {"$project": {"bands": 0, "updated_at": 0, "_shared": 0}},
+        ]):
+            d["doc_id"] = d.pop("_id")
+            d["sig"] = np.frombuffer(bytes(d["sig"]), dtype=np.uint32)
+            out.append(d)
+        return out
+
+
+class SqliteDupStore:
+    _SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, meta TEXT NOT NULL, sig BLOB NOT NULL, nums TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS bands (key TEXT NOT NULL, doc TEXT NOT NULL, PRIMARY KEY (key, doc)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS bands_doc ON bands(doc)",
+    ]
+
+    def __init__(self, path: str = DUP_INDEX_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in self._SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+
+    def put(self, doc_id: str, meta: Dict[str, Any], fp: Dict[str, Any]):
+        with self._lock:
+            c = self._conn
+            c.execute("DELETE FROM bands WHERE doc = ?", (doc_id,))
+            c.execute("INSERT OR REPLACE INTO docs(id, meta, sig, nums) VALUES (?, ?, ?, ?)",
+                      (doc_id, json.dumps(meta, default=str), fp["sig"].tobytes(), json.dumps(fp["nums"])))
+            c.executemany("INSERT OR IGNORE INTO bands(key, doc) VALUES (?, ?)", [(k, doc_id) for k in fp["bands"]])
+            c.commit()
+
+    def candidates(self, bands: List[str], limit: int = CANDIDATE_LIMIT) -> List[Dict[str, Any]]:
+        q = ",".join("?" * len(bands))
+        with self._lock:
+            # most shared bands first (see MongoDupStore.candidates)
+            rows = self._conn.execute(
+                f"SELECT d.id, d.meta, d.sig, d.nums FROM "
+                f"(SELECT doc, COUNT(*) AS n FROM bands WHERE key IN ({q}) GROUP BY doc ORDER BY n DESC LIMIT ?) b "
+                f"JOIN docs d ON d.id = b.doc ORDER BY b.n DESC", (*bands, limit)).fetchall()
+        return [{"doc_id": i, **json.loads(m), "sig": np.frombuffer(s, dtype=np.uint32), "nums": json.loads(n)}
+                for i, m, s, n in rows]
+
+
+# ===========================================================
+#   INDEX
+# ===========================================================
+class DupIndex:
+    def __init__(self, store):
+        self.store = store
+
+    def check(self, doc_id: str, meta: Dict[str, Any], lines: List[str], index: bool = True) -> List[Dict[str, Any]]:
+        """
+        Documents of *other* loans that look like this one, best first, then
+        (index=True) add this one to the index under doc_id (re-uploads replace it).
+        meta: loan_id, user_id, process_id, doc_type - returned with each match.
+        """
+        fp = fingerprint(lines)
+        if fp is None:
+            return []
+
+        cands = [c for c in self.store.candidates(fp["bands"])
+                 if c["doc_id"] != doc_id
+                 and (c.get("loan_id"), c.get("user_id")) != (meta.get("loan_id"), meta.get("user_id"))]
+        matches = []
+        if cands:
+            sims = (np.stack([c["sig"] for c in cands]) == fp["sig"]).mean(axis=1)
+            for c, sim in zip(cands, sims.tolist()):
+                if sim < DUP_JACCARD:
+                    continue
+                shared = sorted(set(c["nums"]) & set(fp["nums"]))
+                if len(fp["nums"]) >= MIN_NUMS and len(c["nums"]) >= MIN_NUMS \
+                        and _jaccard(c["nums"], fp["nums"]) < DUP_NUM_JACCARD:
+                    continue
+                matches.append({
+                    "doc_id": c["doc_id"],
+                    "loan_id": c.get("loan_id"),
+                    "user_id": c.get("user_id"),
+                    "process_id": c.get("process_id"),
+                    "doc_type": c.get("doc_type"),
+                    "similarity": round(sim, 3),
+                    "shared_numbers": shared[:10],
+                })
+            matches.sort(key=lambda m: -m["similarity"])
+
+        if index:
+            self.store.put(doc_id, meta, fp)
+        return matches
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dup_index() -> DupIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if DUP_INDEX_BACKEND == "sqlite":
+                    _index = DupIndex(SqliteDupStore(DUP_INDEX_DB))
+                else:
+                    _index = DupIndex(MongoDupStore())
+    return _index
+
+
+def set_dup_index(index: DupIndex):
+    global _index
+    _index = index
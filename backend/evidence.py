@@ -0,0 +1,214 @@
+"""
+Verification evidence: why a process got its score.
+
+While AI_Engine.main scores a process it records what each step saw and
+decided, then stores one compact record per run in the
+verification_evidence collection (indexed on loan / process / time):
+
+    document steps  verdict, final score, reasons, field scores with the
+                    agreement and extracted values, all extracted fields
+    asset photo     prediction, confidence, expected asset
+    RC              plate read, vehicle number, registry decision per field
+    360 video       keyframe labels, match ratio, motion
+    every step      score and elapsed seconds, or the error it raised
+    notes           flags raised on the way (photo reuse)
+
+plus the OCR pipeline / tesseract / classifier versions it ran with. Officer
+and audit views read the explanation with a point query instead of re-running
+OCR:
+
+    GET /bank/loan/<loan_id>/evidence               latest record per process
+    GET /bank/loan/<loan_id>/evidence/<process_id>  latest (?history=1: every run)
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+import ocr_cache
+import asset_model
+
+EVIDENCE_COLLECTION = os.environ.get("EVIDENCE_COLLECTION", "verification_evidence")
+HISTORY_LIMIT = int(os.environ.get("EVIDENCE_HISTORY_LIMIT", "50"))
+
+RECORD_VERSION = 1
+
+
+# ===========================================================
+#   RECORDING
+# ===========================================================
+class Run:
+    """Evidence of one AI_Engine.main run: a dict per step, plus run-level notes."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+        self.notes: Dict[str, Any] = {}
+        self._step: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def step(self, step: int, name: str):
+        rec = {"step": step, "name": name, "detail": {}}
+        self.steps.append(rec)
+        self._step, t = rec, time.perf_counter()
+        try:
+            yield rec
+        except Exception as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            rec["elapsed_s"] = round(time.perf_counter() - t, 3)
+            self._step = None
+
+    def note(self, **detail):
+        # kept apart from the fixed keys (step, name, score, error, ...) they could shadow
+        (self._step["detail"] if self._step is not None else self.notes).update(detail)
+
+    def elapsed(self) -> float:
+        return round(time.perf_counter() - self.t0, 3)
+
+
+_run: ContextVar[Optional[Run]] = ContextVar("evidence_run", default=None)
+
+
+@contextmanager
+def run():
+    r = Run()
+    token = _run.set(r)
+    try:
+        yield r
+    finally:
+        _run.reset(token)
+
+
+def current_run() -> Optional[Run]:
+    return _run.get()
+
+
+def note(**detail):
+    """Attach detail to the running step (or the run); a no-op outside AI_Engine.main."""
+    r = _run.get()
+    if r is not None:
+        r.note(**detail)
+
+
+# ===========================================================
+#   COMPACT VIEWS
+# ===========================================================
+def _present(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in d.items() if v is not None}
+
+
+def document(response: Dict[str, Any]) -> Dict[str, Any]:
+    """new_app.verify's response without the agreement echo (field_scores carry it) or the OCR lines."""
+    c = response.get("comparison") or {}
+    extracted = dict(response.get("ocr_extracted") or {})
+    lines = extracted.pop("raw_ocr_lines", None) or []
+    return {
+        "doc_type": response.get("doc_type"),
+        "verdict": c.get("verdict"),
+        "final_score": c.get("final_score"),
+        "hard_fail": c.get("hard_fail"),
+        "reasons": c.get("reasons", []),
+        "field_scores": c.get("field_scores", {}),
+        "extracted": extracted,
+        "ocr_lines": len(lines),
+    }
+
+
+def rc(result: Dict[str, Any]) -> Dict[str, Any]:
+    """rc_main.verify_officer's response without the full registry record."""
+    plate = result.get("plate") or {}
+    return _present({
+        "status": result.get("status"),
+        "error_code": result.get("error_code"),
+        "message": result.get("message"),
+        "vehicle_no": result.get("vehicle_no"),
+        "plate": _present({k: plate.get(k) for k in ("text", "vehicle_no", "variant", "psm")}),
+        "officer_input": result.get("officer_input"),
+        "decision": result.get("decision"),
+    })
+
+
+def video(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in result.items() if k != "keyframe_times"}
+
+
+def versions() -> Dict[str, Any]:
+    onnx = asset_model.CNN_BACKEND == "onnx"
+    return {
+        "record": RECORD_VERSION,
+        "ocr_pipeline": ocr_cache.PIPELINE_VERSION,
+        "tesseract": ocr_cache.tesseract_version(),
+        "cnn_backend": asset_model.CNN_BACKEND,
+        "cnn_model": os.path.basename(asset_model.CNN_ONNX if onnx else asset_model.CNN_MODEL),
+    }
+
+
+# ===========================================================
+#   STORE
+# ===========================================================
+class EvidenceStore:
+    def __init__(self, coll):
+        self._coll = coll
+        self._coll.create_index([("loan_id", ASCENDING), ("process_id", ASCENDING), ("created_at", DESCENDING)])
+
+    def save(self, loan_id, user_id, process: Dict[str, Any], score, r: Run,
+             error: Optional[str] = None) -> Dict[str, Any]:
+        """score is None when the run failed; error and the failing step's "error" say why."""
+        record = {
+            "loan_id": loan_id,
+            "user_id": user_id,
+            "process_id": process.get("id"),
+            "file_id": process.get("file_id"),
+            "data_type": process.get("data_type"),
+            "score": score,
+            "error": error,
+            "steps": r.steps,
+            "notes": r.notes,
+            "versions": versions(),
+            "elapsed_s": r.elapsed(),
+            "created_at": time.time(),
+        }
+        self._coll.insert_one(dict(record))
+        return record
+
+    def latest(self, loan_id, process_id) -> Optional[Dict[str, Any]]:
+        return self._coll.find_one({"loan_id": loan_id, "process_id": process_id}, {"_id": 0},
+                                   sort=[("created_at", DESCENDING)])
+
+    def history(self, loan_id, process_id, limit: int = HISTORY_LIMIT) -> List[Dict[str, Any]]:
+        cur = self._coll.find({"loan_id": loan_id, "process_id": process_id}, {"_id": 0})
+        return list(cur.sort("created_at", DESCENDING).limit(limit))
+
+    def for_loan(self, loan_id) -> List[Dict[str, Any]]:
+        """Latest record of every process of the loan."""
+        return [d["record"] for d in self._coll.aggregate([
+            {"$match": {"loan_id": loan_id}},
+            {"$sort": {"process_id": 1, "created_at": -1}},
+            {"$group": {"_id": "$process_id", "record": {"$first": "$$ROOT"}}},
+            {"$unset": "record._id"},
+            {"$sort": {"_id": 1}},
+        ])]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_evidence_store(db) -> EvidenceStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EvidenceStore(db[EVIDENCE_COLLECTION])
+    return _store
+
+
+def set_evidence_store(store: EvidenceStore):
+    global _store
+    _store = store
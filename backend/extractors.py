@@ -1,7 +1,12 @@
 import re
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from itertools import chain
+from typing import List, Dict, Any, Optional, Union
 
-from utils import best_labeled_value, parse_phone, pick_top_region, money_candidates
+from utils import parse_phone, money_candidates
+from line_index import KeywordAutomaton, LineIndex, LineView
+import doc_rules
+from table_layout import invoice_table, table_total
 
 COLLEGE_HINTS = ["college", "university", "institute", "engineering", "technology", "polytechnic", "school"]
 
@@ -10,11 +15,45 @@ COLORS = {
     "grey", "gray", "silver", "gold", "brown", "beige", "maroon", "navy", "teal"
 }
 
-import re
-
 COLLEGE_WORDS = ["college", "university", "institute", "technology", "polytechnic", "school"]
 ID_STOP_WORDS = ["autonomous", "principal", "valid", "id", "identity", "institute", "technology", "college", "university"]
 
+# ---------------- keyword groups (substring, case-insensitive) ----------------
+HEADER_WORDS = ["institute", "technology", "college", "university", "school"]
+ID_NAME_STOP = ["autonomous", "principal", "valid", "institute", "technology", "college",
+                "university", "school", "department"]
+NAME_LABELS = ["student name", "name", "candidate", "applicant"]
+AMOUNT_HINTS = ["total", "grand total", "amount", "paid", "payable", "net", "fee", "inr", "rs", "₹"]
+FEE_KEYWORDS = ["total", "payable", "amount", "bank", "cash", "received", "receipt"]
+FEE_IGNORE_HINTS = ["date", "receipt no", "roll", "register", "reg", "sem", "period", "class"]
+
+VENDOR_SKIP = ["gstin", "invoice no", "invoice date", "tax invoice"]
+COMPANY_HINTS = ["private limited", "pvt", "ltd", "limited", "services", "traders", "enterprise"]
+BILL_TO_SKIP = ["address", "phone", "gstin", "invoice", "date", "place of supply", "tax"]
+ITEM_TABLE_HINTS = ["item details", "description", "hsn", "sno", "s.no", "particulars"]
+ADDRESS_STOP = ["taxable", "gst registration", "central goods", "thank you", "powered by"]
+ITEM_HINTS = ["gst registration", "standard package", "package", "service", "consult", "subscription"]
+ITEM_NEXT_SKIP = ["tax", "gst", "invoice"]
+TOTAL_HINTS = ["total payable", "grand total", "invoice amount"]
+TAXABLE_HINTS = ["gst registration", "standard package", "taxable"]
+
+_AUTOMATON = KeywordAutomaton(chain(
+    COLLEGE_HINTS, HEADER_WORDS, ID_NAME_STOP, NAME_LABELS, AMOUNT_HINTS, FEE_KEYWORDS, FEE_IGNORE_HINTS,
+    VENDOR_SKIP, COMPANY_HINTS, BILL_TO_SKIP, ITEM_TABLE_HINTS, ADDRESS_STOP, ITEM_HINTS, ITEM_NEXT_SKIP,
+    TOTAL_HINTS, TAXABLE_HINTS, ["bill", "customer", "billing", "grand", "fee", "tuition", "development", "training"],
+    doc_rules.keywords(),
+))
+
+Lines = Union[List[Dict[str, Any]], LineIndex]
+
+
+def line_index(lines: Lines) -> LineIndex:
+    """Build the shared per-document index (or pass one through)."""
+    if isinstance(lines, LineIndex):
+        return lines
+    return LineIndex(lines, _AUTOMATON)
+
+
 def _clean(s: str) -> str:
     s = (s or "").replace("|", " ").replace("_", " ").replace("—", " ")
     s = re.sub(r"\s+", " ", s).strip()
@@ -26,69 +65,29 @@ def _fix_common_ocr(s: str) -> str:
     s = re.sub(r"\bCHENNAL\b", "CHENNAI", s, flags=re.I)
     return s
 
-def extract_fee_receipt_amount(lines):
-    texts = [x["text"] for x in lines if x.get("text")]
-    best = None
-    best_rank = -1
-
-    KEYWORDS = ["total", "payable", "bank", "cash", "amount", "receipt"]
-    IGNORE = ["roll", "sem", "period", "date", "receipt no", "register"]
-
-    for t in texts:
-        tl = t.lower()
 
-        if any(w in tl for w in IGNORE):
-            continue
-
-        vals = money_candidates(t)  # uses your existing money parser
-        if not vals:
-            continue
-
-        v = max(vals)
-        rank = 0
+def _raw(ix: LineIndex) -> LineView:
+    return ix.view("raw")
 
-        if any(k in tl for k in KEYWORDS):
-            rank += 80
-        if "total" in tl:
-            rank += 40
-        if "bank" in tl or "cash" in tl:
-            rank += 25
 
-        # receipts usually have amounts like 5k–5L; prefer plausible ones
-        if 1000 <= v <= 500000:
-            rank += 10
+def _stripped(ix: LineIndex) -> LineView:
+    return ix.view("stripped", str.strip, like="raw")
 
-        # prefer larger amounts (total) over smaller line items
-        rank += min(30, int(v // 1000))
 
-        if rank > best_rank:
-            best_rank = rank
-            best = v
-
-    if best is not None:
-        return best
-
-    # fallback: sum item lines if we can find 2+ fee lines
-    item_vals = []
-    for t in texts:
-        tl = t.lower()
-        if "fee" in tl or "tuition" in tl or "development" in tl or "training" in tl:
-            vals = money_candidates(t)
-            if vals:
-                item_vals.append(max(vals))
-    if len(item_vals) >= 2:
-        return float(sum(item_vals))
+def _fixed(ix: LineIndex) -> LineView:
+    return ix.view("fixed", _fix_common_ocr)
 
-    return None
+_CIT_RE = re.compile(r"CHENNAI\s+INSTITUTE\s+OF\s+TECHNOLOGY")
+_ADDRESS_TAIL_RE = re.compile(r"\b(sarathy|nagar|kundrathur|chennai\s*-|\b\d{6}\b)\b", re.I)
 
 
-def extract_college_header(lines):
-    texts = [_fix_common_ocr(x["text"]) for x in lines if x.get("text")]
+def extract_college_header(lines: Lines) -> str:
+    texts = _fixed(line_index(lines)).texts
     top = texts[:12]
 
     # Strong exact match anywhere in header lines
     joined = " ".join(top).upper()
-    m = re.search(r"CHENNAI\s+INSTITUTE\s+OF\s+TECHNOLOGY", joined)
+    m = _CIT_RE.search(joined)
     if m:
         return "Chennai Institute of Technology"
 
@@ -99,11 +98,11 @@ def extract_college_header(lines):
         cand1 = top[i]
         cand2 = top[i] + " " + (top[i + 1] if i + 1 < len(top) else "")
         for cand in (cand1, cand2):
-            c = _fix_common_ocr(cand)
-            cl = c.lower()
+            # both halves are already fixed; joining them only needs the edges trimmed
+            c = cand.strip()
 
             # strip address-ish tails if present
-            c = re.split(r"\b(sarathy|nagar|kundrathur|chennai\s*-|\b\d{6}\b)\b", c, 1, flags=re.I)[0].strip(" ,.-")
+            c = _ADDRESS_TAIL_RE.split(c, 1)[0].strip(" ,.-")
             cl = c.lower()
 
             score = 0
@@ -120,58 +119,71 @@ def extract_college_header(lines):
 
     return best
 
-def extract_marksheet_name(lines):
-    texts = [_fix_common_ocr(x["text"]) for x in lines if x.get("text")]
 
-    for t in texts:
-        if re.search(r"\bname\b", t, re.I):
-            after = re.split(r"\bname\b", t, maxsplit=1, flags=re.I)[1]
+_NAME_WORD_RE = re.compile(r"\bname\b", re.I)
+_MARKSHEET_FIELD_RE = re.compile(r"\b(dept|department|year|register|reg|roll|semester|batch|programme|program)\b", re.I)
+_NON_NAME_CHARS_RE = re.compile(r"[^A-Za-z.\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def extract_marksheet_name(lines: Lines) -> str:
+    v = _fixed(line_index(lines))
+
+    for i, t in enumerate(v.texts):
+        if v.has_word(i, "name"):
+            after = _NAME_WORD_RE.split(t, maxsplit=1)[1]
             after = after.replace(":", " ").strip()
             # cut off at common fields on marksheets
-            after = re.split(r"\b(dept|department|year|register|reg|roll|semester|batch|programme|program)\b", after, 1, flags=re.I)[0]
-            after = re.sub(r"[^A-Za-z.\s]", " ", after)
-            after = re.sub(r"\s+", " ", after).strip()
+            after = _MARKSHEET_FIELD_RE.split(after, 1)[0]
+            after = _NON_NAME_CHARS_RE.sub(" ", after)
+            after = _SPACES_RE.sub(" ", after).strip()
             if after:
                 return after.title()
 
     return ""  # let fallback handle if needed
 
-def extract_student_id_name(lines):
-    texts = [_fix_common_ocr(x["text"]) for x in lines if x.get("text")]
 
-    # Find where college header likely ends, then search after it
+_YEAR_RANGE_RE = re.compile(r"\b\d{4}\s*-\s*\d{4}\b")
+_DEGREE_RE = re.compile(r"\b(b\.?e|b\.?tech|m\.?e|mba|cse|ece|eee|it)\b", re.I)
+_SINGLE_LETTER_RE = re.compile(r"[A-Za-z]")
+_BRACKETED_RE = re.compile(r"\(.*\)")
+
+
+def _header_end(v: LineView) -> int:
+    """Index just past the last college-header-looking line in the top 12."""
     start = 0
-    for i, t in enumerate(texts[:12]):
-        tl = t.lower()
-        if any(w in tl for w in ["institute", "technology", "college", "university", "school"]):
+    for i in range(min(12, len(v))):
+        if v.has_any(i, HEADER_WORDS):
             start = i + 1
+    return start
 
-    # Scan a small window after the header (this is where the name is on most IDs)
-    window = texts[start:start + 12]
 
-    stop_contains = [
-        "autonomous", "principal", "valid", "institute", "technology", "college",
-        "university", "school", "department"
-    ]
+def extract_student_id_name(lines: Lines) -> str:
+    v = _fixed(line_index(lines))
+
+    # Find where college header likely ends, then search after it
+    start = _header_end(v)
 
     best = ""
     best_score = -10**9
 
-    for t in window:
+    # Scan a small window after the header (this is where the name is on most IDs)
+    for i in range(start, min(start + 12, len(v))):
+        t = v.texts[i]
         s = _clean(t)
-        sl = s.lower()
 
         if not s or len(s) < 2:
             continue
-        if any(x in sl for x in stop_contains):
+        # fixed text is already _clean'ed, so its keyword hits are s's
+        if v.has_any(i, ID_NAME_STOP):
             continue
-        if re.search(r"\b\d{4}\s*-\s*\d{4}\b", s):  # 2023-2027
+        if _YEAR_RANGE_RE.search(s):  # 2023-2027
             continue
-        if re.search(r"\b(b\.?e|b\.?tech|m\.?e|mba|cse|ece|eee|it)\b", s, re.I):
+        if _DEGREE_RE.search(s):
             continue
-        if re.fullmatch(r"[A-Za-z]", s):  # single letter like "A"
+        if _SINGLE_LETTER_RE.fullmatch(s):  # single letter like "A"
             continue
-        if re.fullmatch(r"\(.*\)", s):  # anything purely in brackets like "(Autonomous)"
+        if _BRACKETED_RE.fullmatch(s):  # anything purely in brackets like "(Autonomous)"
             continue
         if any(ch.isdigit() for ch in s):
             continue
@@ -202,20 +214,47 @@ def extract_student_id_name(lines):
 # Generic extractors (IDs/marksheets/receipts)
 # -------------------------
 
-def extract_name(lines: List[Dict[str, Any]]) -> str:
-    plain = [x["text"] for x in lines if x.get("text")]
-    v = best_labeled_value(plain, ["student name", "name", "candidate", "applicant"])
-    if v:
-        return v.strip()
+@lru_cache(maxsize=None)
+def _label_re(key: str):
+    return re.compile(rf"\b{key}\b\s*[:\-]\s*(.+)$", re.I)
+
+
+def _labeled_value(v: LineView, keys: List[str]) -> str:
+    # utils.best_labeled_value over a view: keys are tried in order on each
+    # line, but only lines that contain the key at all reach the regex
+    for i, ln in enumerate(v.texts):
+        hits = v.hits[i]
+        s = None
+        for k in keys:
+            if k not in hits:
+                continue
+            if s is None:
+                s = ln.strip()
+            m = _label_re(k).search(s)
+            if m:
+                val = m.group(1).strip()
+                if val:
+                    return val
+    return ""
+
+
+NAME_SKIP_WORDS = {"dob", "date", "roll", "reg", "id", "class", "dept", "semester", "year"}
+
+
+def extract_name(lines: Lines) -> str:
+    v = _raw(line_index(lines))
+    val = _labeled_value(v, NAME_LABELS)
+    if val:
+        return val.strip()
 
     # fallback: pick best alpha-heavy 2-5 words line
     best = ""
     bestscore = -1
-    for ln in plain:
+    for i, ln in enumerate(v.texts):
         s = ln.strip()
         if len(s) < 4:
             continue
-        if re.search(r"\b(dob|date|roll|reg|id|class|dept|semester|year)\b", s, re.I):
+        if v.has_any_word(i, NAME_SKIP_WORDS):
             continue
         alpha = sum(c.isalpha() for c in s)
         dig = sum(c.isdigit() for c in s)
@@ -231,65 +270,63 @@ def extract_name(lines: List[Dict[str, Any]]) -> str:
     return best
 
 
-def extract_college(lines: List[Dict[str, Any]]) -> str:
-    top = pick_top_region(lines, frac=0.35)
+COLLEGE_SKIP_WORDS = {"name", "dob", "id", "roll", "reg"}
+
+
+def extract_college(lines: Lines) -> str:
+    ix = line_index(lines)
+    v = _stripped(ix)
     cand = ""
     cscore = -1
-    for it in top:
-        s = (it.get("text") or "").strip()
+    for i in ix.top_region(frac=0.35):
+        s = v.texts[i]
         if not s:
             continue
-        sl = s.lower()
 
         score = len(s)
-        if any(h in sl for h in COLLEGE_HINTS):
+        if v.has_any(i, COLLEGE_HINTS):
             score += 25
 
-        if len(s.split()) >= 3 and score > cscore and not re.search(r"\b(name|dob|id|roll|reg)\b", s, re.I):
+        if len(s.split()) >= 3 and score > cscore and not v.has_any_word(i, COLLEGE_SKIP_WORDS):
             cscore = score
             cand = s
 
     if cand:
         return cand
 
-    for it in lines:
-        s = (it.get("text") or "").strip()
-        if any(h in s.lower() for h in COLLEGE_HINTS):
+    for i, s in enumerate(v.texts):
+        if v.has_any(i, COLLEGE_HINTS):
             return s
     return ""
 
 
-def extract_amount_generic(lines: List[Dict[str, Any]]) -> Optional[float]:
+def extract_amount_generic(lines: Lines) -> Optional[float]:
     # Works for receipts that include ₹/Rs/INR in text
+    v = _raw(line_index(lines))
+    money = v.per_line("money", money_candidates)
     best_val = None
     best_rank = -1
-    AMOUNT_HINTS = ["total", "grand total", "amount", "paid", "payable", "net", "fee", "inr", "rs", "₹"]
 
-    for it in lines:
-        tx = it.get("text") or ""
-        vals = money_candidates(tx)
+    for i, vals in enumerate(money):
         if not vals:
             continue
 
         rank = 0
-        tl = tx.lower()
-        if any(k in tl for k in AMOUNT_HINTS):
+        if v.has_any(i, AMOUNT_HINTS):
             rank += 50
-        if "total" in tl or "grand" in tl:
+        if v.has(i, "total") or v.has(i, "grand"):
             rank += 30
 
-        v = max(vals)
-        rank += min(20, int(v // 1000))
+        val = max(vals)
+        rank += min(20, int(val // 1000))
         if rank > best_rank:
             best_rank = rank
-            best_val = v
+            best_val = val
 
     if best_val is not None:
         return float(best_val)
 
-    allv = []
-    for it in lines:
-        allv += money_candidates(it.get("text") or "")
+    allv = [x for vals in money for x in vals]
     if allv:
         return float(max(allv))
     return None
@@ -299,12 +336,15 @@ def extract_amount_generic(lines: List[Dict[str, Any]]) -> Optional[float]:
 # Invoice extractor (robust)
 # -------------------------
 
+_NUM_RE = re.compile(r"\b\d+(?:\.\d{1,2})?\b")
+
+
 def _nums_from_text(s: str) -> List[float]:
     # Extract numbers like 5,30,000 or 95400.00; ignore dates containing "/"
     if not s or "/" in s:
         return []
     s2 = s.replace(",", "")
-    found = re.findall(r"\b\d+(?:\.\d{1,2})?\b", s2)
+    found = _NUM_RE.findall(s2)
     out = []
     for x in found:
         try:
@@ -319,6 +359,11 @@ def _max_num_from_text(s: str, min_value: float = 0.0) -> Optional[float]:
     return max(nums) if nums else None
 
 
+def _max_num(nums: List[float], min_value: float = 0.0) -> Optional[float]:
+    nums = [n for n in nums if n >= min_value]
+    return max(nums) if nums else None
+
+
 def _find_first_index(texts: List[str], patterns: List[str]) -> int:
     for i, t in enumerate(texts):
         for p in patterns:
@@ -326,31 +371,6 @@ def _find_first_index(texts: List[str], patterns: List[str]) -> int:
                 return i
     return -1
 
-import re
-from utils import parse_phone
-
-COLORS = {
-    "black","white","red","blue","green","yellow","orange","pink","purple","violet",
-    "grey","gray","silver","gold","brown","beige","maroon","navy","teal"
-}
-
-def _nums_from_text(s: str):
-    if not s or "/" in s:
-        return []
-    s2 = s.replace(",", "")
-    found = re.findall(r"\b\d+(?:\.\d{1,2})?\b", s2)
-    out = []
-    for x in found:
-        try:
-            out.append(float(x))
-        except Exception:
-            pass
-    return out
-
-def _max_num_from_text(s: str, min_value: float = 0.0):
-    nums = [n for n in _nums_from_text(s) if n >= min_value]
-    return max(nums) if nums else None
-
 def _dedupe_exact_repeat_words(s: str) -> str:
     w = s.split()
     n = len(w)
@@ -358,73 +378,103 @@ def _dedupe_exact_repeat_words(s: str) -> str:
         return " ".join(w[: n // 2])
     return s
 
+_COLUMN_GAP_RE = re.compile(r"\s{2,}")
+_ADDR_NUM_START_RE = re.compile(r"\b\d+\s*,")
+_PINCODE_RE = re.compile(r"\b[1-9][0-9]{5}\b")
+
+
 def _take_left_columnish(s: str) -> str:
     s = s.strip()
     s = _dedupe_exact_repeat_words(s)
 
     # If we have clear column spacing, take left column
-    if re.search(r"\s{2,}", s):
-        return re.split(r"\s{2,}", s)[0].strip()
+    if _COLUMN_GAP_RE.search(s):
+        return _COLUMN_GAP_RE.split(s)[0].strip()
 
     # If we see 2 occurrences of "6," style starts, cut at 2nd
-    starts = [m.start() for m in re.finditer(r"\b\d+\s*,", s)]
+    starts = [m.start() for m in _ADDR_NUM_START_RE.finditer(s)]
     if len(starts) >= 2:
         return s[: starts[1]].strip()
 
     # If we see 2 pincodes, cut after first pincode
-    pm = re.search(r"\b[1-9][0-9]{5}\b", s)
+    pm = _PINCODE_RE.search(s)
     if pm:
         idx = pm.end()
         return s[:idx].strip(" .,-")
 
     return s
 
-def extract_invoice(lines):
-    texts = [x["text"].strip() for x in lines if x.get("text")]
+
+_INVOICE_TITLE_RE = re.compile(r"\bTAX\s+INVOICE\b|\bINVOICE\b", re.I)
+_ALPHA_RE = re.compile(r"[A-Za-z]")
+_VENDOR_SKIP_RE = re.compile(r"\b(gstin|invoice no|invoice date|tax invoice)\b")
+_BILL_TO_RE = re.compile(r"\bbill\s*to\b|\bbilled\s*to\b", re.I)
+_CUSTOMER_RE = re.compile(r"^\s*customer\s*:", re.I)
+_CUSTOMER_PREFIX_RE = re.compile(r"(?i)^\s*customer\s*:\s*")
+_CUSTOMER_NEXT_SKIP_RE = re.compile(r"(billing address|shipping address|gstin|invoice)", re.I)
+_ADDRESS_LABEL_RE = re.compile(r"\baddress\b\s*:", re.I)
+_ADDRESS_PREFIX_RE = re.compile(r"(?i)\*?\s*address\s*:\s*")
+_BILLING_ADDRESS_RE = re.compile(r"\bbilling\s+address\b", re.I)
+_BILL_SHIP_RE = re.compile(r"billing address|shipping address", re.I)
+_INDIA_TAIL_RE = re.compile(r"(?i)\bindia\b.*$")
+_ROW_NUMBERS_TAIL_RE = re.compile(r"\s+\d[\d,]*(?:\.\d{1,2})?\b.*$")
+_SNO_PREFIX_RE = re.compile(r"^\d+\s+")
+_SNO_DESC_RE = re.compile(r"^(?P<desc>.+?)\s+\d{4,8}\s+\d+\s+")
+_LONG_NUM_RE = re.compile(r"\s+\d{4,}\b")
+TABLE_HEADER_WORDS = {"description", "hsn", "qty", "rate", "amount"}
+PHONE_WORDS = {"phone", "mobile"}
+
+
+def extract_invoice(lines: Lines) -> Dict[str, Any]:
+    ix = line_index(lines)
+    v = _stripped(ix)
+    texts = v.texts
+    # line-item table rebuilt from word boxes (None for lines without geometry)
+    table = invoice_table(ix.lines)
+    nums = v.per_line("nums", _nums_from_text)
 
     # ---------- Vendor ----------
     vendor_name = ""
     if texts:
         # Often vendor + TAX INVOICE is on same line
         first = texts[0]
-        parts = re.split(r"\bTAX\s+INVOICE\b|\bINVOICE\b", first, maxsplit=1, flags=re.I)
+        parts = _INVOICE_TITLE_RE.split(first, maxsplit=1)
         left = parts[0].strip(" -:") if parts else ""
-        if len(left.split()) >= 2 and re.search(r"[A-Za-z]", left):
+        if len(left.split()) >= 2 and _ALPHA_RE.search(left):
             vendor_name = left
 
     if not vendor_name:
         # fallback: pick a company-like header line
-        for t in texts[:15]:
-            tl = t.lower()
-            if re.search(r"\b(gstin|invoice no|invoice date|tax invoice)\b", tl):
+        for i in range(min(15, len(texts))):
+            if v.has_any(i, VENDOR_SKIP) and _VENDOR_SKIP_RE.search(v.lower[i]):
                 continue
-            if len(t.split()) >= 2 and re.search(r"(private limited|pvt|ltd|limited|services|traders|enterprise)", tl):
-                vendor_name = t
+            if len(texts[i].split()) >= 2 and v.has_any(i, COMPANY_HINTS):
+                vendor_name = texts[i]
                 break
 
     # ---------- Customer name + phone ----------
     cust_name, cust_phone = "", ""
 
     # 1) Bill To style
-    bill_to_idx = next((i for i,t in enumerate(texts) if re.search(r"\bbill\s*to\b|\bbilled\s*to\b", t, re.I)), -1)
+    bill_to_idx = next((i for i, t in enumerate(texts) if v.has(i, "bill") and _BILL_TO_RE.search(t)), -1)
     if bill_to_idx != -1:
         for j in range(bill_to_idx + 1, min(bill_to_idx + 18, len(texts))):
             t = texts[j]
-            if not cust_name and 1 < len(t.split()) <= 6 and re.search(r"[A-Za-z]", t):
-                if not re.search(r"(address|phone|gstin|invoice|date|place of supply|tax)", t, re.I):
+            if not cust_name and 1 < len(t.split()) <= 6 and _ALPHA_RE.search(t):
+                if not v.has_any(j, BILL_TO_SKIP):
                     cust_name = t
-            if re.search(r"\bphone\b|\bmobile\b", t, re.I):
+            if v.has_any_word(j, PHONE_WORDS):
                 p = parse_phone(t)
                 if p:
                     cust_phone = p
-            if re.search(r"(item details|description|hsn|s\.?no|particulars)", t, re.I):
+            if v.has_any(j, ITEM_TABLE_HINTS):
                 break
 
     # 2) Customer: style (VERVE invoice)
     if not cust_name:
-        cust_idx = next((i for i,t in enumerate(texts) if re.search(r"^\s*customer\s*:", t, re.I)), -1)
+        cust_idx = next((i for i, t in enumerate(texts) if v.has(i, "customer") and _CUSTOMER_RE.search(t)), -1)
         if cust_idx != -1:
-            after = re.sub(r"(?i)^\s*customer\s*:\s*", "", texts[cust_idx]).strip()
+            after = _CUSTOMER_PREFIX_RE.sub("", texts[cust_idx]).strip()
             after = _dedupe_exact_repeat_words(after)
             if len(after.split()) >= 2:
                 cust_name = after
@@ -432,8 +482,8 @@ def extract_invoice(lines):
                 # look for next good name line
                 for j in range(cust_idx + 1, min(cust_idx + 6, len(texts))):
                     cand = _dedupe_exact_repeat_words(texts[j])
-                    if 1 < len(cand.split()) <= 5 and re.search(r"[A-Za-z]", cand):
-                        if not re.search(r"(billing address|shipping address|gstin|invoice)", cand, re.I):
+                    if 1 < len(cand.split()) <= 5 and _ALPHA_RE.search(cand):
+                        if not _CUSTOMER_NEXT_SKIP_RE.search(cand):
                             cust_name = cand
                             break
 
@@ -443,25 +493,25 @@ def extract_invoice(lines):
     cust_addr = ""
 
     # Prefer explicit Address: label (Bill-To invoices)
-    for t in texts:
-        if re.search(r"\baddress\b\s*:", t, re.I):
-            cust_addr = re.sub(r"(?i)\*?\s*address\s*:\s*", "", t).strip()
+    for i, t in enumerate(texts):
+        if v.has_word(i, "address") and _ADDRESS_LABEL_RE.search(t):
+            cust_addr = _ADDRESS_PREFIX_RE.sub("", t).strip()
             break
 
     # VERVE invoice: Billing Address / Shipping Address block
     if not cust_addr:
-        hdr_idx = next((i for i,t in enumerate(texts) if re.search(r"\bbilling\s+address\b", t, re.I)), -1)
+        hdr_idx = next((i for i, t in enumerate(texts) if v.has(i, "billing") and _BILLING_ADDRESS_RE.search(t)), -1)
         if hdr_idx != -1:
             parts = []
             for j in range(hdr_idx + 1, min(hdr_idx + 10, len(texts))):
                 t = texts[j]
-                if re.search(r"(taxable|gst registration|central goods|thank you|powered by)", t, re.I):
+                if v.has_any(j, ADDRESS_STOP):
                     break
                 t2 = _take_left_columnish(t)
                 t2 = _dedupe_exact_repeat_words(t2)
                 if cust_name and t2.strip().lower() == cust_name.strip().lower():
                     continue
-                if re.search(r"billing address|shipping address", t2, re.I):
+                if _BILL_SHIP_RE.search(t2):
                     continue
                 if len(t2.strip()) < 2:
                     continue
@@ -470,71 +520,73 @@ def extract_invoice(lines):
             # Join into a single address string
             if parts:
                 # remove trailing INDIA noise if present
-                parts = [re.sub(r"(?i)\bindia\b.*$", "", p).strip(" ,") for p in parts]
+                parts = [_INDIA_TAIL_RE.sub("", p).strip(" ,") for p in parts]
                 cust_addr = ", ".join([p for p in parts if p])
 
     # ---------- Item ----------
     item = ""
 
+    # first row of the reconstructed table
+    if table:
+        item = table["rows"][0].get("description", "")
+
     # Prefer line-item rows: find a line with text + multiple numbers (like VERVE)
-    for i, t in enumerate(texts):
-        tl = t.lower()
-        if re.search(r"(gst registration|standard package|package|service|consult|subscription)", tl):
-            if len(_nums_from_text(t)) >= 2:
-                base = re.sub(r"\s+\d[\d,]*(?:\.\d{1,2})?\b.*$", "", t).strip()
-                base = base.rstrip("-").strip()
-                # if next line is a short descriptor, append it
-                nxt = texts[i + 1] if i + 1 < len(texts) else ""
-                if nxt and re.search(r"[A-Za-z]", nxt) and len(nxt.split()) <= 6 and not re.search(r"(tax|gst|invoice)", nxt, re.I):
-                    item = f"{base} - {nxt.strip()}" if base else nxt.strip()
-                else:
-                    item = base
-                break
+    if not item:
+        for i, t in enumerate(texts):
+            if v.has_any(i, ITEM_HINTS):
+                if len(nums[i]) >= 2:
+                    base = _ROW_NUMBERS_TAIL_RE.sub("", t).strip()
+                    base = base.rstrip("-").strip()
+                    # if next line is a short descriptor, append it
+                    nxt = texts[i + 1] if i + 1 < len(texts) else ""
+                    if nxt and _ALPHA_RE.search(nxt) and len(nxt.split()) <= 6 and not v.has_any(i + 1, ITEM_NEXT_SKIP):
+                        item = f"{base} - {nxt.strip()}" if base else nxt.strip()
+                    else:
+                        item = base
+                    break
 
     # fallback: the “S.No row” style (tractor invoice)
     if not item:
-        for t in texts:
-            if re.match(r"^\d+\s+", t) and not re.search(r"\bdescription\b|\bhsn\b|\bqty\b|\brate\b|\bamount\b", t, re.I):
-                row = re.sub(r"^\d+\s+", "", t).strip()
-                m = re.search(r"^(?P<desc>.+?)\s+\d{4,8}\s+\d+\s+", row)
-                item = (m.group("desc").strip() if m else re.split(r"\s+\d{4,}\b", row)[0].strip())
+        for i, t in enumerate(texts):
+            if _SNO_PREFIX_RE.match(t) and not v.has_any_word(i, TABLE_HEADER_WORDS):
+                row = _SNO_PREFIX_RE.sub("", t).strip()
+                m = _SNO_DESC_RE.search(row)
+                item = (m.group("desc").strip() if m else _LONG_NUM_RE.split(row)[0].strip())
                 break
 
     # ---------- Color ----------
+    # first line naming a colour; within it, the first colour word
     color = ""
-    for t in texts:
-        tl = t.lower()
-        for c in COLORS:
-            if re.search(rf"\b{re.escape(c)}\b", tl):
-                color = c.title()
-                break
-        if color:
+    for i in range(len(texts)):
+        if v.has_any_word(i, COLORS):
+            color = next(w for w in re.findall(r"\w+", v.lower[i]) if w in COLORS).title()
             break
 
     # ---------- Amount ----------
-    amount = None
+    # printed total, or line amounts + GST, read from the table columns
+    amount = table_total(table)
 
     # direct total payable / grand total
-    for i, t in enumerate(texts):
-        if re.search(r"(total payable|grand total|invoice amount|total payable)", t, re.I):
-            v = _max_num_from_text(t, min_value=1)
-            if v is None and i + 1 < len(texts):
-                v = _max_num_from_text(texts[i + 1], min_value=1)
-            if v is not None:
-                amount = v
-                break
+    if amount is None:
+        for i in range(len(texts)):
+            if v.has_any(i, TOTAL_HINTS):
+                val = _max_num(nums[i], min_value=1)
+                if val is None and i + 1 < len(texts):
+                    val = _max_num(nums[i + 1], min_value=1)
+                if val is not None:
+                    amount = val
+                    break
 
     # VERVE invoice often OCR misses "Total Payable" but we can compute:
     # total = taxable + cgst + sgst from the item row numbers
     if amount is None:
-        for t in texts:
-            tl = t.lower()
-            if re.search(r"(gst registration|standard package|taxable)", tl):
-                nums = [n for n in _nums_from_text(t) if n >= 1]
-                if not nums:
+        for i in range(len(texts)):
+            if v.has_any(i, TAXABLE_HINTS):
+                row = [n for n in nums[i] if n >= 1]
+                if not row:
                     continue
-                taxable = max(nums)
-                taxes = [n for n in nums if 0 < n < 0.60 * taxable]  # exclude duplicate taxable/rate
+                taxable = max(row)
+                taxes = [n for n in row if 0 < n < 0.60 * taxable]  # exclude duplicate taxable/rate
                 if len(taxes) >= 2:
                     taxes = sorted(taxes, reverse=True)[:2]
                     amount = taxable + sum(taxes)
@@ -549,10 +601,14 @@ def extract_invoice(lines):
         "vendor_name": vendor_name,
         "item": item,
         "color": color,
-        "raw_ocr_lines": texts,
+        "line_items": table["rows"] if table else [],
+        "raw_ocr_lines": list(texts),
     }
 
-import re
+
+_LOOSE_NUM_RE = re.compile(r"\b\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?\b|\b\d+(?:\.\d{1,2})?\b")
+_DATE_RE = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b")
+
 
 def _num_candidates_loose(text: str):
     """
@@ -564,7 +620,7 @@ def _num_candidates_loose(text: str):
     # remove obvious separators that break OCR
     t = text.replace("O", "0")
     # find comma-formatted and plain numbers
-    raw = re.findall(r"\b\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?\b|\b\d+(?:\.\d{1,2})?\b", t)
+    raw = _LOOSE_NUM_RE.findall(t)
     out = []
     for x in raw:
         try:
@@ -573,124 +629,124 @@ def _num_candidates_loose(text: str):
             pass
     return out
 
-def extract_fee_receipt_amount(lines):
-    texts = [x["text"] for x in lines if x.get("text")]
-
-    KEYWORDS = ["total", "payable", "amount", "bank", "cash", "received", "receipt"]
-    IGNORE_HINTS = ["date", "receipt no", "roll", "register", "reg", "sem", "period", "class"]
+def extract_fee_receipt_amount(lines: Lines) -> Optional[float]:
+    v = _raw(line_index(lines))
+    has_date = v.per_line("has_date", lambda t: _DATE_RE.search(t) is not None)
+    # plausible fee-like amounts per line
+    fee_vals = v.per_line("fee_vals", lambda t: [x for x in _num_candidates_loose(t) if 1000 <= x <= 5_000_000])
 
     best_val = None
     best_rank = -10**9
 
-    for t in texts:
-        tl = t.lower()
-
+    for i in range(len(v)):
         # skip obvious non-amount lines
-        if any(h in tl for h in IGNORE_HINTS):
+        if v.has_any(i, FEE_IGNORE_HINTS):
             continue
         # skip date formats like 02/07/2025
-        if re.search(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", t):
-            continue
-
-        vals = _num_candidates_loose(t)
-        if not vals:
+        if has_date[i]:
             continue
 
-        # keep only plausible fee-like amounts
-        vals = [v for v in vals if 1000 <= v <= 5_000_000]
+        vals = fee_vals[i]
         if not vals:
             continue
 
-        v = max(vals)
+        val = max(vals)
         rank = 0
 
-        if any(k in tl for k in KEYWORDS):
+        if v.has_any(i, FEE_KEYWORDS):
             rank += 80
-        if "total" in tl:
+        if v.has(i, "total"):
             rank += 50
-        if "bank" in tl or "cash" in tl:
+        if v.has(i, "bank") or v.has(i, "cash"):
             rank += 30
 
         # Prefer larger values (total) over small line items
-        rank += min(40, int(v // 1000))
+        rank += min(40, int(val // 1000))
 
         if rank > best_rank:
             best_rank = rank
-            best_val = v
+            best_val = val
 
     if best_val is not None:
         return best_val
 
     # fallback: just take the maximum plausible number in the entire receipt
     all_vals = []
-    for t in texts:
-        if re.search(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", t):
+    for i in range(len(v)):
+        if has_date[i]:
             continue
-        all_vals += [v for v in _num_candidates_loose(t) if 1000 <= v <= 5_000_000]
+        all_vals += fee_vals[i]
     return max(all_vals) if all_vals else None
 
 # -------------------------
-# Dispatcher
+# Progressive OCR support
 # -------------------------
-def extract_by_doc_type(doc_type: str, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+# Fields each header-driven doc type needs before OCR can stop early
+REQUIRED_FIELDS = {
+    "student_id": ["college", "name"], "id_card": ["college", "name"], "id": ["college", "name"],
+    "marksheet": ["college", "name"], "mark_sheet": ["college", "name"], "result": ["college", "name"],
+}
+
+_INSTITUTION_RE = re.compile(r"(institute|university|college|school)", re.I)
+
+
+def missing_fields(doc_type: str, lines: Lines) -> List[str]:
+    """
+    Which REQUIRED_FIELDS are not yet found with enough confidence in the lines
+    OCR'd so far. An empty list means the remaining page can be skipped.
+    """
     dt = (doc_type or "").lower().strip()
-    raw = [x["text"] for x in lines if x.get("text")]
-
-    if dt in ["invoice", "bill"]:
-        return extract_invoice(lines)
-
-    if dt in ["fees_receipt", "fee_receipt", "fee", "receipt"]:
-        return {
-            "name": extract_name(lines),
-            "college": extract_college(lines),
-            "phone": "",
-            "address": "",
-            "amount": extract_fee_receipt_amount(lines),
-            "vendor_name": "",
-            "item": "",
-            "color": "",
-            "raw_ocr_lines": raw,
-        }
-
-    if dt in ["student_id", "id_card", "id"]:
-        college = extract_college_header(lines) or extract_college(lines)
-        name = extract_student_id_name(lines) or extract_name(lines)
-        return {
-            "name": name,
-            "college": college,
-            "phone": "",
-            "address": "",
-            "amount": None,
-            "vendor_name": "",
-            "item": "",
-            "color": "",
-            "raw_ocr_lines": raw,
-        }
-
-    if dt in ["marksheet", "mark_sheet", "result"]:
-        college = extract_college_header(lines) or extract_college(lines)
-        name = extract_marksheet_name(lines) or extract_name(lines)
-        return {
-            "name": name,
-            "college": college,
-            "phone": "",
-            "address": "",
-            "amount": None,
-            "vendor_name": "",
-            "item": "",
-            "color": "",
-            "raw_ocr_lines": raw,
-        }
-
-    # default fallback
-    return {
-        "name": extract_name(lines),
-        "college": extract_college(lines),
-        "phone": "",
-        "address": "",
-        "amount": extract_amount_generic(lines),
-        "vendor_name": "",
-        "item": "",
-        "color": "",
-        "raw_ocr_lines": raw,
-    }
+    need = REQUIRED_FIELDS.get(dt)
+    if not need:
+        return ["*"]  # not a header-driven doc type: always OCR the whole page
+
+    ix = line_index(lines)
+    v = _fixed(ix)
+    start = _header_end(v)
+    missing = []
+
+    if "college" in need:
+        college = extract_college_header(ix)
+        # header must look like an institution and be followed by a non-header line
+        ok = bool(college) and _INSTITUTION_RE.search(college)
+        if not ok or start == 0 or start >= len(v):
+            missing.append("college")
+
+    if "name" in need:
+        if dt in ["marksheet", "mark_sheet", "result"]:
+            if not extract_marksheet_name(ix):
+                missing.append("name")
+        else:
+            name = extract_student_id_name(ix)
+            words = name.split()
+            # name must be name-like, and we want a few lines after the header so a
+            # better candidate further down the window isn't cut off
+            ok = 1 <= len(words) <= 4 and sum(ch.isalpha() for ch in name) >= 5
+            if not ok or len(v) - start < 4:
+                missing.append("name")
+
+    return missing
+
+
+# -------------------------
+# Dispatcher
+# -------------------------
+# Extractors the doc_rules rules can name as "builtin"
+BUILTINS = {
+    "extract_invoice": extract_invoice,
+    "extract_fee_receipt_amount": extract_fee_receipt_amount,
+    "extract_college_header": extract_college_header,
+    "extract_marksheet_name": extract_marksheet_name,
+    "extract_student_id_name": extract_student_id_name,
+    "extract_name": extract_name,
+    "extract_college": extract_college,
+    "extract_amount_generic": extract_amount_generic,
+}
+
+
+def extract_by_doc_type(doc_type: str, lines: Lines) -> Dict[str, Any]:
+    # one index per document: every extractor and declarative field queries it
+    ix = line_index(lines)
+    rule = doc_rules.rule_for(doc_type)
+    return rule.evaluate(ix, _fixed(ix), list(_raw(ix).texts), BUILTINS)
@@ -0,0 +1,161 @@
+"""
+Per-document line index shared by the field extractors.
+
+Built once from the OCR lines. Each text view (raw, stripped, OCR-fixed...)
+is lower-cased, tokenized and run through one keyword automaton the first
+time an extractor asks for it, so "does line i mention X" is a set lookup
+however many fields and keywords the extractors check.
+"""
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _trie_regex(keywords: Iterable[str]) -> str:
+    """Regex for a keyword trie; greedy, so it matches the longest keyword at a position."""
+    trie: Dict[str, Any] = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            body = ("(?:" + body + ")" if len(branches) == 1 else body) + "?"
+        return body
+
+    return build(trie)
+
+
+class KeywordAutomaton:
+    """
+    Multi-pattern matcher: every keyword occurring in a string, in one scan.
+
+    The keywords are compiled into one trie-shaped regex inside a lookahead,
+    so the C regex engine reports the longest keyword starting at each
+    position; shorter keywords starting there are its keyword prefixes,
+    which are precomputed.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = frozenset(k for k in keywords if k)
+        self._re = re.compile("(?=(" + _trie_regex(self.keywords) + "))") if self.keywords else None
+        self._closure = {k: frozenset(p for p in self.keywords if k.startswith(p)) for k in self.keywords}
+
+    def find(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        if self._re is None:
+            return found
+        closure = self._closure
+        for m in self._re.finditer(text):
+            hit = m.group(1)
+            if hit:
+                found |= closure[hit]
+        return found
+
+
+class LineView:
+    """One normalization of a document's lines, with lazily built per-line facts."""
+
+    def __init__(self, texts: List[str], automaton: KeywordAutomaton):
+        self.texts = texts
+        self.lower = [t.lower() for t in texts]
+        self._auto = automaton
+        self._hits: Optional[List[Set[str]]] = None
+        self._tokens: Optional[List[Set[str]]] = None
+        self._derived: Dict[str, List[Any]] = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def hits(self) -> List[Set[str]]:
+        if self._hits is None:
+            self._hits = [self._auto.find(t) for t in self.lower]
+        return self._hits
+
+    @property
+    def tokens(self) -> List[Set[str]]:
+        if self._tokens is None:
+            self._tokens = [set(_WORD_RE.findall(t)) for t in self.lower]
+        return self._tokens
+
+    # ---- keyword queries (substring, case-insensitive) ----
+    def has(self, i: int, kw: str) -> bool:
+        if kw in self._auto.keywords:
+            return kw in self.hits[i]
+        return kw in self.lower[i]
+
+    def has_any(self, i: int, kws: Sequence[str]) -> bool:
+        if not self.hits[i].isdisjoint(kws):
+            return True
+        if self._auto.keywords.issuperset(kws):
+            return False
+        return any(k in self.lower[i] for k in kws if k not in self._auto.keywords)
+
+    def first_with(self, kws: Sequence[str], start: int = 0) -> int:
+        for i in range(start, len(self.texts)):
+            if self.has_any(i, kws):
+                return i
+        return -1
+
+    # ---- whole-word queries (same as \bword\b with re.I) ----
+    def has_word(self, i: int, word: str) -> bool:
+        return word in self.tokens[i]
+
+    def has_any_word(self, i: int, words) -> bool:
+        return not self.tokens[i].isdisjoint(words)
+
+    # ---- per-line derived values (number / money candidates, ...) ----
+    def per_line(self, name: str, fn: Callable[[str], Any]) -> List[Any]:
+        vals = self._derived.get(name)
+        if vals is None:
+            vals = self._derived[name] = [fn(t) for t in self.texts]
+        return vals
+
+
+class LineIndex:
+    """
+    lines: OCR lines as produced by ocr_engine ({"text", "x", "y", ...}).
+    items/views only cover lines with non-empty text, in order.
+    """
+
+    def __init__(self, lines: List[Dict[str, Any]], automaton: KeywordAutomaton):
+        self.lines = lines
+        self.items = [x for x in lines if x.get("text")]
+        self._auto = automaton
+        self._views: Dict[str, LineView] = {}
+
+    def view(self, name: str = "raw", fn: Optional[Callable[[str], str]] = None,
+             like: Optional[str] = None) -> LineView:
+        """
+        Lines transformed by fn, built on first use. `like` names a view whose
+        text differs from this one only by edge whitespace; its keyword hits
+        and tokens are then shared instead of recomputed.
+        """
+        v = self._views.get(name)
+        if v is None:
+            texts = [x["text"] for x in self.items]
+            if fn is not None:
+                texts = [fn(t) for t in texts]
+            v = self._views[name] = LineView(texts, self._auto)
+            if like is not None:
+                base = self.view(like)
+                v._hits, v._tokens = base.hits, base.tokens
+        return v
+
+    def top_region(self, frac: float = 0.35) -> List[int]:
+        """Indices into items of the lines in the top `frac` of the page (utils.pick_top_region)."""
+        if not self.lines:
+            return []
+        ys = [x["y"] for x in self.lines]
+        y0, y1 = min(ys), max(ys)
+        cut = y0 + (y1 - y0) * frac
+        return [i for i, x in enumerate(self.items) if x["y"] <= cut]
@@ -0,0 +1,426 @@
+"""
+Ingest-time media normalization.
+
+Uploads are stored verbatim by db_service.update_process_media. The first
+step of the process's AI job (off the request path) stores a normalized
+derivative next to the original in GridFS:
+
+    images  - EXIF orientation applied, long side capped (MEDIA_PHOTO_MAX_SIDE
+              for asset photos, MEDIA_DOC_MAX_SIDE / MEDIA_DOC_QUALITY for
+              documents so OCR keeps its detail), re-encoded as JPEG or WebP
+              (MEDIA_FORMAT)
+    videos  - preview capped at MEDIA_VIDEO_HEIGHT and MEDIA_VIDEO_FPS, streamed
+              from GridFS and written through a temp file
+    PDFs    - kept as they are
+
+The derivative is recorded on the process (process.$.derivative) and carries
+metadata.derived_from = the original's id in GridFS, so verification
+(AI_Engine.retrive / verify_video) and /media use it by default; the original
+stays available (/media/<id>?original=1). Small uploads that would not shrink
+get no derivative; that is recorded too, so /media stops waiting for one.
+Ingesting a re-upload deletes the previous upload's derivative and thumbnails.
+MEDIA_DERIVATIVES=0 turns the stage off.
+
+/media/<id>?w=<px> serves thumbnails (images, a video's poster frame, a PDF's
+first page) at the next width in THUMB_WIDTHS. They are made on first request
+from the derivative and cached in GridFS (metadata.thumb_of / w); the cache is
+kept under MEDIA_THUMB_CACHE_MB by evicting the least recently served.
+"""
+import os
+import time
+import tempfile
+import datetime
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import cv2
+
+import artifacts
+import pdf_ingest
+import video_verify
+
+MEDIA_DERIVATIVES = os.environ.get("MEDIA_DERIVATIVES", "1").strip().lower() not in ("0", "false", "off", "no")
+MEDIA_FORMAT = os.environ.get("MEDIA_FORMAT", "jpeg").strip().lower()
+MEDIA_QUALITY = int(os.environ.get("MEDIA_QUALITY", "85"))
+MEDIA_DOC_QUALITY = int(os.environ.get("MEDIA_DOC_QUALITY", "92"))
+MEDIA_PHOTO_MAX_SIDE = int(os.environ.get("MEDIA_PHOTO_MAX_SIDE", "1600"))
+MEDIA_DOC_MAX_SIDE = int(os.environ.get("MEDIA_DOC_MAX_SIDE", "2400"))
+MEDIA_VIDEO_HEIGHT = int(os.environ.get("MEDIA_VIDEO_HEIGHT", "480"))
+MEDIA_VIDEO_FPS = float(os.environ.get("MEDIA_VIDEO_FPS", "15"))
+MEDIA_THUMB_QUALITY = int(os.environ.get("MEDIA_THUMB_QUALITY", "80"))
+MEDIA_THUMB_CACHE_MB = float(os.environ.get("MEDIA_THUMB_CACHE_MB", "512"))
+
+VIDEO_CODECS = ("avc1", "mp4v")   # first one this OpenCV build can write
+MIN_SAVING = 0.9                  # derivative must be < 90% of the original unless it was resized
+
+THUMB_WIDTHS = (96, 160, 320, 640, 1280)
+TOUCH_EVERY_S = 3600              # last_served is refreshed at most this often per thumbnail
+EVICT_TO = 0.9                    # eviction stops at this share of the cap
+
+_EXT = {"jpeg": ".jpg", "webp": ".webp"}
+_VIDEO_TYPES = ("movement", "video")
+
+
+# ===========================================================
+#   IMAGES
+# ===========================================================
+def encode_image(bgr, fmt: str = MEDIA_FORMAT, quality: int = MEDIA_QUALITY) -> bytes:
+    if fmt == "webp":
+        ok, buf = cv2.imencode(".webp", bgr, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, buf = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError(f"could not encode {fmt}")
+    return buf.tobytes()
+
+
+def fit(bgr, max_side: int):
+    """bgr with its long side capped at max_side (INTER_AREA), or bgr itself."""
+    h, w = bgr.shape[:2]
+    if max(h, w) <= max_side:
+        return bgr
+    s = max_side / float(max(h, w))
+    return cv2.resize(bgr, (max(1, int(round(w * s))), max(1, int(round(h * s)))), interpolation=cv2.INTER_AREA)
+
+
+def normalize_image(data: bytes, max_side: int, quality: int = MEDIA_QUALITY) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+    """(derivative bytes, info) or None when the upload is kept as it is."""
+    bgr = artifacts.for_bytes(data).bgr
+    if bgr is None:
+        return None
+    out = fit(bgr, max_side)
+    encoded = encode_image(out, quality=quality)
+    changed = out is not bgr
+    if not changed and len(encoded) >= MIN_SAVING * len(data):
+        return None
+    h, w = out.shape[:2]
+    return encoded, {"format": MEDIA_FORMAT, "width": w, "height": h,
+                     "bytes": len(encoded), "original_bytes": len(data)}
+
+
+# ===========================================================
+#   VIDEOS
+# ===========================================================
+def _writer(path: str, fps: float, size: Tuple[int, int]):
+    for cc in VIDEO_CODECS:
+        w = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*cc), fps, size)
+        if w.isOpened():
+            return w, cc
+        w.release()
+    raise RuntimeError("no usable video encoder")
+
+
+def normalize_video(f, out_path: str) -> Optional[Dict[str, Any]]:
+    """Write a downscaled, frame-dropped preview of the video in file object f to out_path."""
+    with video_verify.decode_slots, video_verify.open_video(f) as cap:
+        if not cap.isOpened():
+            return None
+        src_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        keep_every = max(1, int(round(src_fps / MEDIA_VIDEO_FPS)))
+        fps = src_fps / keep_every
+        writer, codec, size, frames, i = None, None, None, 0, 0
+        try:
+            while True:
+                if i % keep_every:
+                    if not cap.grab():
+                        break
+                    i += 1
+                    continue
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                i += 1
+                h, w = frame.shape[:2]
+                if h > MEDIA_VIDEO_HEIGHT:
+                    frame = cv2.resize(frame, (int(round(w * MEDIA_VIDEO_HEIGHT / h)) // 2 * 2, MEDIA_VIDEO_HEIGHT),
+                                       interpolation=cv2.INTER_AREA)
+                if writer is None:
+                    size = (frame.shape[1], frame.shape[0])
+                    writer, codec = _writer(out_path, fps, size)
+                writer.write(frame)
+                frames += 1
+        finally:
+            if writer is not None:
+                writer.release()
+    if not frames:
+        return None
+    return {"format": "mp4", "codec": codec, "width": size[0], "height": size[1],
+            "fps": round(fps, 2), "frames": frames}
+
+
+# ===========================================================
+#   INGEST
+# ===========================================================
+_indexed = False
+_proc_indexed = False
+
+
+def derivative_file(db, fs, file_id: str):
+    """Newest derivative (GridOut) stored for the original file_id, or None."""
+    global _indexed
+    if not _indexed:
+        try:
+            db["fs.files"].create_index("metadata.derived_from")
+        except Exception as e:
+            print(f"Media: could not index derivatives: {e}")
+        _indexed = True
+    return fs.find_one({"metadata.derived_from": str(file_id)}, sort=[("uploadDate", -1)])
+
+
+def discard(fs, source_id: str) -> int:
+    """Delete the derivatives of a superseded upload and every thumbnail cached for it or them."""
+    ids = [str(source_id)]
+    n = 0
+    for d in fs.find({"metadata.derived_from": str(source_id)}):
+        ids.append(str(d._id))
+        fs.delete(d._id)
+        n += 1
+    for t in fs.find({"metadata.thumb_of": {"$in": ids}}):
+        fs.delete(t._id)
+        n += 1
+    return n
+
+
+def ingest(collection, fs, loan_id: str, user_id: str, process: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Store the derivative of this process's upload (once per file_id) and
+    record it on the process. Returns the derivative record, or None when the
+    upload is served as it is (that outcome is recorded too, with file_id None).
+    A re-upload's previous derivative and thumbnails are deleted.
+    """
+    from bson.objectid import ObjectId
+
+    file_id = process.get("file_id")
+    if not MEDIA_DERIVATIVES or not file_id:
+        return None
+    done = process.get("derivative") or {}
+    if done.get("source_id") == str(file_id):
+        return done if done.get("file_id") else None
+    if done.get("source_id"):
+        print(f"Media: {process.get('id')} re-uploaded, deleted {discard(fs, done['source_id'])} stale files")
+
+    t0 = time.perf_counter()
+    original = fs.get(ObjectId(file_id))
+    stem = os.path.splitext(original.filename or f"{process.get('id')}")[0]
+    dtype = (process.get("data_type") or "").lower()
+    did, info, skipped = None, None, None
+    try:
+        if dtype in _VIDEO_TYPES:
+            fd, tmp = tempfile.mkstemp(suffix=".mp4")
+            os.close(fd)
+            try:
+                info = normalize_video(original, tmp)
+                if info is None:
+                    skipped = "undecodable"
+                elif os.path.getsize(tmp) >= MIN_SAVING * original.length:
+                    skipped = "no_saving"
+                else:
+                    info["bytes"] = os.path.getsize(tmp)
+                    info["original_bytes"] = original.length
+                    with open(tmp, "rb") as fh:
+                        did = fs.put(fh, filename=f"{stem}.preview.mp4",
+                                     metadata={"derived_from": str(file_id), "kind": "preview"})
+            finally:
+                os.unlink(tmp)
+        else:
+            data = original.read()
+            if pdf_ingest.is_pdf(data):
+                skipped = "pdf"
+            else:
+                if dtype == "image":
+                    out = normalize_image(data, MEDIA_PHOTO_MAX_SIDE)
+                else:
+                    out = normalize_image(data, MEDIA_DOC_MAX_SIDE, MEDIA_DOC_QUALITY)
+                if out is None:
+                    skipped = "no_saving"
+                else:
+                    encoded, info = out
+                    did = fs.put(encoded, filename=f"{stem}.normalized{_EXT.get(MEDIA_FORMAT, '.jpg')}",
+                                 metadata={"derived_from": str(file_id), "kind": "normalized"})
+    finally:
+        original.close()
+
+    now = datetime.datetime.utcnow().isoformat()
+    if did is None:
+        # recorded so /media stops treating this upload as waiting for a derivative
+        record = {"file_id": None, "source_id": str(file_id), "skipped": skipped, "created_at": now}
+    else:
+        record = {**info, "file_id": str(did), "source_id": str(file_id),
+                  "elapsed_s": round(time.perf_counter() - t0, 3), "created_at": now}
+    collection.update_one(
+        {"loan_id": loan_id, "user_id": user_id, "process.id": process.get("id")},
+        {"$set": {"process.$.derivative": record}}
+    )
+    if did is None:
+        return None
+    print(f"Media: {process.get('id')} {info['original_bytes']} -> {info['bytes']} bytes ({dtype or 'document'})")
+    return record
+
+
+def served_file(collection, db, fs, f):
+    """
+    (file to serve, pending) for the stored file f: its derivative if one is
+    stored, else f itself. pending is True only while a derivative is still
+    expected, i.e. f is a process upload the AI job has not ingested yet;
+    PDFs, derivatives, thumbnails, uploads ingest kept as they are and files
+    no process points at never get one.
+    """
+    global _proc_indexed
+    meta = f.metadata or {}
+    if not MEDIA_DERIVATIVES or meta.get("derived_from") or meta.get("thumb_of") \
+            or (f.filename or "").lower().endswith(".pdf"):
+        return f, False
+    derived = derivative_file(db, fs, f._id)
+    if derived is not None:
+        return derived, False
+    if not _proc_indexed:
+        try:
+            collection.create_index("process.file_id")
+        except Exception as e:
+            print(f"Media: could not index process files: {e}")
+        _proc_indexed = True
+    loan = collection.find_one({"process.file_id": str(f._id)}, {"process.$": 1})
+    if not loan or not loan.get("process"):
+        return f, False
+    done = loan["process"][0].get("derivative") or {}
+    return f, done.get("source_id") != str(f._id)
+
+
+def media_id(process: Dict[str, Any], original: bool = False) -> Optional[str]:
+    """GridFS id verification should read for a process: its derivative unless original=True."""
+    d = process.get("derivative") or {}
+    if not original and d.get("file_id") and d.get("source_id") == str(process.get("file_id")):
+        return d["file_id"]
+    return process.get("file_id")
+
+
+# ===========================================================
+#   THUMBNAILS
+# ===========================================================
+def thumb_width(w) -> Optional[int]:
+    """Requested width snapped up to THUMB_WIDTHS; None for no/oversized requests (serve the full file)."""
+    try:
+        w = int(w)
+    except (TypeError, ValueError):
+        return None
+    if w <= 0:
+        return None
+    return next((t for t in THUMB_WIDTHS if t >= w), None)
+
+
+def _video_poster(f):
+    with video_verify.decode_slots, video_verify.open_video(f) as cap:
+        if not cap.isOpened():
+            return None
+        # a second in: the first frames of phone videos are often black / blurred
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        if n > fps * 2:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(fps))
+        ok, frame = cap.read()
+        return frame if ok else None
+
+
+def _pdf_first_page(data: bytes, width: int):
+    import fitz  # PyMuPDF, only needed for PDF thumbnails
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page = doc[0]
+        dpi = max(12, int(72.0 * width / max(1.0, page.rect.width)))
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(arr, cv2.COLOR_GRAY2BGR if pix.n == 1 else cv2.COLOR_RGB2BGR)
+
+
+def make_thumbnail(f, width: int) -> Optional[bytes]:
+    """JPEG of the GridFS file f (GridOut) at most width px wide."""
+    name = (f.filename or "").lower()
+    if name.endswith((".mp4", ".mov", ".mkv", ".webm")):
+        bgr = _video_poster(f)
+    else:
+        data = f.read()
+        if pdf_ingest.is_pdf(data):
+            bgr = _pdf_first_page(data, width)
+        else:
+            bgr = artifacts.for_bytes(data).bgr
+    if bgr is None:
+        return None
+    h, w = bgr.shape[:2]
+    if w > width:
+        bgr = cv2.resize(bgr, (width, max(1, int(round(h * width / w)))), interpolation=cv2.INTER_AREA)
+    return encode_image(bgr, "jpeg", MEDIA_THUMB_QUALITY)
+
+
+class ThumbnailCache:
+    """Thumbnails in GridFS, evicted least-recently-served beyond max_bytes."""
+
+    def __init__(self, db, fs, max_bytes: int = int(MEDIA_THUMB_CACHE_MB * 1024 * 1024)):
+        self.fs = fs
+        self.files = db["fs.files"]
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        self.files.create_index([("metadata.thumb_of", 1), ("metadata.w", 1)])
+        self.files.create_index("metadata.last_served", sparse=True)
+
+    def _cached_bytes(self) -> int:
+        agg = list(self.files.aggregate([
+            {"$match": {"metadata.kind": "thumb"}},
+            {"$group": {"_id": None, "n": {"$sum": "$length"}}},
+        ]))
+        return int(agg[0]["n"]) if agg else 0
+
+    def get(self, file_id: str, width: int, source):
+        """
+        GridOut of the cached thumbnail, making it from source() (the GridOut
+        to shrink) on a miss. None if the file can't be thumbnailed.
+        """
+        hit = self.fs.find_one({"metadata.thumb_of": str(file_id), "metadata.w": width})
+        if hit is not None:
+            last = (hit.metadata or {}).get("last_served") or 0
+            if time.time() - last > TOUCH_EVERY_S:
+                self.files.update_one({"_id": hit._id}, {"$set": {"metadata.last_served": time.time()}})
+            return hit
+
+        thumb = make_thumbnail(source(), width)
+        if thumb is None:
+            return None
+        tid = self.fs.put(thumb, filename=f"{file_id}.w{width}.jpg", metadata={
+            "kind": "thumb", "thumb_of": str(file_id), "w": width, "last_served": time.time(),
+        })
+        self._added(len(thumb))
+        return self.fs.get(tid)
+
+    def _added(self, n: int):
+        with self._lock:
+            if self._total is None:
+                self._total = self._cached_bytes()
+            else:
+                self._total += n
+            if self._total <= self.max_bytes:
+                return
+            # other workers add thumbnails too: evict against the real total
+            self._total = self._cached_bytes()
+            target = int(self.max_bytes * EVICT_TO)
+            evicted = 0
+            for d in self.files.find({"metadata.kind": "thumb"}, {"length": 1}).sort("metadata.last_served", 1):
+                if self._total <= target:
+                    break
+                self.fs.delete(d["_id"])
+                self._total -= d["length"]
+                evicted += 1
+            print(f"Media: evicted {evicted} thumbnails, cache now {self._total / 1e6:.1f} MB")
+
+
+_thumbs = None
+_thumbs_lock = threading.Lock()
+
+
+def get_thumbnail_cache(db, fs) -> ThumbnailCache:
+    global _thumbs
+    if _thumbs is None:
+        with _thumbs_lock:
+            if _thumbs is None:
+                _thumbs = ThumbnailCache(db, fs)
+    return _thumbs
@@ -1,28 +1,77 @@
 import os
 import json
-import numpy as np
-import cv2
+from concurrent.futures import ThreadPoolExecutor
 
 from preprocess import preprocess_image
-from ocr_engine import ocr_lines_with_bboxes, set_tesseract_path
-from extractors import extract_by_doc_type
+from ocr_engine import ocr_lines_with_bboxes, ocr_lines_progressive, set_tesseract_path, set_tesseract_threads
+from extractors import extract_by_doc_type, missing_fields, REQUIRED_FIELDS
 from compare import compare
+import ocr_cache
+import artifacts
+import pdf_ingest
 
 # Set Tesseract
 set_tesseract_path(os.environ.get("TESSERACT_CMD"))
+set_tesseract_threads()
 
+# Tesseract runs as a subprocess and cv2 releases the GIL, so threads are enough
+# to keep several OCR calls busy at once.
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(os.cpu_count() or 2)))
+_pool = ThreadPoolExecutor(max_workers=max(1, OCR_WORKERS), thread_name_prefix="ocr")
 
-# ---------------- IMAGE READER ----------------
-def _read_cv2_image(file_bytes: bytes):
-    nparr = np.frombuffer(file_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    return img
+# Optional text-block detection before OCR (dense invoices / receipts only)
+TEXT_REGIONS = os.environ.get("OCR_TEXT_REGIONS", "0").strip().lower() in ("1", "true", "on", "yes")
+TEXT_REGION_DOC_TYPES = {"invoice", "bill", "fees_receipt", "fee_receipt", "fee", "receipt"}
+
+# Top-down band OCR that stops once the header fields are found (IDs / marksheets)
+PROGRESSIVE = os.environ.get("OCR_PROGRESSIVE", "0").strip().lower() in ("1", "true", "on", "yes")
+PROGRESSIVE_BANDS = int(os.environ.get("OCR_PROGRESSIVE_BANDS", "4"))
 
 
 # ---------------- OCR PROCESSOR ----------------
-def _ocr_extract(doc_type: str, img_bgr, lang: str):
-    img_bin = preprocess_image(img_bgr)
-    lines = ocr_lines_with_bboxes(img_bin, lang=lang, doc_type=doc_type)
+def _ocr_lines(doc_type: str, img_bytes: bytes, lang: str):
+    # Same bytes + doc_type + lang + pipeline version -> served from the on-disk cache
+    dt = (doc_type or "").lower().strip()
+    regions = TEXT_REGIONS and dt in TEXT_REGION_DOC_TYPES
+    progressive = PROGRESSIVE and dt in REQUIRED_FIELDS
+
+    def compute():
+        if pdf_ingest.is_pdf(img_bytes):
+            return _pdf_lines(dt, img_bytes, lang, regions)
+        img_bin = artifacts.for_bytes(img_bytes).binarized
+        if progressive:
+            return ocr_lines_progressive(img_bin, lambda ls: not missing_fields(dt, ls),
+                                         lang=lang, doc_type=doc_type, bands=PROGRESSIVE_BANDS)
+        return ocr_lines_with_bboxes(img_bin, lang=lang, doc_type=doc_type, regions=regions)
+
+    variant = "progressive" if progressive else ("regions" if regions else "")
+    return ocr_cache.get_or_compute(img_bytes, doc_type, lang, compute, variant=variant)
+
+
+def _pdf_done(dt: str):
+    # Invoices/bills: stop once we have a total and a customer block
+    if dt in ["invoice", "bill"]:
+        def done(lines):
+            f = extract_by_doc_type(dt, lines)
+            return f.get("amount") is not None and bool(f.get("name"))
+        return done
+    if dt in ["fees_receipt", "fee_receipt", "fee", "receipt"]:
+        return lambda lines: extract_by_doc_type(dt, lines).get("amount") is not None
+    if dt in REQUIRED_FIELDS:
+        return lambda lines: not missing_fields(dt, lines)
+    return None
+
+
+def _pdf_lines(dt: str, pdf_bytes: bytes, lang: str, regions: bool):
+    def ocr_page(img_bgr):
+        img_bin = preprocess_image(img_bgr)
+        return ocr_lines_with_bboxes(img_bin, lang=lang, doc_type=dt, regions=regions)
+
+    return pdf_ingest.pdf_lines(pdf_bytes, ocr_page, is_done=_pdf_done(dt), dpi=pdf_ingest.dpi_for(dt))
+
+
+def _ocr_extract(doc_type: str, img_bytes: bytes, lang: str):
+    lines = _ocr_lines(doc_type, img_bytes, lang)
     fields = extract_by_doc_type(doc_type, lines)
     return fields
 
@@ -32,8 +81,7 @@ def _ocr_extract(doc_type: str, img_bgr, lang: str):
 #   1) →  FUNCTION VERSION OF /extract
 # ===========================================================
 def extract_text(doc_type: str, img_bytes: bytes, lang="eng"):
-    img = _read_cv2_image(img_bytes)
-    fields = _ocr_extract(doc_type, img, lang)
+    fields = _ocr_extract(doc_type, img_bytes, lang)
     return {"doc_type": doc_type, "extracted": fields}
 
 
@@ -42,8 +90,7 @@ def extract_text(doc_type: str, img_bytes: bytes, lang="eng"):
 #   2) → FUNCTION VERSION OF /verify  (JSON + Image)
 # ===========================================================
 def verify(doc_type: str, agreement_dict: dict, img_bytes: bytes, lang="eng"):
-    img = _read_cv2_image(img_bytes)
-    extracted = _ocr_extract(doc_type, img, lang)
+    extracted = _ocr_extract(doc_type, img_bytes, lang)
 
     result = compare(doc_type, agreement_dict, extracted)
 
@@ -60,11 +107,11 @@ def verify(doc_type: str, agreement_dict: dict, img_bytes: bytes, lang="eng"):
 #   3) → FUNCTION VERSION OF /verify_both  (Image + Image)
 # ===========================================================
 def verify_both_images(doc_type: str, img1_bytes: bytes, img2_bytes: bytes, lang="eng"):
-    img_a = _read_cv2_image(img1_bytes)
-    img_b = _read_cv2_image(img2_bytes)
+    fut_a = _pool.submit(_ocr_extract, doc_type, img1_bytes, lang)
+    fut_b = _pool.submit(_ocr_extract, doc_type, img2_bytes, lang)
 
-    agreement = _ocr_extract(doc_type, img_a, lang)
-    document  = _ocr_extract(doc_type, img_b, lang)
+    agreement = fut_a.result()
+    document  = fut_b.result()
 
     result = compare(doc_type, agreement, document)
 
@@ -76,14 +123,48 @@ def verify_both_images(doc_type: str, img1_bytes: bytes, img2_bytes: bytes, lang
     }
 
 
+# ===========================================================
+#   4) → BATCH: one agreement image vs N document images
+# ===========================================================
+def verify_many_images(doc_type: str, agreement_bytes: bytes, doc_bytes_list, lang="eng"):
+    # Agreement is OCR'd once, in parallel with the documents, and reused for every comparison
+    fut_a = _pool.submit(_ocr_extract, doc_type, agreement_bytes, lang)
+    futs = [_pool.submit(_ocr_extract, doc_type, b, lang) for b in doc_bytes_list]
+
+    agreement = fut_a.result()
+
+    out = []
+    for fut in futs:
+        try:
+            document = fut.result()
+        except Exception as e:
+            out.append({"doc_type": doc_type, "error": str(e)})
+            continue
+        out.append({
+            "doc_type": doc_type,
+            "doc_extracted": document,
+            "comparison": compare(doc_type, agreement, document),
+        })
+
+    return {
+        "doc_type": doc_type,
+        "agreement_extracted": agreement,
+        "results": out,
+    }
+
+
 # ================= USAGE EXAMPLES ==================
 # Use these like normal python:
 
-# 👉 Single invoice OCR
+# 👉 Single invoice OCR (PDF invoices work the same way)
 # extract_text("invoice", open("invoice.jpg","rb").read())
+# extract_text("invoice", open("invoice.pdf","rb").read())
 
 # 👉 Invoice verification
 # verify_invoice("invoice", agreement_dict, open("invoice.jpg","rb").read())
 
 # 👉 Compare agreement image vs document image
 # verify_both_images("invoice", open("agreement.jpg","rb").read(), open("doc.jpg","rb").read())
+
+# 👉 Bulk audit: one agreement image vs many documents
+# verify_many_images("invoice", open("agreement.jpg","rb").read(), [open(p,"rb").read() for p in paths])
@@ -1,6 +1,10 @@
+import os
 import re
+import threading
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from mock_db import STATE_CODES
+from similarity import confusion_costs, weighted_distance
 
 DIGIT_FROM_LETTER: Dict[str, List[str]] = {
     "O": ["0"], "D": ["0"],
@@ -35,38 +39,26 @@ CONF = {
     "E": {"3","B"},
 }
 
+CONF_COSTS = confusion_costs(CONF, 0.25)
+
 def sub_cost(a: str, b: str) -> float:
     if a == b:
         return 0.0
-    if b in CONF.get(a, set()) or a in CONF.get(b, set()):
-        return 0.25
-    return 1.0
-
-def wedit(a: str, b: str) -> float:
-    # weighted edit distance (insertion/deletion cost=1)
-    n, m = len(a), len(b)
-    dp = [[0.0] * (m + 1) for _ in range(n + 1)]
-    for i in range(1, n + 1):
-        dp[i][0] = float(i)
-    for j in range(1, m + 1):
-        dp[0][j] = float(j)
-
-    for i in range(1, n + 1):
-        ai = a[i - 1]
-        for j in range(1, m + 1):
-            bj = b[j - 1]
-            dp[i][j] = min(
-                dp[i - 1][j] + 1.0,                 # delete
-                dp[i][j - 1] + 1.0,                 # insert
-                dp[i - 1][j - 1] + sub_cost(ai, bj) # substitute
-            )
-    return dp[n][m]
+    return CONF_COSTS.get((a, b), 1.0)
+
+def wedit(a: str, b: str, cutoff: Optional[float] = None) -> float:
+    # weighted edit distance (insertion/deletion cost=1, look-alike substitution 0.25)
+    return weighted_distance(a, b, CONF_COSTS, cutoff)
 
 def best_prefer_match(text: str, prefer: set) -> str:
     s = only_alnum(text)
     if not s or not prefer:
         return ""
 
+    # Large registries come in as a plate_index.PlateIndex (same result, no full scan)
+    if hasattr(prefer, "best_match"):
+        return prefer.best_match(s)
+
     best_plate = ""
     best_score = 1e9
 
@@ -76,7 +68,7 @@ def best_prefer_match(text: str, prefer: set) -> str:
         for win_len in range(max(6, L - 2), min(len(s), L + 2) + 1):
             for i in range(0, len(s) - win_len + 1):
                 chunk = s[i:i + win_len]
-                dist = wedit(chunk, plate)
+                dist = wedit(chunk, plate, cutoff=min(best_score, 2.5))
                 if dist < best_score:
                     best_score = dist
                     best_plate = plate
@@ -98,91 +90,158 @@ def diff_count(a: str, b: str) -> int:
     return d
 
 
-def _gen_conversions(raw: str, kind: str) -> List[Tuple[str, int]]:
-    # kind: "digit" or "letter"
-    acc = [("", 0)]
-    for ch in raw:
-        nxt: List[Tuple[str, int]] = []
-        for pref, cost in acc:
-            if kind == "digit":
-                if ch.isdigit():
-                    nxt.append((pref + ch, cost))
-                elif ch.isalpha() and ch in DIGIT_FROM_LETTER:
-                    for d in DIGIT_FROM_LETTER[ch]:
-                        nxt.append((pref + d, cost + 1))
-            else:
-                if ch.isalpha():
-                    nxt.append((pref + ch, cost))
-                elif ch.isdigit() and ch in LETTER_FROM_DIGIT:
-                    for c in LETTER_FROM_DIGIT[ch]:
-                        nxt.append((pref + c, cost + 1))
-
-        acc = nxt
-        if not acc:
-            return []
-
-    dedup: Dict[str, int] = {}
-    for s, c in acc:
-        if s not in dedup or c < dedup[s]:
-            dedup[s] = c
-    return [(s, dedup[s]) for s in dedup]
-
-
-def _state_variants(st: str) -> List[Tuple[str, int]]:
-    vars = {(st, 0)}
-    for i, ch in enumerate(st):
-        if ch in STATE_LETTER_CONFUSIONS:
-            for rep in STATE_LETTER_CONFUSIONS[ch]:
-                t = list(st)
-                t[i] = rep
-                vars.add(("".join(t), 1))
-    return list(vars)
-
-
-def _all_rc_candidates_from_alnum(s: str) -> List[Tuple[int, str]]:
-    out: Dict[str, int] = {}
-    if len(s) < 8 or len(s) > 12:
-        return []
-
-    for rto_len in (1, 2):
-        for series_len in (1, 2, 3):
-            min_len = 2 + rto_len + series_len + 1
-            max_len = 2 + rto_len + series_len + 4
-            if len(s) < min_len or len(s) > max_len:
-                continue
+# ---------------- PLATE GRAMMAR DECODER ----------------
+# Indian plate: STATE(2 letters) RTO(1-2 digits) SERIES(1-3 letters) NUMBER(1-4 digits).
+# Each OCR char may be read as itself (cost 0) or via DIGIT_FROM_LETTER /
+# LETTER_FROM_DIGIT (cost 1); the state code may additionally take one
+# STATE_LETTER_CONFUSIONS swap (cost 1). Instead of expanding every split and
+# every confusion combination per window, we run a Viterbi pass over the OCR
+# string with free start: each state keeps only its cheapest reading.
+
+MIN_RC_LEN, MAX_RC_LEN = 8, 11  # old window range 8-12 ∩ what the grammar can produce
+
+_SEGMENT_MAX = {"rto": 2, "ser": 3, "num": 4}
 
-            num_len = len(s) - (2 + rto_len + series_len)
-            if num_len < 1 or num_len > 4:
-                continue
 
-            raw_state = s[:2]
-            raw_rto = s[2:2 + rto_len]
-            raw_series = s[2 + rto_len:2 + rto_len + series_len]
-            raw_num = s[2 + rto_len + series_len:]
-
-            st_opts = _gen_conversions(raw_state, "letter")
-            rto_opts = _gen_conversions(raw_rto, "digit")
-            ser_opts = _gen_conversions(raw_series, "letter")
-            num_opts = _gen_conversions(raw_num, "digit")
-
-            for st, cst in st_opts:
-                for st2, extra in _state_variants(st):
-                    if st2 not in STATE_CODES:
-                        continue
-                    cst2 = cst + extra
-                    for rto, crto in rto_opts:
-                        for ser, cser in ser_opts:
-                            for num, cnum in num_opts:
-                                cand = f"{st2}{rto}{ser}{num}"
-                                if not re.fullmatch(r"[A-Z]{2}\d{1,2}[A-Z]{1,3}\d{1,4}", cand):
-                                    continue
-                                cost = cst2 + crto + cser + cnum
-                                if cand not in out or cost < out[cand]:
-                                    out[cand] = cost
-
-    res = [(out[k], k) for k in out]
-    res.sort(key=lambda x: x[0])
-    return res
+def _as_letter(ch: str) -> List[Tuple[str, int]]:
+    if ch.isalpha():
+        return [(ch, 0)]
+    return [(c, 1) for c in LETTER_FROM_DIGIT.get(ch, [])]
+
+
+def _as_digit(ch: str) -> List[Tuple[str, int]]:
+    if ch.isdigit():
+        return [(ch, 0)]
+    return [(d, 1) for d in DIGIT_FROM_LETTER.get(ch, [])]
+
+
+@lru_cache(maxsize=4096)
+def _state_readings(a: str, b: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for la, ca in _as_letter(a):
+        for lb, cb in _as_letter(b):
+            base = ca + cb
+            cands = [(la + lb, base)]
+            for i, ch in enumerate((la, lb)):
+                for rep in STATE_LETTER_CONFUSIONS.get(ch, []):
+                    t = [la, lb]
+                    t[i] = rep
+                    cands.append(("".join(t), base + 1))
+            for code, c in cands:
+                if code in STATE_CODES and (code not in out or c < out[code]):
+                    out[code] = c
+    return out
+
+
+def decode_rc(s: str) -> List[Tuple[int, int, str]]:
+    """
+    One left-to-right pass over an alnum OCR string. Returns the cheapest
+    plate reading of every window of MIN_RC_LEN..MAX_RC_LEN chars that parses,
+    as (cost, end, plate), best first.
+    """
+    # active: (segment, seg_len, total_len) -> (cost, rto_len, text)
+    # On equal cost the shorter RTO wins, then the longer number, which is
+    # the order the old split enumeration tried them in.
+    active: Dict[Tuple[str, int, int], Tuple[int, int, str]] = {}
+    ends: List[Tuple[int, int, str]] = []
+
+    def relax(table, key, cost, rto, text):
+        cur = table.get(key)
+        if cur is None or (cost, rto) < (cur[0], cur[1]):
+            table[key] = (cost, rto, text)
+
+    for p in range(len(s) + 1):
+        # a plate may start anywhere: inject state-code readings of s[p-2:p]
+        if p >= 2:
+            for code, c in _state_readings(s[p - 2], s[p - 1]).items():
+                relax(active, ("rto", 0, 2), c, 0, code)
+
+        # accept parses ending here: cheapest reading per window (start = p - t)
+        best_here: Dict[int, Tuple[int, int, int, str]] = {}
+        for (seg, n, t), (c, r, txt) in active.items():
+            if seg == "num" and n >= 1 and MIN_RC_LEN <= t <= MAX_RC_LEN:
+                cand = (c, r, -n, txt)
+                if t not in best_here or cand[:3] < best_here[t][:3]:
+                    best_here[t] = cand
+        for c, _, _, txt in best_here.values():
+            ends.append((c, p, txt))
+
+        if p == len(s):
+            break
+
+        ch = s[p]
+        digits = _as_digit(ch)
+        letters = _as_letter(ch)
+        nxt: Dict[Tuple[str, int, int], Tuple[int, str]] = {}
+        for (seg, n, t), (c, r, txt) in active.items():
+            if t >= MAX_RC_LEN:
+                continue
+            if seg == "rto":
+                if n < _SEGMENT_MAX["rto"]:
+                    for d, cd in digits:
+                        relax(nxt, ("rto", n + 1, t + 1), c + cd, n + 1, txt + d)
+                if n >= 1:
+                    for l, cl in letters:
+                        relax(nxt, ("ser", 1, t + 1), c + cl, r, txt + l)
+            elif seg == "ser":
+                if n < _SEGMENT_MAX["ser"]:
+                    for l, cl in letters:
+                        relax(nxt, ("ser", n + 1, t + 1), c + cl, r, txt + l)
+                for d, cd in digits:
+                    relax(nxt, ("num", 1, t + 1), c + cd, r, txt + d)
+            elif seg == "num" and n < _SEGMENT_MAX["num"]:
+                for d, cd in digits:
+                    relax(nxt, ("num", n + 1, t + 1), c + cd, r, txt + d)
+        active = nxt
+
+    # same preference order as the old window scan: cheapest, then shortest, then leftmost
+    ends.sort(key=lambda x: (x[0], len(x[2]), x[1] - len(x[2])))
+    return ends
+
+
+# ---------------- DECODE MEMO ----------------
+# ocr_plate_bytes feeds the same (or same-after-cleanup) OCR text to
+# find_best_rc once per variant x psm, and re-verifications repeat plates.
+# decode_rc depends only on the alnum string, so its readings are memoized in
+# a bounded LRU; the prefer check stays per call because prefer can change.
+RC_DECODE_CACHE_SIZE = int(os.environ.get("RC_DECODE_CACHE_SIZE", "4096"))
+
+_decode_lock = threading.Lock()
+_decode_stats = {"calls": 0, "candidates": 0, "max_candidates": 0}
+
+
+@lru_cache(maxsize=RC_DECODE_CACHE_SIZE)
+def _decode_cached(s: str) -> Tuple[Tuple[int, int, str], ...]:
+    return tuple(decode_rc(s))
+
+
+def _record_decode(n: int):
+    with _decode_lock:
+        _decode_stats["calls"] += 1
+        _decode_stats["candidates"] += n
+        if n > _decode_stats["max_candidates"]:
+            _decode_stats["max_candidates"] = n
+
+
+def decode_stats() -> Dict[str, float]:
+    """Candidate readings considered by find_best_rc, and the decode LRU's hit rate."""
+    info = _decode_cached.cache_info()
+    with _decode_lock:
+        out = dict(_decode_stats)
+    out["avg_candidates"] = round(out["candidates"] / out["calls"], 2) if out["calls"] else 0.0
+    out["cache_hits"] = info.hits
+    out["cache_misses"] = info.misses
+    out["cache_entries"] = info.currsize
+    looked_up = info.hits + info.misses
+    out["cache_hit_rate"] = round(info.hits / looked_up, 4) if looked_up else 0.0
+    return out
+
+
+def _known(prefer, plates: List[str]) -> set:
+    # registry-backed sets resolve every reading in one round trip, not one `in` each
+    if hasattr(prefer, "known"):
+        return prefer.known(plates)
+    return {p for p in plates if p in prefer}
 
 
 def find_best_rc(text: str, prefer: Optional[set] = None, prefer_only: bool = False) -> str:
@@ -193,7 +252,7 @@ def find_best_rc(text: str, prefer: Optional[set] = None, prefer_only: bool = Fa
             return hit
         return ""
 
-    # else: do your existing logic (sliding windows + candidate generation)
+    # else: decode the plate grammar over the whole OCR string in one pass
     s = only_alnum(text)
     if not s:
         return ""
@@ -201,20 +260,14 @@ def find_best_rc(text: str, prefer: Optional[set] = None, prefer_only: bool = Fa
     best: Optional[str] = None
     best_key = (2, 10**9)
 
-    for L in range(8, 13):
-        if len(s) < L:
-            continue
-        for i in range(0, len(s) - L + 1):
-            chunk = s[i:i + L]
-            cands = _all_rc_candidates_from_alnum(chunk)
-            if not cands:
-                continue
-
-            cost, cand = cands[0]
-            key = (0 if (prefer and cand in prefer) else 1, cost)
-            if key < best_key:
-                best_key = key
-                best = cand
+    readings = _decode_cached(s)
+    _record_decode(len(readings))
+    known = _known(prefer, [cand for _, _, cand in readings]) if prefer else set()
+    for cost, _, cand in readings:
+        key = (0 if cand in known else 1, cost)
+        if key < best_key:
+            best_key = key
+            best = cand
 
     if best is None:
         return ""
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from ocr_words import lines_from_dicts
+
+# Bump this whenever preprocess.py / ocr_engine.py change in a way that alters
+# the OCR lines, so stale entries are never served.
+PIPELINE_VERSION = "2"
+
+CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache"))
+MAX_BYTES = int(float(os.environ.get("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024)
+ENABLED = os.environ.get("OCR_CACHE", "1").strip().lower() not in ("0", "false", "off", "no")
+# a hit refreshes last_access (an UPDATE + commit) at most this often per entry
+TOUCH_EVERY_S = float(os.environ.get("OCR_CACHE_TOUCH_S", "300"))
+
+_lock = threading.Lock()
+_conn = None
+_engine_version = None
+
+_stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+
+# ---------------- STORAGE ----------------
+def _db():
+    global _conn
+    if _conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _conn = sqlite3.connect(os.path.join(CACHE_DIR, "ocr_lines.sqlite3"), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_lines ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS ocr_lines_lru ON ocr_lines(last_access)")
+        # payload bytes of the whole file, shared by every process using it;
+        # put/_evict update it in the same transaction as the rows
+        _conn.execute("CREATE TABLE IF NOT EXISTS ocr_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        _conn.execute("INSERT OR IGNORE INTO ocr_size(id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM ocr_lines")
+        _conn.commit()
+    return _conn
+
+
+def tesseract_version():
+    global _engine_version
+    if _engine_version is None:
+        try:
+            import pytesseract
+            _engine_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _engine_version = "unknown"
+    return _engine_version
+
+
+def _size(conn) -> int:
+    return conn.execute("SELECT bytes FROM ocr_size WHERE id = 0").fetchone()[0]
+
+
+# ---------------- KEYS ----------------
+def content_hash(img_bytes: bytes) -> str:
+    return hashlib.sha256(img_bytes or b"").hexdigest()
+
+
+def make_key(img_bytes: bytes, doc_type: str, lang: str, variant: str = "") -> str:
+    dt = (doc_type or "").lower().strip()
+    parts = [content_hash(img_bytes), dt, lang or "", PIPELINE_VERSION, tesseract_version()]
+    if variant:
+        parts.append(variant)
+    return "|".join(parts)
+
+
+# ---------------- API ----------------
+def get(key: str):
+    if not ENABLED:
+        return None
+    with _lock:
+        try:
+            conn = _db()
+            row = conn.execute("SELECT payload, last_access FROM ocr_lines WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                _stats["misses"] += 1
+                return None
+            # approximate LRU: a hot entry is written back once per TOUCH_EVERY_S, not per hit
+            now = time.time()
+            if now - row[1] >= TOUCH_EVERY_S:
+                conn.execute("UPDATE ocr_lines SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+            _stats["hits"] += 1
+        except sqlite3.Error as e:
+            print(f"OCR cache read failed: {e}")
+            _stats["misses"] += 1
+            return None
+
+    return lines_from_dicts(json.loads(row[0]))
+
+
+def put(key: str, lines):
+    if not ENABLED:
+        return
+    payload = json.dumps(lines, separators=(",", ":"), default=lambda ln: ln.to_dict())
+    with _lock:
+        try:
+            conn = _db()
+            # take the write lock before reading the old size, so another
+            # process can't replace the same key in between
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = conn.execute("SELECT size FROM ocr_lines WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO ocr_lines(key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, payload, len(payload), time.time()),
+                )
+                conn.execute("UPDATE ocr_size SET bytes = bytes + ? WHERE id = 0",
+                             (len(payload) - (old[0] if old else 0),))
+                _evict(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            _stats["puts"] += 1
+        except sqlite3.Error as e:
+            print(f"OCR cache write failed: {e}")
+
+
+def _evict(conn):
+    # LRU: drop least recently used rows until we are back under the size bound
+    total = _size(conn)
+    if total <= MAX_BYTES:
+        return
+    over = total - MAX_BYTES
+    freed = 0
+    victims = []
+    for key, size in conn.execute("SELECT key, size FROM ocr_lines ORDER BY last_access ASC"):
+        victims.append((key,))
+        freed += size
+        if freed >= over:
+            break
+    conn.executemany("DELETE FROM ocr_lines WHERE key = ?", victims)
+    conn.execute("UPDATE ocr_size SET bytes = bytes - ? WHERE id = 0", (freed,))
+    _stats["evictions"] += len(victims)
+
+
+def get_or_compute(img_bytes: bytes, doc_type: str, lang: str, compute, variant: str = ""):
+    """
+    Returns OCR lines for these bytes, running compute() only on a cache miss.
+    """
+    key = make_key(img_bytes, doc_type, lang, variant)
+    lines = get(key)
+    if lines is not None:
+        return lines
+    lines = compute()
+    if lines is not None:
+        put(key, lines)
+    return lines
+
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        try:
+            conn = _db()
+            out["entries"] = conn.execute("SELECT COUNT(*) FROM ocr_lines").fetchone()[0]
+            out["bytes"] = _size(conn)
+        except sqlite3.Error:
+            out["entries"], out["bytes"] = None, None
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+    out["max_bytes"] = MAX_BYTES
+    out["enabled"] = ENABLED
+    return out
+
+
+def clear():
+    with _lock:
+        conn = _db()
+        conn.execute("DELETE FROM ocr_lines")
+        conn.execute("UPDATE ocr_size SET bytes = 0 WHERE id = 0")
+        conn.commit()
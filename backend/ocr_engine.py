@@ -1,13 +1,35 @@
+import os
+import threading
 import pytesseract
 import numpy as np
 import cv2
 
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from ocr_words import WORD_DTYPE, OcrLine, empty_words
+
+# Hard cap on Tesseract subprocesses in this worker, however the calls nest
+# (new_app's pool -> region OCR of one page): each holds a slot while it runs.
+TESSERACT_PROCS = int(os.environ.get("OCR_TESSERACT_PROCS", str(os.cpu_count() or 2)))
+tesseract_slots = threading.BoundedSemaphore(max(1, TESSERACT_PROCS))
+
+# One pool for the region crops of every page, so a page never brings its own
+OCR_REGION_WORKERS = int(os.environ.get("OCR_REGION_WORKERS", str(os.cpu_count() or 2)))
+_region_pool = ThreadPoolExecutor(max_workers=max(1, OCR_REGION_WORKERS), thread_name_prefix="ocr-region")
 
 def set_tesseract_path(win_path: Optional[str] = None):
     if win_path:
         pytesseract.pytesseract.tesseract_cmd = win_path
 
+def set_tesseract_threads(n: Optional[int] = None):
+    # Tesseract reads OMP_THREAD_LIMIT at startup; each pytesseract call spawns a
+    # fresh process that inherits our env. When several OCR calls run in parallel
+    # we want 1 thread each so they don't fight over the same cores.
+    if n is None:
+        n = int(os.environ.get("TESSERACT_THREADS", "1"))
+    os.environ["OMP_THREAD_LIMIT"] = str(max(1, int(n)))
+
 def preprocess_receipt(img):
     """
     Accepts BGR or grayscale image and returns a binarized image for OCR.
@@ -32,68 +54,187 @@ def preprocess_receipt(img):
     return th
 
 
-def ocr_lines_with_bboxes(img, lang="eng", doc_type=""):
+def _conf_array(conf) -> np.ndarray:
+    try:
+        return np.asarray(conf, dtype=np.float32)
+    except (TypeError, ValueError):
+        # unparseable confidences keep their word, as before
+        out = np.full(len(conf), 100.0, dtype=np.float32)
+        for i, c in enumerate(conf):
+            try:
+                out[i] = float(c)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def _words_from_data(data, dx=0, dy=0, region=0) -> np.ndarray:
+    """Tesseract image_to_data dict -> WORD_DTYPE array of the confident, non-empty words."""
+    if not data["text"]:
+        return empty_words()
+    text = np.array([(t or "").strip() for t in data["text"]], dtype=object)
+    keep = (text != "") & ~(_conf_array(data["conf"]) < 40)
+    idx = np.nonzero(keep)[0]
+
+    words = np.zeros(len(idx), dtype=WORD_DTYPE)
+    words["text"] = text[idx]
+    words["x"] = np.asarray(data["left"])[idx] + dx
+    words["y"] = np.asarray(data["top"])[idx] + dy
+    words["w"] = np.asarray(data["width"])[idx]
+    words["h"] = np.asarray(data["height"])[idx]
+    words["region"] = region
+    words["block"] = np.asarray(data["block_num"])[idx]
+    words["par"] = np.asarray(data["par_num"])[idx]
+    words["line"] = np.asarray(data["line_num"])[idx]
+    return words
+
+
+def _group_lines(words: np.ndarray) -> List[OcrLine]:
+    """Group words by (region, block, par, line); lines sorted top-down, words left-to-right."""
+    if len(words) == 0:
+        return []
+    order = np.lexsort((words["x"], words["line"], words["par"], words["block"], words["region"]))
+    w = words[order]
+
+    key = np.stack([w["region"], w["block"], w["par"], w["line"]])
+    starts = np.concatenate(([0], np.nonzero(np.any(np.diff(key, axis=1) != 0, axis=0))[0] + 1))
+    ends = np.append(starts[1:], len(w))
+
+    x0 = np.minimum.reduceat(w["x"], starts)
+    y0 = np.minimum.reduceat(w["y"], starts)
+    x1 = np.maximum.reduceat(w["x"] + w["w"], starts)
+    y1 = np.maximum.reduceat(w["y"] + w["h"], starts)
+
+    texts = w["text"].tolist()
+    starts, ends = starts.tolist(), ends.tolist()
+    x0, y0, bw, bh = x0.tolist(), y0.tolist(), (x1 - x0).tolist(), (y1 - y0).tolist()
+    out = []
+    for i in np.lexsort((x0, y0)).tolist():
+        s, e = starts[i], ends[i]
+        out.append(OcrLine(" ".join(texts[s:e]), x0[i], y0[i], bw[i], bh[i], w[s:e]))
+    return out
+
+
+def _merge_rows(lines: List[OcrLine]) -> List[OcrLine]:
+    # Region OCR splits side-by-side columns into separate lines; full-page --psm 6
+    # reads them as one row. Re-join lines that share a baseline band so the
+    # extractors see the same row text as before.
+    rows = []
+    for ln in lines:
+        cy = ln.y + ln.h / 2.0
+        for row in rows:
+            r = row[0]
+            if abs(cy - (r.y + r.h / 2.0)) <= 0.5 * min(ln.h, r.h):
+                row.append(ln)
+                break
+        else:
+            rows.append([ln])
+
+    out = []
+    for row in rows:
+        row = sorted(row, key=lambda z: z.x)
+        x0 = min(z.x for z in row)
+        y0 = min(z.y for z in row)
+        x1 = max(z.x + z.w for z in row)
+        y1 = max(z.y + z.h for z in row)
+        text = " ".join(z.text for z in row)
+        words = np.concatenate([z.words for z in row])
+        out.append(OcrLine(text, x0, y0, x1 - x0, y1 - y0, words))
+
+    return sorted(out, key=lambda z: (z.y, z.x))
+
+
+def _image_to_data(img, lang, cfg):
+    with tesseract_slots:
+        return pytesseract.image_to_data(img, lang=lang, config=cfg, output_type=pytesseract.Output.DICT)
+
+
+def _ocr_regions(img, regions, lang, cfg):
+    def run(idx_rect):
+        idx, (x, y, w, h) = idx_rect
+        data = _image_to_data(img[y:y + h, x:x + w], lang, cfg)
+        return _words_from_data(data, dx=x, dy=y, region=idx + 1)
+
+    chunks = list(_region_pool.map(run, enumerate(regions)))
+
+    return _merge_rows(_group_lines(np.concatenate(chunks)))
+
+
+def _is_binary(img) -> bool:
+    """True when every pixel is 0 or 255 (already thresholded)."""
+    if img is None or img.ndim != 2:
+        return False
+    if img.dtype != np.uint8:
+        return bool(np.isin(img, (0, 255)).all())
+    # a sparse grid rejects ordinary grayscale without touching the whole page
+    if cv2.countNonZero(cv2.inRange(img[::16, ::16], 1, 254)):
+        return False
+    return cv2.countNonZero(cv2.inRange(img, 1, 254)) == 0
+
+
+def _prepare_for_ocr(img, doc_type):
     dt = (doc_type or "").lower().strip()
 
-    # Detect binary image (already thresholded)
-    is_binary = False
-    try:
-        if len(img.shape) == 2:
-            vals = np.unique(img)
-            if len(vals) <= 3 and set(vals.tolist()).issubset({0, 255}):
-                is_binary = True
-    except Exception:
-        pass
-
-    if dt in ["fees_receipt", "fee_receipt", "fee", "receipt"] and not is_binary:
-        img_for_ocr = preprocess_receipt(img)   # only when it's NOT already binary
+    # only receipts are re-thresholded, and only when not already binary
+    if dt in ["fees_receipt", "fee_receipt", "fee", "receipt"] and not _is_binary(img):
+        img_for_ocr = preprocess_receipt(img)
         cfg = "--oem 1 --psm 6"
     else:
         img_for_ocr = img
         cfg = "--oem 1 --psm 6"
 
-    data = pytesseract.image_to_data(img_for_ocr, lang=lang, config=cfg,
-                                     output_type=pytesseract.Output.DICT)
-
-    n = len(data["text"])
-    items = []
-    for i in range(n):
-        txt = (data["text"][i] or "").strip()
-        conf = data["conf"][i]
-        if not txt:
-            continue
-        try:
-            if float(conf) < 40:
-                continue
-        except:
-            pass
-
-        x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
-        items.append({
-            "text": txt,
-            "x": x, "y": y, "w": w, "h": h,
-            "block": data["block_num"][i],
-            "par": data["par_num"][i],
-            "line": data["line_num"][i],
-        })
-
-    lines = {}
-    for it in items:
-        k = (it["block"], it["par"], it["line"])
-        lines.setdefault(k, []).append(it)
+    return img_for_ocr, cfg
 
-    out = []
-    for k, arr in lines.items():
-        arr = sorted(arr, key=lambda z: z["x"])
-        text = " ".join([a["text"] for a in arr]).strip()
-        if not text:
-            continue
-        xs = [a["x"] for a in arr]
-        ys = [a["y"] for a in arr]
-        xe = [a["x"] + a["w"] for a in arr]
-        ye = [a["y"] + a["h"] for a in arr]
-        x0, y0, x1, y1 = min(xs), min(ys), max(xe), max(ye)
-        out.append({"text": text, "bbox": (x0, y0, x1-x0, y1-y0), "x": x0, "y": y0, "h": y1-y0})
-
-    out = sorted(out, key=lambda z: (z["y"], z["x"]))
-    return out
\ No newline at end of file
+
+def ocr_lines_with_bboxes(img, lang="eng", doc_type="", regions=False):
+    """
+    regions=True runs a text-block detector first and OCRs only those blocks
+    (in parallel), skipping logos, stamps and blank margins. Falls back to the
+    full page when detection finds nothing worth skipping.
+    """
+    img_for_ocr, cfg = _prepare_for_ocr(img, doc_type)
+
+    if regions:
+        from text_regions import detect_text_blocks
+        blocks = detect_text_blocks(img_for_ocr)
+        if blocks:
+            return _ocr_regions(img_for_ocr, blocks, lang, cfg)
+
+    data = _image_to_data(img_for_ocr, lang, cfg)
+
+    return _group_lines(_words_from_data(data))
+
+
+def ocr_lines_progressive(img, is_done, lang="eng", doc_type="", bands=4):
+    """
+    OCR the page top-down in horizontal bands and stop as soon as
+    is_done(lines_so_far) says the extractors have what they need.
+    Bands overlap so a text row cut by a band edge is read whole by one of them;
+    each band only keeps the lines whose centre falls inside its own slice.
+    """
+    img_for_ocr, cfg = _prepare_for_ocr(img, doc_type)
+    H = img_for_ocr.shape[0]
+    bands = max(1, int(bands))
+    step = int(np.ceil(H / float(bands)))
+    ov = max(40, H // 30)
+
+    lines = []
+    for k in range(bands):
+        c0, c1 = k * step, min(H, (k + 1) * step)
+        if c0 >= H:
+            break
+        y0, y1 = max(0, c0 - ov), min(H, c1 + ov)
+
+        data = _image_to_data(img_for_ocr[y0:y1], lang, cfg)
+        band = _group_lines(_words_from_data(data, dy=y0, region=k))
+        keep = []
+        for ln in band:
+            cy = ln.y + ln.h / 2.0
+            if c0 <= cy < c1 or (k == bands - 1 and cy >= c1):
+                keep.append(ln)
+        lines = sorted(lines + keep, key=lambda z: (z.y, z.x))
+
+        if is_done(lines):
+            break
+
+    return lines
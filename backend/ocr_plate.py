@@ -1,11 +1,13 @@
-import io
 import os
 from typing import Any, Dict
 
+import numpy as np
 from PIL import Image, ImageFilter, ImageOps
 import pytesseract
 
-from mock_db import MOCK_DB
+import artifacts
+from ocr_engine import tesseract_slots
+from registry import get_registry
 from normalize import find_best_rc
 
 # If macOS can’t find tesseract automatically, set env TESSERACT_CMD
@@ -13,16 +15,24 @@ if os.getenv("TESSERACT_CMD"):
     pytesseract.pytesseract.tesseract_cmd = os.environ["TESSERACT_CMD"]
 
 
-def ocr_plate_bytes(img_bytes: bytes) -> Dict[str, Any]:
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    img = ImageOps.exif_transpose(img)
-    gray = ImageOps.autocontrast(ImageOps.grayscale(img))
+def _plate_gray(a: artifacts.ImageArtifacts):
+    gray = a.gray
+    if gray is None:
+        raise ValueError("plate image could not be decoded")
+    gray = ImageOps.autocontrast(Image.fromarray(gray))
 
     # Upscale for better OCR
     w, h = gray.size
     if w < 1100:
         scale = 1100 / max(1, w)
         gray = gray.resize((int(w * scale), int(h * scale)))
+    return np.asarray(gray)
+
+
+def ocr_plate_bytes(img_bytes: bytes) -> Dict[str, Any]:
+    # decoded (EXIF-oriented) grey comes from the job's shared artifacts
+    a = artifacts.for_bytes(img_bytes)
+    gray = Image.fromarray(a.get("plate_gray", lambda: _plate_gray(a)))
 
     variants = [
         ("base", gray),
@@ -33,14 +43,15 @@ def ocr_plate_bytes(img_bytes: bytes) -> Dict[str, Any]:
     cfg = "-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
     psms = ["--psm 7", "--psm 6"]
 
-    prefer = set(MOCK_DB.keys())
+    prefer = get_registry().prefer()
 
     best_text = ""
     best_rc = ""
 
     for tag, vimg in variants:
         for psm in psms:
-            text = pytesseract.image_to_string(vimg, config=f"{psm} {cfg}") or ""
+            with tesseract_slots:
+                text = pytesseract.image_to_string(vimg, config=f"{psm} {cfg}") or ""
             if len(text) > len(best_text):
                 best_text = text
             rc = find_best_rc(text, prefer=prefer, prefer_only=True)
@@ -0,0 +1,93 @@
+"""
+Columnar OCR output.
+
+Words are rows of one NumPy structured array per page (WORD_DTYPE); each
+OcrLine keeps a view of its own words plus the line bbox. OcrLine reads like
+the old line dicts (line["text"], line.get("y"), {**line}) so extractors and
+callers don't change, and to_dict()/from_dict() give the JSON shape stored in
+the OCR cache.
+"""
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+WORD_DTYPE = np.dtype([
+    ("text", object),
+    ("x", np.int32), ("y", np.int32), ("w", np.int32), ("h", np.int32),
+    ("region", np.int32), ("block", np.int32), ("par", np.int32), ("line", np.int32),
+])
+
+_WORD_KEYS = ("text", "x", "y", "w", "h")
+
+
+def empty_words() -> np.ndarray:
+    return np.zeros(0, dtype=WORD_DTYPE)
+
+
+def words_array(items: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """WORD_DTYPE array from word dicts ({"text","x","y","w","h"} + optional block/par/line)."""
+    items = list(items)
+    out = np.zeros(len(items), dtype=WORD_DTYPE)
+    if not items:
+        return out
+    out["text"] = [it["text"] for it in items]
+    for k in ("x", "y", "w", "h", "region", "block", "par", "line"):
+        if k in items[0]:
+            out[k] = [it[k] for it in items]
+    return out
+
+
+class OcrLine:
+    __slots__ = ("text", "x", "y", "w", "h", "words")
+
+    _KEYS = ("text", "bbox", "x", "y", "h", "words")
+
+    def __init__(self, text: str, x: int, y: int, w: int, h: int, words: np.ndarray = None):
+        self.text = text
+        self.x, self.y, self.w, self.h = int(x), int(y), int(w), int(h)
+        self.words = empty_words() if words is None else words
+
+    @property
+    def bbox(self):
+        return (self.x, self.y, self.w, self.h)
+
+    # ---- dict-style access (extractors, pdf_ingest, tests) ----
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def keys(self):
+        return self._KEYS
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def __repr__(self):
+        return f"OcrLine({self.text!r}, bbox={self.bbox}, words={len(self.words)})"
+
+    def shifted(self, dy: int) -> "OcrLine":
+        words = self.words.copy()
+        words["y"] += dy
+        return OcrLine(self.text, self.x, self.y + dy, self.w, self.h, words)
+
+    # ---- JSON (OCR cache) ----
+    def to_dict(self) -> Dict[str, Any]:
+        w = self.words
+        cols = [w[k].tolist() for k in _WORD_KEYS]
+        return {
+            "text": self.text, "bbox": self.bbox, "x": self.x, "y": self.y, "h": self.h,
+            "words": [dict(zip(_WORD_KEYS, vals)) for vals in zip(*cols)],
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "OcrLine":
+        x, y, w, h = d.get("bbox") or (d["x"], d["y"], 0, d.get("h", 0))
+        return cls(d["text"], x, y, w, h, words_array(d.get("words") or ()))
+
+
+def lines_from_dicts(rows: List[Dict[str, Any]]) -> List[OcrLine]:
+    return [OcrLine.from_dict(d) for d in rows]
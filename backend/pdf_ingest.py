@@ -0,0 +1,91 @@
+import numpy as np
+import cv2
+
+from ocr_engine import _group_lines
+from ocr_words import WORD_DTYPE
+
+# Rasterization DPI per doc type: invoices/receipts have small print, ID cards are
+# physically small so they need more pixels per inch to reach OCR-friendly size.
+DOC_DPI = {
+    "invoice": 200, "bill": 200,
+    "fees_receipt": 200, "fee_receipt": 200, "fee": 200, "receipt": 200,
+    "marksheet": 200, "mark_sheet": 200, "result": 200,
+    "student_id": 300, "id_card": 300, "id": 300,
+}
+DEFAULT_DPI = 200
+
+# Fewer words than this on a page means there is no usable text layer (scan)
+MIN_TEXT_WORDS = 5
+
+
+def is_pdf(file_bytes: bytes) -> bool:
+    return bool(file_bytes) and file_bytes[:1024].lstrip().startswith(b"%PDF")
+
+
+def dpi_for(doc_type: str) -> int:
+    return DOC_DPI.get((doc_type or "").lower().strip(), DEFAULT_DPI)
+
+
+def _text_layer_lines(page, scale: float, page_no: int, y_off: float):
+    words = page.get_text("words")  # (x0, y0, x1, y1, word, block, line, word_no)
+    if len(words) < MIN_TEXT_WORDS:
+        return None
+
+    cols = list(zip(*words))
+    box = np.asarray(cols[:4], dtype=np.float64) * scale
+    items = np.zeros(len(words), dtype=WORD_DTYPE)
+    items["text"] = [(t or "").strip() for t in cols[4]]
+    items["x"] = np.round(box[0])
+    items["y"] = np.round(box[1] + y_off)
+    items["w"] = np.round(box[2] - box[0])
+    items["h"] = np.round(box[3] - box[1])
+    items["region"] = page_no
+    items["block"] = cols[5]
+    items["line"] = cols[6]
+    items = items[items["text"] != ""]
+    return _group_lines(items)
+
+
+def _rasterize(page, dpi: int):
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n == 1:
+        return cv2.cvtColor(arr, cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+
+def _shift(lines, y_off: int):
+    return [ln.shifted(y_off) for ln in lines]
+
+
+def pdf_lines(pdf_bytes: bytes, ocr_page, is_done=None, dpi: int = DEFAULT_DPI):
+    """
+    Page-by-page lines for a PDF, in the same {"text","bbox","x","y","h","words"} shape
+    as ocr_lines_with_bboxes. Pages stack vertically (y keeps growing).
+
+    - Pages with an embedded text layer are read directly, no OCR.
+    - Other pages are rasterized only when reached, at `dpi`, and passed to
+      ocr_page(img_bgr) -> lines.
+    - Stops after the first page where is_done(lines_so_far) is True.
+    """
+    import fitz  # PyMuPDF, only needed when someone actually uploads a PDF
+
+    scale = dpi / 72.0
+    lines = []
+    y_off = 0
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page_no, page in enumerate(doc):
+            page_h = int(round(page.rect.height * scale))
+
+            page_lines = _text_layer_lines(page, scale, page_no, y_off)
+            if page_lines is None:
+                img = _rasterize(page, dpi)
+                page_lines = _shift(ocr_page(img) or [], y_off)
+
+            lines.extend(page_lines)
+            y_off += page_h
+
+            if is_done is not None and is_done(lines):
+                break
+
+    return lines
@@ -0,0 +1,293 @@
+"""
+Perceptual hashes for asset photos, to catch one photo uploaded for several loans.
+
+Each image process gets a 64-bit pHash (DCT of a 32x32 grey thumbnail) and
+a 64-bit dHash (horizontal gradients of a 9x8 thumbnail). Re-encoded,
+resized or lightly cropped copies of a photo stay within a few bits;
+unrelated photos differ in ~32.
+
+Lookups use multi-index hashing on the pHash: four tables keyed by its
+16-bit chunks. Two hashes within Hamming distance 7 agree to within one bit
+on at least one chunk, so a query probes each chunk value and its 16
+one-bit neighbours (68 dict lookups), then checks the few candidates
+exactly. The tables live in memory and are loaded from the store
+(Mongo "photo_hashes" or SQLite, PHOTO_HASH_BACKEND) on first use.
+
+    python photo_hash.py rebuild      # re-hash every image process from GridFS
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import cv2
+
+import artifacts
+import media
+
+PHOTO_HASH_BACKEND = os.environ.get("PHOTO_HASH_BACKEND", "mongo").strip().lower()
+PHOTO_HASH_DB = os.environ.get("PHOTO_HASH_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "photo_hash.sqlite3"))
+PHASH_RADIUS = min(7, int(os.environ.get("PHASH_RADIUS", "6")))
+DHASH_RADIUS = int(os.environ.get("DHASH_RADIUS", "12"))
+
+CHUNKS, CHUNK_BITS = 4, 16
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+_BITS = 1 << np.arange(64, dtype=np.uint64)
+
+
+# ===========================================================
+#   HASHES
+# ===========================================================
+def _pack(bits: np.ndarray) -> int:
+    return int(np.bitwise_or.reduce(_BITS[bits.ravel()[:64]]))
+
+
+def phash(grey) -> int:
+    small = cv2.resize(grey, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _pack(low > np.median(low[1:]))
+
+
+def dhash(grey) -> int:
+    small = cv2.resize(grey, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def hash_image(img_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """(phash, dhash) of an encoded image, or None if it does not decode."""
+    grey = artifacts.for_bytes(img_bytes).gray
+    if grey is None:
+        return None
+    return phash(grey), dhash(grey)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _to_i64(h: int) -> int:
+    # Mongo / SQLite integers are signed 64-bit
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _from_i64(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+# ===========================================================
+#   MULTI-INDEX
+# ===========================================================
+class HashIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(CHUNKS)]
+        self._rows: List[Optional[Tuple[str, int, int, Dict[str, Any]]]] = []
+        self._by_key: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._by_key)
+
+    @staticmethod
+    def _chunks(h: int):
+        return [(h >> (CHUNK_BITS * i)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, key: str, ph: int, dh: int, meta: Dict[str, Any]):
+        with self._lock:
+            old = self._by_key.get(key)
+            if old is not None:
+                self._rows[old] = None  # tombstone; its bucket entries are skipped
+            row = len(self._rows)
+            self._rows.append((key, ph, dh, meta))
+            self._by_key[key] = row
+            for t, c in zip(self._tables, self._chunks(ph)):
+                t.setdefault(c, []).append(row)
+
+    def query(self, ph: int, dh: int, radius: int = PHASH_RADIUS) -> List[Tuple[str, int, int, Dict[str, Any]]]:
+        """(key, phash distance, dhash distance, meta) of stored photos within radius, nearest first."""
+        radius = min(radius, 2 * CHUNKS - 1)
+        probes = [[c] + [c ^ (1 << b) for b in range(CHUNK_BITS)] for c in self._chunks(ph)]
+        with self._lock:
+            cand = set()
+            for t, vals in zip(self._tables, probes):
+                for v in vals:
+                    rows = t.get(v)
+                    if rows:
+                        cand.update(rows)
+            hits = []
+            for r in cand:
+                entry = self._rows[r]
+                if entry is None:
+                    continue
+                key, ph2, dh2, meta = entry
+                d = hamming(ph, ph2)
+                if d <= radius:
+                    hits.append((key, d, hamming(dh, dh2), meta))
+        hits.sort(key=lambda x: (x[1], x[2]))
+        return hits
+
+
+# ===========================================================
+#   STORES
+# ===========================================================
+class MongoHashStore:
+    def __init__(self, coll=None):
+        if coll is None:
+            from db_service import db
+            coll = db["photo_hashes"]
+        self._coll = coll
+
+    def put(self, key: str, ph: int, dh: int, meta: Dict[str, Any]):
+        self._coll.update_one({"_id": key}, {"$set": {
+            **meta, "phash": _to_i64(ph), "dhash": _to_i64(dh), "updated_at": time.time(),
+        }}, upsert=True)
+
+    def load(self) -> Iterator[Tuple[str, int, int, Dict[str, Any]]]:
+        for d in self._coll.find({}, {"updated_at": 0}):
+            key = d.pop("_id")
+            yield key, _from_i64(d.pop("phash")), _from_i64(d.pop("dhash")), d
+
+
+class SqliteHashStore:
+    def __init__(self, path: str = PHOTO_HASH_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS photos (id TEXT PRIMARY KEY, phash INTEGER NOT NULL, "
+                           "dhash INTEGER NOT NULL, meta TEXT NOT NULL)")
+        self._conn.commit()
+
+    def put(self, key: str, ph: int, dh: int, meta: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO photos(id, phash, dhash, meta) VALUES (?, ?, ?, ?)",
+                               (key, _to_i64(ph), _to_i64(dh), json.dumps(meta, default=str)))
+            self._conn.commit()
+
+    def load(self) -> Iterator[Tuple[str, int, int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, phash, dhash, meta FROM photos").fetchall()
+        for key, ph, dh, meta in rows:
+            yield key, _from_i64(ph), _from_i64(dh), json.loads(meta)
+
+
+# ===========================================================
+#   REGISTRY OF PHOTOS
+# ===========================================================
+class PhotoIndex:
+    """HashIndex in front of a persistent store."""
+
+    def __init__(self, store):
+        self.store = store
+        self.index = HashIndex()
+        t0 = time.perf_counter()
+        for key, ph, dh, meta in store.load():
+            self.index.add(key, ph, dh, meta)
+        print(f"Photo hash index: {len(self.index)} photos loaded in {time.perf_counter() - t0:.2f}s")
+
+    def add(self, key: str, ph: int, dh: int, meta: Dict[str, Any]):
+        self.store.put(key, ph, dh, meta)
+        self.index.add(key, ph, dh, meta)
+
+    def check(self, key: str, meta: Dict[str, Any], img_bytes: bytes, index: bool = True) -> List[Dict[str, Any]]:
+        """
+        Photos from *other* loans that look like this one, nearest first, then
+        (index=True) store this one under key (re-uploads replace it).
+        meta: loan_id, user_id, process_id, file_id - returned with each match.
+        """
+        hashed = hash_image(img_bytes)
+        if hashed is None:
+            return []
+        ph, dh = hashed
+
+        matches = []
+        for k, d, dd, m in self.index.query(ph, dh):
+            if k == key or (m.get("loan_id"), m.get("user_id")) == (meta.get("loan_id"), meta.get("user_id")):
+                continue
+            if dd > DHASH_RADIUS:
+                continue
+            matches.append({"photo_id": k, "loan_id": m.get("loan_id"), "user_id": m.get("user_id"),
+                            "process_id": m.get("process_id"), "file_id": m.get("file_id"),
+                            "phash_distance": d, "dhash_distance": dd})
+        if index:
+            self.add(key, ph, dh, meta)
+        return matches
+
+
+_photos = None
+_photos_lock = threading.Lock()
+
+
+def get_photo_index() -> PhotoIndex:
+    global _photos
+    if _photos is None:
+        with _photos_lock:
+            if _photos is None:
+                if PHOTO_HASH_BACKEND == "sqlite":
+                    _photos = PhotoIndex(SqliteHashStore(PHOTO_HASH_DB))
+                else:
+                    _photos = PhotoIndex(MongoHashStore())
+    return _photos
+
+
+def set_photo_index(idx: PhotoIndex):
+    global _photos
+    _photos = idx
+
+
+# ===========================================================
+#   REBUILD FROM GRIDFS
+# ===========================================================
+def image_processes() -> Iterator[Tuple[str, Dict[str, Any], str]]:
+    """(key, meta, GridFS id to hash) of every uploaded asset photo (CNN step) in the loans collection."""
+    from db_service import collection
+
+    for loan in collection.find({"process.data_type": "image"}, {"loan_id": 1, "user_id": 1, "process": 1}):
+        for p in loan.get("process") or []:
+            if p.get("data_type") == "image" and 1 in (p.get("processid") or []) and p.get("file_id"):
+                meta = {"loan_id": loan.get("loan_id"), "user_id": loan.get("user_id"),
+                        "process_id": p.get("id"), "file_id": p.get("file_id")}
+                # hash what verification reads: the normalized derivative if there is one
+                yield f"{meta['loan_id']}:{meta['user_id']}:{meta['process_id']}", meta, media.media_id(p)
+
+
+def rebuild(store) -> Dict[str, int]:
+    from bson.objectid import ObjectId
+    from db_service import fs
+
+    stats = {"hashed": 0, "skipped": 0}
+    for key, meta, read_id in image_processes():
+        try:
+            hashed = hash_image(fs.get(ObjectId(read_id)).read())
+        except Exception as e:
+            print(f"Skipping {key}: {e}", file=sys.stderr)
+            hashed = None
+        if hashed is None:
+            stats["skipped"] += 1
+            continue
+        store.put(key, hashed[0], hashed[1], meta)
+        stats["hashed"] += 1
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Asset photo perceptual-hash index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="hash every uploaded image process from GridFS")
+    rb.add_argument("--backend", default=PHOTO_HASH_BACKEND, choices=["mongo", "sqlite"])
+    rb.add_argument("--db", default=PHOTO_HASH_DB)
+    args = ap.parse_args(argv)
+
+    store = SqliteHashStore(args.db) if args.backend == "sqlite" else MongoHashStore()
+    t0 = time.perf_counter()
+    stats = rebuild(store)
+    print(json.dumps({**stats, "seconds": round(time.perf_counter() - t0, 2)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
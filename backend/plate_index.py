@@ -0,0 +1,238 @@
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from normalize import CONF, CONF_COSTS, wedit, only_alnum
+from similarity import substring_distance, weighted_substring_distance
+
+# Same cut-off best_prefer_match uses
+MAX_DIST = 2.5
+
+# ---------------- CONFUSION FOLDING ----------------
+# Union every CONF pair into one class (O/0/D, I/1/L, S/5/3/B/8/E, ...).
+# A confusable substitution costs 0.25 in wedit and 0 after folding, while
+# indels and other substitutions cost at most 1 either way. So for any
+# alignment, the folded unit edit distance <= floor(weighted distance):
+# wedit <= 2.5  =>  folded distance <= 2. The index filters on that bound,
+# which means it never drops a plate the brute-force scan would have found.
+MAX_FOLDED_EDITS = 2
+
+
+def _build_fold() -> Dict[str, str]:
+    parent: Dict[str, str] = {}
+
+    def find(c):
+        parent.setdefault(c, c)
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    for a, bs in CONF.items():
+        for b in bs:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+    return {c: find(c) for c in parent}
+
+
+FOLD = _build_fold()
+
+
+def fold(s: str) -> str:
+    return "".join(FOLD.get(ch, ch) for ch in s)
+
+
+# ---------------- PARTITIONING ----------------
+# Split each plate into 4 pieces. With at most 2 edits, at least 2 pieces come
+# through untouched, because one edit can only damage one piece. The gap
+# between those two pieces in the OCR text is within 2 of their gap in the
+# plate. The index is keyed on (piece_i, piece_j, gap) pairs.
+#
+# The number of distinct pair keys a plate is hit by also bounds its
+# distance. m untouched pieces produce C(m, 2) hits, and every damaged piece
+# costs at least one edit. So plates hit fewer times can be skipped once
+# something good enough has been found (see _LOWER_BOUND).
+N_PIECES = MAX_FOLDED_EDITS + 2
+
+# hits -> minimum possible distance for a plate hit that many times
+_LOWER_BOUND = [(6, 0.0), (3, 1.0), (1, 2.0)]
+
+
+def _lower_bound(hits: int) -> float:
+    for h, lb in _LOWER_BOUND:
+        if hits >= h:
+            return lb
+    return float(MAX_FOLDED_EDITS)
+
+
+def _pieces(s: str):
+    L = len(s)
+    base, extra = divmod(L, N_PIECES)
+    out = []
+    pos = 0
+    for i in range(N_PIECES):
+        n = base + (1 if i < extra else 0)
+        out.append((pos, s[pos:pos + n]))
+        pos += n
+    return out
+
+
+def pair_keys(folded: str):
+    """
+    Index keys for one folded plate, as (key, piece_len, gap) triples, or []
+    when the plate is too short to split and must always be verified.
+    """
+    if len(folded) < N_PIECES * 2:
+        return []
+    ps = _pieces(folded)
+    out = []
+    for i in range(len(ps)):
+        oi, pi = ps[i]
+        for j in range(i + 1, len(ps)):
+            oj, pj = ps[j]
+            gap = oj - (oi + len(pi))
+            out.append((f"{pi}|{pj}|{gap}", len(pi), gap))
+    return out
+
+
+def query_keys(text: str, piece_lens, max_gap: int) -> set:
+    """Every pair key an OCR string could share with a plate within MAX_DIST."""
+    s = fold(only_alnum(text))
+    keys = set()
+    lens = sorted(piece_lens)
+    n = len(s)
+    for li in lens:
+        for a in range(0, n - li + 1):
+            pi = s[a:a + li]
+            end_a = a + li
+            for lj in lens:
+                last = min(n - lj, end_a + max_gap + MAX_FOLDED_EDITS)
+                for b in range(end_a, last + 1):
+                    pj = s[b:b + lj]
+                    g = b - end_a
+                    for gg in range(max(0, g - MAX_FOLDED_EDITS), g + MAX_FOLDED_EDITS + 1):
+                        keys.add(f"{pi}|{pj}|{gg}")
+    return keys
+
+
+def pick_best(text: str, ranked) -> str:
+    """
+    Verify candidates given as (plate, hits), strongest first, and return the
+    closest plate within MAX_DIST (or ""). Stops as soon as no remaining
+    candidate can beat the best distance found so far.
+    """
+    s = only_alnum(text)
+    if not s:
+        return ""
+    fs = fold(s)
+
+    best_plate = ""
+    best_score = 1e9
+    for plate, h in ranked:
+        if best_score <= _lower_bound(h):
+            break
+        L = len(plate)
+
+        cutoff = min(best_score, MAX_DIST)
+        if substring_distance(fs, fold(plate)) > cutoff:
+            continue
+
+        # for 8+ char plates any substring within MAX_DIST is L-2..L+2 long,
+        # i.e. exactly the brute-force window range, so one substring DP suffices.
+        # No cutoff here: the match may start after leading junk, which the
+        # row-minimum early exit cannot see coming.
+        if L >= 8:
+            dist = weighted_substring_distance(s, plate, CONF_COSTS)
+            if dist < best_score:
+                best_score = dist
+                best_plate = plate
+            continue
+
+        # short plates: exact same window scan as the brute-force path
+        for win_len in range(max(6, L - 2), min(len(s), L + 2) + 1):
+            for i in range(0, len(s) - win_len + 1):
+                dist = wedit(s[i:i + win_len], plate, cutoff=cutoff)
+                if dist < best_score:
+                    best_score = dist
+                    best_plate = plate
+
+    return best_plate if best_score <= MAX_DIST else ""
+
+
+ALWAYS_VERIFY = _LOWER_BOUND[0][0]  # hit count given to unindexed (short) plates
+
+
+class PlateIndex:
+    """
+    Sublinear fuzzy lookup of an OCR string against a large set of plates.
+    Drop-in for the `prefer` set in normalize.best_prefer_match / find_best_rc.
+    """
+
+    def __init__(self, plates: Optional[Iterable[str]] = None):
+        self.plates: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._pairs: Dict[str, array] = {}
+        self._short = array("I")  # plates too short to split into pieces
+        self._piece_lens = set()
+        self._max_gap = 0
+        if plates:
+            self.add_many(plates)
+
+    # ---- set-like API so callers can keep using `in prefer` ----
+    def __len__(self):
+        return len(self.plates)
+
+    def __contains__(self, plate):
+        return plate in self._ids
+
+    def __iter__(self):
+        return iter(self.plates)
+
+    # ---- build ----
+    def add(self, plate: str):
+        plate = only_alnum(plate)
+        if not plate or plate in self._ids:
+            return
+        pid = len(self.plates)
+        self.plates.append(plate)
+        self._ids[plate] = pid
+
+        keys = pair_keys(fold(plate))
+        if not keys:
+            self._short.append(pid)
+            return
+
+        for key, plen, gap in keys:
+            self._piece_lens.add(plen)
+            self._max_gap = max(self._max_gap, gap)
+            bucket = self._pairs.get(key)
+            if bucket is None:
+                bucket = self._pairs[key] = array("I")
+            bucket.append(pid)
+
+    def add_many(self, plates: Iterable[str]):
+        for p in plates:
+            self.add(p)
+
+    # ---- query ----
+    def candidates(self, text: str) -> Counter:
+        """
+        Plates that could be within MAX_DIST of some window of `text`,
+        mapped to the number of distinct pair keys that hit them.
+        """
+        hits = Counter()
+        for key in query_keys(text, self._piece_lens, self._max_gap):
+            bucket = self._pairs.get(key)
+            if bucket is not None:
+                hits.update(bucket)
+
+        # too short to index: always verified
+        for pid in self._short:
+            hits[pid] = max(hits[pid], ALWAYS_VERIFY)
+        return hits
+
+    def best_match(self, text: str) -> str:
+        ranked = ((self.plates[pid], h) for pid, h in self.candidates(text).most_common())
+        return pick_best(text, ranked)
@@ -1,8 +1,8 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from io import BytesIO
 
-from mock_db import MOCK_DB
+from registry import get_registry, RegistryError
 from ocr_plate import ocr_plate_bytes
 from normalize import find_best_rc
 from compare_rc import compare_officer_vs_api
@@ -12,6 +12,15 @@ def ping():
     return "ok"
 
 
+def _registry_down(e: Exception, **extra):
+    return {
+        "status": False,
+        "error_code": "REGISTRY_UNAVAILABLE",
+        "message": str(e),
+        **extra
+    }
+
+
 # -------------------------------------------
 # Helper class (still optional)
 # -------------------------------------------
@@ -33,7 +42,11 @@ class MemoryUploadFile:
 # 1) Direct RC lookup
 # -------------------------------------------
 def rc_verify(payload: Dict[str, Any]):
-    v = find_best_rc(str(payload.get("vehicle_no", "")), prefer=set(MOCK_DB.keys()))
+    reg = get_registry()
+    try:
+        v = find_best_rc(str(payload.get("vehicle_no", "")), prefer=reg.prefer())
+    except RegistryError as e:
+        return _registry_down(e)
     if not v:
         return {
             "status": False,
@@ -41,7 +54,10 @@ def rc_verify(payload: Dict[str, Any]):
             "message": "Invalid vehicle no",
             "vehicle_no": v
         }
-    d = MOCK_DB.get(v)
+    try:
+        d = reg.get(v)
+    except RegistryError as e:
+        return _registry_down(e, vehicle_no=v)
     if not d:
         return {
             "status": False,
@@ -49,14 +65,18 @@ def rc_verify(payload: Dict[str, Any]):
             "message": "Vehicle not found",
             "vehicle_no": v
         }
-    return {"status": True, "source": "MOCK", "vehicle_no": v, "vehicle": d}
+    return {"status": True, "source": reg.name, "vehicle_no": v, "vehicle": d}
 
 
 # -------------------------------------------
 # 2) Plate photo -> OCR -> vehicle details
 # -------------------------------------------
 def plate_verify(image_bytes: bytes):
-    out = ocr_plate_bytes(image_bytes)
+    # the fuzzy plate match inside OCR queries the registry as well
+    try:
+        out = ocr_plate_bytes(image_bytes)
+    except RegistryError as e:
+        return _registry_down(e)
     v = out["vehicle_no"]
 
     if not v:
@@ -67,19 +87,23 @@ def plate_verify(image_bytes: bytes):
             "extracted": out
         }
 
-    d = MOCK_DB.get(v)
+    reg = get_registry()
+    try:
+        d = reg.get(v)
+    except RegistryError as e:
+        return _registry_down(e, vehicle_no=v, extracted=out)
     if not d:
         return {
             "status": False,
             "error_code": "NOT_FOUND",
-            "message": "Vehicle not found in mock DB",
+            "message": "Vehicle not found in registry",
             "vehicle_no": v,
             "extracted": out
         }
 
     return {
         "status": True,
-        "source": "MOCK_OCR",
+        "source": reg.name + "_OCR",
         "vehicle_no": v,
         "extracted": out,
         "vehicle": d
@@ -89,6 +113,9 @@ def plate_verify(image_bytes: bytes):
 # -------------------------------------------
 # 3) Officer enters details + uploads plate photo
 # -------------------------------------------
+OFFICER_FIELDS = ("name", "address", "phone", "vehicle_make", "vehicle_model", "vehicle_color")
+
+
 def verify_officer(
     image_bytes: bytes,
 
@@ -100,7 +127,32 @@ def verify_officer(
     vehicle_model: str = "",
     vehicle_color: str = "",
 ):
-    plate = ocr_plate_bytes(image_bytes)
+    try:
+        plate = ocr_plate_bytes(image_bytes)
+    except RegistryError as e:
+        return _registry_down(e)
+    plate_rc = plate["vehicle_no"]
+
+    vehicle = None
+    if plate_rc:
+        try:
+            vehicle = get_registry().get(plate_rc)
+        except RegistryError as e:
+            return _registry_down(e, vehicle_no=plate_rc, plate=plate)
+
+    officer_input = {
+        "name": name,
+        "address": address,
+        "phone": phone,
+        "vehicle_make": vehicle_make,
+        "vehicle_model": vehicle_model,
+        "vehicle_color": vehicle_color,
+    }
+    return officer_result(plate, vehicle, officer_input)
+
+
+def officer_result(plate: Dict[str, Any], vehicle: Optional[Dict[str, Any]], officer_input: Dict[str, Any]):
+    """verify_officer's response, given the plate OCR output and its registry record (None if missing)."""
     plate_rc = plate["vehicle_no"]
 
     if not plate_rc:
@@ -111,25 +163,15 @@ def verify_officer(
             "plate": plate
         }
 
-    vehicle = MOCK_DB.get(plate_rc)
     if not vehicle:
         return {
             "status": False,
             "error_code": "NOT_FOUND",
-            "message": "Vehicle extracted but not found in mock DB",
+            "message": "Vehicle extracted but not found in registry",
             "vehicle_no": plate_rc,
             "plate": plate
         }
 
-    officer_input = {
-        "name": name,
-        "address": address,
-        "phone": phone,
-        "vehicle_make": vehicle_make,
-        "vehicle_model": vehicle_model,
-        "vehicle_color": vehicle_color,
-    }
-
     decision = compare_officer_vs_api(officer_input, vehicle)
 
     return {
@@ -0,0 +1,618 @@
+"""
+Vehicle registry backends used by rc_main / ocr_plate.
+
+    memory  - a dict in this process (mock_db.MOCK_DB by default; the old behaviour)
+    sqlite  - on-disk registry dump with a plate index and the fuzzy pair index
+              from plate_index, queried without loading the table into RAM
+    http    - a remote registry API (or the local stand-in served by this module)
+
+Pick one with REGISTRY_BACKEND (+ REGISTRY_DB / REGISTRY_URL).
+
+    python registry.py import dump.csv --db registry.sqlite3
+    python registry.py serve --backend sqlite --db registry.sqlite3 --port 8090
+"""
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from mock_db import MOCK_DB
+from normalize import only_alnum
+from plate_index import PlateIndex, pair_keys, query_keys, pick_best, fold, ALWAYS_VERIFY
+
+REGISTRY_BACKEND = os.environ.get("REGISTRY_BACKEND", "memory").strip().lower()
+REGISTRY_DB = os.environ.get("REGISTRY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "registry.sqlite3"))
+REGISTRY_URL = os.environ.get("REGISTRY_URL", "http://127.0.0.1:8090").rstrip("/")
+REGISTRY_TIMEOUT = float(os.environ.get("REGISTRY_TIMEOUT", "5"))
+
+# Lookup cache (on by default for the http backend, REGISTRY_CACHE=1/0 to force)
+REGISTRY_CACHE = os.environ.get("REGISTRY_CACHE", "").strip()
+REGISTRY_CACHE_TTL = float(os.environ.get("REGISTRY_CACHE_TTL", "600"))
+REGISTRY_CACHE_NEG_TTL = float(os.environ.get("REGISTRY_CACHE_NEG_TTL", "60"))
+REGISTRY_CACHE_MAX = int(os.environ.get("REGISTRY_CACHE_MAX", "50000"))
+
+# Above this many plates the memory backend hands out a PlateIndex instead of a set
+INDEX_THRESHOLD = 256
+
+
+class RegistryError(Exception):
+    """Registry could not be reached / answered garbage (not the same as NOT_FOUND)."""
+
+
+# ===========================================================
+#   IN-MEMORY
+# ===========================================================
+class MemoryRegistry:
+    name = "MOCK"
+
+    def __init__(self, data: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._data = MOCK_DB if data is None else data
+        self._prefer = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, plate: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(plate)
+
+    def get_many(self, plates: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        return {p: self._data[p] for p in plates if p in self._data}
+
+    def prefer(self):
+        if len(self._data) <= INDEX_THRESHOLD:
+            return set(self._data.keys())
+        if self._prefer is None or len(self._prefer) != len(self._data):
+            self._prefer = PlateIndex(self._data.keys())
+        return self._prefer
+
+
+# ===========================================================
+#   SQLITE (on-disk, mmap'd)
+# ===========================================================
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS vehicles (id INTEGER PRIMARY KEY, plate TEXT NOT NULL UNIQUE, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS plate_pairs (key TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (key, id)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS short_plates (id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)",
+]
+
+# SQLite's default max host parameters is 999 on older builds
+_IN_CHUNK = 900
+
+
+def _chunks(seq: List[Any], n: int):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+class SqliteRegistry:
+    name = "REGISTRY"
+
+    def __init__(self, path: str = REGISTRY_DB):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        for stmt in _SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+        self._meta = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA mmap_size=1073741824")
+            conn.execute("PRAGMA cache_size=-65536")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+
+    # ---------------- lookups ----------------
+    def get(self, plate: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM vehicles WHERE plate = ?", (plate,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, plates: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        plates = list(dict.fromkeys(p for p in plates if p))
+        out: Dict[str, Dict[str, Any]] = {}
+        conn = self._conn()
+        for part in _chunks(plates, _IN_CHUNK):
+            q = f"SELECT plate, data FROM vehicles WHERE plate IN ({','.join('?' * len(part))})"
+            for plate, data in conn.execute(q, part):
+                out[plate] = json.loads(data)
+        return out
+
+    def contains(self, plate: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM vehicles WHERE plate = ?", (plate,)).fetchone() is not None
+
+    def prefer(self):
+        return SqlitePlateSet(self)
+
+    # ---------------- fuzzy match ----------------
+    def meta(self):
+        if self._meta is None:
+            rows = dict(self._conn().execute("SELECT k, v FROM meta").fetchall())
+            self._meta = {
+                "piece_lens": json.loads(rows.get("piece_lens", "[]")),
+                "max_gap": int(rows.get("max_gap", "0")),
+            }
+        return self._meta
+
+    def best_match(self, text: str) -> str:
+        m = self.meta()
+        keys = list(query_keys(text, m["piece_lens"], m["max_gap"]))
+        conn = self._conn()
+
+        hits = Counter()
+        for part in _chunks(keys, _IN_CHUNK):
+            q = f"SELECT id FROM plate_pairs WHERE key IN ({','.join('?' * len(part))})"
+            hits.update(r[0] for r in conn.execute(q, part))
+        for (pid,) in conn.execute("SELECT id FROM short_plates"):
+            hits[pid] = max(hits[pid], ALWAYS_VERIFY)
+
+        def ranked():
+            for pid, h in hits.most_common():
+                row = conn.execute("SELECT plate FROM vehicles WHERE id = ?", (pid,)).fetchone()
+                if row:
+                    yield row[0], h
+
+        return pick_best(text, ranked())
+
+    # ---------------- bulk import ----------------
+    def import_rows(self, rows: Iterable[Dict[str, Any]], batch: int = 50000, fuzzy_index: bool = True) -> int:
+        """
+        rows: dicts with a plate under "vehicle_no" / "plate" / "registration_no"
+        and the MOCK_DB fields (maker, model, color, owner_*...).
+        """
+        conn = self._conn()
+        conn.execute("PRAGMA synchronous=OFF")
+        m = self.meta()
+        piece_lens, max_gap = set(m["piece_lens"]), m["max_gap"]
+
+        n = 0
+        buf = []
+
+        def flush():
+            nonlocal max_gap
+            cur = conn.cursor()
+            for plate, data in buf:
+                # upsert, not REPLACE: REPLACE would hand out a new id and orphan the pair rows
+                cur.execute("INSERT INTO vehicles(plate, data) VALUES (?, ?) "
+                            "ON CONFLICT(plate) DO UPDATE SET data = excluded.data", (plate, data))
+                if not fuzzy_index:
+                    continue
+                pid = cur.execute("SELECT id FROM vehicles WHERE plate = ?", (plate,)).fetchone()[0]
+                keys = pair_keys(fold(plate))
+                if not keys:
+                    cur.execute("INSERT OR IGNORE INTO short_plates(id) VALUES (?)", (pid,))
+                    continue
+                for key, plen, gap in keys:
+                    piece_lens.add(plen)
+                    max_gap = max(max_gap, gap)
+                cur.executemany("INSERT OR IGNORE INTO plate_pairs(key, id) VALUES (?, ?)",
+                                [(k, pid) for k, _, _ in keys])
+            conn.commit()
+            buf.clear()
+
+        for row in rows:
+            plate = only_alnum(row.get("vehicle_no") or row.get("plate") or row.get("registration_no") or "")
+            if not plate:
+                continue
+            data = {k: v for k, v in row.items() if k not in ("vehicle_no", "plate", "registration_no") and v not in (None, "")}
+            buf.append((plate, json.dumps(data, separators=(",", ":"))))
+            n += 1
+            if len(buf) >= batch:
+                flush()
+        flush()
+
+        conn.execute("INSERT OR REPLACE INTO meta(k, v) VALUES ('piece_lens', ?)", (json.dumps(sorted(piece_lens)),))
+        conn.execute("INSERT OR REPLACE INTO meta(k, v) VALUES ('max_gap', ?)", (str(max_gap),))
+        conn.commit()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._meta = None
+        return n
+
+
+class SqlitePlateSet:
+    """`prefer` stand-in for a registry that is too big to pull into a set."""
+
+    def __init__(self, reg: SqliteRegistry):
+        self._reg = reg
+
+    def __contains__(self, plate):
+        return self._reg.contains(plate)
+
+    def __len__(self):
+        return len(self._reg)
+
+    def __bool__(self):
+        return True
+
+    def known(self, plates: Iterable[str]) -> set:
+        return set(self._reg.get_many(plates))
+
+    def best_match(self, text: str) -> str:
+        return self._reg.best_match(text)
+
+
+# ===========================================================
+#   HTTP (remote API / local stand-in)
+# ===========================================================
+class HttpRegistry:
+    name = "REGISTRY_API"
+
+    def __init__(self, base_url: str = REGISTRY_URL, timeout: float = REGISTRY_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, path: str, payload: Optional[dict] = None):
+        url = self.base_url + path
+        data = None
+        headers = {"Accept": "application/json"}
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(url, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return 404, {}
+            raise RegistryError(f"registry HTTP {e.code} for {path}") from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise RegistryError(f"registry unreachable: {e}") from e
+
+    def get(self, plate: str) -> Optional[Dict[str, Any]]:
+        status, body = self._call("/vehicle/" + urllib.parse.quote(plate))
+        return body.get("vehicle") if status == 200 else None
+
+    def get_many(self, plates: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        plates = list(dict.fromkeys(p for p in plates if p))
+        if not plates:
+            return {}
+        _, body = self._call("/vehicles", {"plates": plates})
+        return body.get("vehicles") or {}
+
+    def contains(self, plate: str) -> bool:
+        return self.get(plate) is not None
+
+    def best_match(self, text: str) -> str:
+        _, body = self._call("/match?" + urllib.parse.urlencode({"text": text}))
+        return body.get("vehicle_no") or ""
+
+    def prefer(self):
+        return HttpPlateSet(self)
+
+
+class HttpPlateSet:
+    def __init__(self, reg: HttpRegistry):
+        self._reg = reg
+
+    def __contains__(self, plate):
+        return self._reg.contains(plate)
+
+    def __bool__(self):
+        return True
+
+    def known(self, plates: Iterable[str]) -> set:
+        return set(self._reg.get_many(plates))
+
+    def best_match(self, text: str) -> str:
+        return self._reg.best_match(text)
+
+
+def make_app(reg, latency_ms: float = 0.0):
+    """Flask app emulating a remote registry API on top of any backend."""
+    from flask import Flask, jsonify, request
+
+    app = Flask("registry")
+
+    def _delay():
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000.0)
+
+    @app.route("/health")
+    def health():
+        return jsonify({"ok": True, "backend": reg.name}), 200
+
+    @app.route("/vehicle/<plate>")
+    def vehicle(plate):
+        _delay()
+        d = reg.get(only_alnum(plate))
+        if not d:
+            return jsonify({"error_code": "NOT_FOUND", "vehicle_no": plate}), 404
+        return jsonify({"vehicle_no": only_alnum(plate), "vehicle": d}), 200
+
+    @app.route("/vehicles", methods=["POST"])
+    def vehicles():
+        _delay()
+        plates = [only_alnum(p) for p in (request.get_json(silent=True) or {}).get("plates", [])]
+        return jsonify({"vehicles": reg.get_many(plates)}), 200
+
+    @app.route("/match")
+    def match():
+        _delay()
+        text = request.args.get("text", "")
+        prefer = reg.prefer()
+        if hasattr(prefer, "best_match"):
+            hit = prefer.best_match(text)
+        else:
+            from normalize import best_prefer_match
+            hit = best_prefer_match(text, prefer)
+        return jsonify({"vehicle_no": hit}), 200
+
+    return app
+
+
+# ===========================================================
+#   LOOKUP CACHE
+# ===========================================================
+_MISSING = object()
+
+
+class _Flight:
+    """One in-progress lookup that concurrent callers of the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class CachedRegistry:
+    """
+    TTL + LRU cache in front of another backend.
+
+    - hits are kept for `ttl` seconds, NOT_FOUND (None) for `negative_ttl`
+    - concurrent lookups of the same plate share one upstream request
+    - RegistryError is never cached; every waiter of that flight gets it raised
+    """
+
+    def __init__(self, inner, ttl: float = REGISTRY_CACHE_TTL, negative_ttl: float = REGISTRY_CACHE_NEG_TTL,
+                 max_entries: int = REGISTRY_CACHE_MAX):
+        self.inner = inner
+        self.name = inner.name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def __len__(self):
+        return len(self.inner)
+
+    # ---------------- cache core ----------------
+    def _cached(self, key, now):
+        """Fresh cached value or _MISSING. Caller holds the lock."""
+        e = self._entries.get(key)
+        if e is None:
+            return _MISSING
+        if e[0] <= now:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return e[1]
+
+    def _store(self, key, value, now):
+        """Caller holds the lock."""
+        ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _hit(self, value):
+        self._stats["hits" if value else "negative_hits"] += 1
+        return value
+
+    def _lookup(self, key, fetch):
+        with self._lock:
+            value = self._cached(key, time.monotonic())
+            if value is not _MISSING:
+                return self._hit(value)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, flight.value, time.monotonic())
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.value
+
+    # ---------------- registry API ----------------
+    def get(self, plate: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(("get", plate), lambda: self.inner.get(plate))
+
+    def get_many(self, plates: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        plates = list(dict.fromkeys(p for p in plates if p))
+        out: Dict[str, Dict[str, Any]] = {}
+        todo = []
+        with self._lock:
+            now = time.monotonic()
+            for p in plates:
+                value = self._cached(("get", p), now)
+                if value is _MISSING:
+                    todo.append(p)
+                elif self._hit(value):
+                    out[p] = value
+            self._stats["misses"] += len(todo)
+
+        if todo:
+            try:
+                found = self.inner.get_many(todo)
+            except BaseException:
+                with self._lock:
+                    self._stats["errors"] += 1
+                raise
+            with self._lock:
+                now = time.monotonic()
+                for p in todo:
+                    self._store(("get", p), found.get(p), now)
+            out.update(found)
+        return out
+
+    def contains(self, plate: str) -> bool:
+        return self.get(plate) is not None
+
+    def best_match(self, text: str) -> str:
+        inner = self.inner.prefer()
+        return self._lookup(("match", text), lambda: inner.best_match(text))
+
+    def prefer(self):
+        inner = self.inner.prefer()
+        # local sets / indexes are already cheaper than the cache
+        if not hasattr(inner, "best_match") or isinstance(inner, PlateIndex):
+            return inner
+        return CachedPlateSet(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {k: self._stats[k] for k in ("hits", "negative_hits", "misses", "coalesced", "errors", "evictions")}
+            out["entries"] = len(self._entries)
+            out["inflight"] = len(self._inflight)
+        looked_up = out["hits"] + out["negative_hits"] + out["misses"] + out["coalesced"]
+        out["hit_rate"] = round((looked_up - out["misses"]) / looked_up, 4) if looked_up else 0.0
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+class CachedPlateSet:
+    def __init__(self, reg: CachedRegistry):
+        self._reg = reg
+
+    def __contains__(self, plate):
+        return self._reg.contains(plate)
+
+    def __bool__(self):
+        return True
+
+    def known(self, plates: Iterable[str]) -> set:
+        return set(self._reg.get_many(plates))
+
+    def best_match(self, text: str) -> str:
+        return self._reg.best_match(text)
+
+
+# ===========================================================
+#   SELECTION
+# ===========================================================
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                if REGISTRY_BACKEND == "sqlite":
+                    _registry = SqliteRegistry(REGISTRY_DB)
+                elif REGISTRY_BACKEND == "http":
+                    _registry = HttpRegistry(REGISTRY_URL)
+                else:
+                    _registry = MemoryRegistry()
+                if REGISTRY_CACHE == "1" or (REGISTRY_CACHE != "0" and REGISTRY_BACKEND == "http"):
+                    _registry = CachedRegistry(_registry)
+    return _registry
+
+
+def cache_stats() -> Dict[str, Any]:
+    reg = get_registry()
+    if isinstance(reg, CachedRegistry):
+        return {"enabled": True, "backend": REGISTRY_BACKEND, **reg.stats()}
+    return {"enabled": False, "backend": REGISTRY_BACKEND}
+
+
+def set_registry(reg):
+    global _registry
+    _registry = reg
+
+
+# ===========================================================
+#   CLI
+# ===========================================================
+def _read_dump(path: str):
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Vehicle registry tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    imp = sub.add_parser("import", help="bulk import a CSV / NDJSON registry dump into SQLite")
+    imp.add_argument("path")
+    imp.add_argument("--db", default=REGISTRY_DB)
+    imp.add_argument("--no-fuzzy-index", action="store_true")
+
+    srv = sub.add_parser("serve", help="run a local stand-in registry HTTP API")
+    srv.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    srv.add_argument("--db", default=REGISTRY_DB)
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8090)
+    srv.add_argument("--latency-ms", type=float, default=0.0, help="artificial delay per request")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        t0 = time.perf_counter()
+        n = SqliteRegistry(args.db).import_rows(_read_dump(args.path), fuzzy_index=not args.no_fuzzy_index)
+        print(f"Imported {n} vehicles into {args.db} in {time.perf_counter() - t0:.1f}s")
+        return 0
+
+    reg = SqliteRegistry(args.db) if args.backend == "sqlite" else MemoryRegistry()
+    make_app(reg, latency_ms=args.latency_ms).run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
+import json
 from flask_cors import CORS
 import io, os
 from bson.objectid import ObjectId
 import db_service
 import AI_Engine as AI_Engine
+import ocr_cache
+import registry
+import normalize
+import media
+import evidence
 from threading import Thread
 DEBUG = True
+MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+# the original stands in until its derivative is stored: cache it only briefly
+MEDIA_PENDING_MAX_AGE = int(os.environ.get("MEDIA_PENDING_MAX_AGE", "60"))
 app = Flask(__name__)
 CORS(app)
 
@@ -51,8 +60,10 @@ def _process_to_api(p):
 
     if fid:
         out["media_url"] = f"{_base_url()}/media/{fid}"
+        out["thumb_url"] = f"{_base_url()}/media/{fid}?w=320"
     else:
         out["media_url"] = None
+        out["thumb_url"] = None
 
     return out
 
@@ -91,6 +102,21 @@ def health():
     return jsonify({"ok": ok, "db": msg}), (200 if ok else 500)
 
 
+@app.route("/metrics/ocr_cache")
+def ocr_cache_metrics():
+    return jsonify(ocr_cache.stats()), 200
+
+
+@app.route("/metrics/registry_cache")
+def registry_cache_metrics():
+    return jsonify(registry.cache_stats()), 200
+
+
+@app.route("/metrics/rc_decode")
+def rc_decode_metrics():
+    return jsonify(normalize.decode_stats()), 200
+
+
 @app.route("/login", methods=["POST"])
 def login():
     print(1)
@@ -232,6 +258,24 @@ def off_loan_detail(loan_id):
     return jsonify({"error": "not found"}), 404
 
 
+@app.route("/bank/loan/<loan_id>/evidence")
+def off_loan_evidence(loan_id):
+    """Latest verification evidence of every process of the loan."""
+    return jsonify({"data": evidence.get_evidence_store(db_service.db).for_loan(loan_id)}), 200
+
+
+@app.route("/bank/loan/<loan_id>/evidence/<process_id>")
+def off_process_evidence(loan_id, process_id):
+    """Why the process got its score: latest run, or every run with ?history=1."""
+    store = evidence.get_evidence_store(db_service.db)
+    if request.args.get("history", "").lower() in ("1", "true", "yes"):
+        return jsonify({"data": store.history(loan_id, process_id)}), 200
+    d = store.latest(loan_id, process_id)
+    if d:
+        return jsonify(d), 200
+    return jsonify({"error": "not found"}), 404
+
+
 @app.route("/bank/verify", methods=["POST"])
 def verify_process():
     d = request.get_json(silent=True) or {}
@@ -273,18 +317,92 @@ def create_new():
 
 @app.route("/media/<file_id>")
 def get_file(file_id):
+    """
+    Evidence file: the normalized derivative by default, ?original=1 for the
+    upload as stored, ?w=<px> for a cached thumbnail (poster frame for videos,
+    first page for PDFs). A file id always shows the same evidence, so
+    responses are cacheable for MEDIA_MAX_AGE (thumbnails as immutable); an
+    upload whose derivative is expected but not stored yet only for
+    MEDIA_PENDING_MAX_AGE, so clients pick up the derivative (new ETag) later.
+    """
     try:
         f = fs.get(ObjectId(file_id))
+        pending = False
+        if request.args.get("original", "").lower() not in ("1", "true", "yes"):
+            f, pending = media.served_file(db_service.collection, db_service.db, fs, f)
+        width = media.thumb_width(request.args.get("w"))
+        thumb = None
+        if width:
+            source = f
+            thumb = media.get_thumbnail_cache(db_service.db, fs).get(file_id, width, lambda: source)
+            f = thumb or f
         name = (f.filename or "").lower()
         if name.endswith(".mp4") or name.endswith(".mov") or name.endswith(".mkv"):
             m = "video/mp4"
+        elif name.endswith(".pdf"):
+            m = "application/pdf"
+        elif name.endswith(".webp"):
+            m = "image/webp"
         else:
             m = "image/jpeg"
-        return send_file(io.BytesIO(f.read()), mimetype=m, download_name=f.filename)
+        resp = send_file(io.BytesIO(f.read()), mimetype=m, download_name=f.filename,
+                         etag=str(f._id), conditional=True,
+                         max_age=MEDIA_PENDING_MAX_AGE if pending and thumb is None else MEDIA_MAX_AGE)
+        if thumb is not None:
+            resp.cache_control.immutable = True
+        return resp
     except Exception:
         return jsonify({"error": "File not found"}), 404
 
 
+@app.route("/batch/verify_plates", methods=["POST"])
+def batch_verify_plates():
+    """
+    {"file_ids": [...], "officer_inputs": {file_id: {name, address, ...}}, "workers": n}
+    -> NDJSON stream, one line per image, then a summary line.
+    """
+    import batch_verify
+
+    d = request.get_json(silent=True) or {}
+    file_ids = [str(x) for x in (d.get("file_ids") or []) if x]
+    if not file_ids:
+        return jsonify({"error": "file_ids required"}), 400
+    manifest = d.get("officer_inputs") or {}
+    # each worker is a process with its own OpenCV + Tesseract: never more than the cores
+    cpus = os.cpu_count() or 1
+    try:
+        workers = int(d.get("workers", cpus))
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers must be an integer"}), 400
+    if workers <= 0:
+        return jsonify({"error": "workers must be positive"}), 400
+    workers = min(workers, cpus)
+
+    def generate():
+        stats = batch_verify.BatchStats(workers)
+        for res in batch_verify.run_batch(batch_verify.iter_gridfs(file_ids), manifest, workers, stats=stats):
+            yield json.dumps(res, default=str) + "\n"
+        yield json.dumps(stats.summary()) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@app.route("/batch/compare", methods=["POST"])
+def batch_compare():
+    """
+    {"doc_type": "invoice", "agreements": [...] | {field: [...]},
+     "extractions": [...] | {field: [...]}}  -> {"results": [compare() result per row]}
+    """
+    from compare import compare_batch
+
+    d = request.get_json(silent=True) or {}
+    try:
+        results = compare_batch(d.get("doc_type") or "", d.get("agreements") or [], d.get("extractions") or [])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(results), "results": results}), 200
+
+
 @app.route("/")
 def home():
     return jsonify({"message": "Nyay Sahayak Running"}), 200
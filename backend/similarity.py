@@ -0,0 +1,278 @@
+"""
+Shared string-distance kernels for compare, compare_rc, normalize and plate_index.
+
+- Unweighted edit distance goes through rapidfuzz's C implementation.
+- The confusion-weighted edit distance (OCR look-alikes cost less than a real
+  substitution) has no rapidfuzz equivalent. Single pairs use a two-row
+  Python DP with early cutoff. Batches use a NumPy DP that runs all
+  candidates in lock-step.
+"""
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz import process
+
+CostTable = Dict[Tuple[str, str], float]
+
+
+# ===========================================================
+#   UNWEIGHTED (rapidfuzz)
+# ===========================================================
+def levenshtein(a: str, b: str, cutoff: Optional[int] = None) -> int:
+    """Edit distance; with cutoff, anything above it comes back as cutoff + 1."""
+    return Levenshtein.distance(a or "", b or "", score_cutoff=cutoff)
+
+
+def normalized_similarity(a: str, b: str) -> float:
+    """1 - distance / max(len), the formula compare_rc.strict_similarity used."""
+    if not a or not b:
+        return 0.0
+    return max(0.0, min(1.0, 1.0 - levenshtein(a, b) / float(max(len(a), len(b)))))
+
+
+def levenshtein_one_to_many(query: str, choices: Sequence[str], cutoff: Optional[int] = None):
+    """Distances from one string to each choice, as a NumPy int32 array."""
+    return process.cdist([query], list(choices), scorer=Levenshtein.distance,
+                         score_cutoff=cutoff, workers=1)[0]
+
+
+def levenshtein_many_to_many(queries: Sequence[str], choices: Sequence[str],
+                             cutoff: Optional[int] = None, workers: int = -1):
+    """len(queries) x len(choices) distance matrix, computed in parallel in C."""
+    return process.cdist(list(queries), list(choices), scorer=Levenshtein.distance,
+                         score_cutoff=cutoff, workers=workers)
+
+
+# ===========================================================
+#   CONFUSION-WEIGHTED
+# ===========================================================
+def confusion_costs(conf: Dict[str, Set[str]], cost: float = 0.25) -> CostTable:
+    """Symmetric substitution-cost table from a {char: {look-alikes}} map."""
+    out: CostTable = {}
+    for a, bs in conf.items():
+        for b in bs:
+            out[(a, b)] = cost
+            out[(b, a)] = cost
+    return out
+
+
+def weighted_distance(a: str, b: str, costs: CostTable, cutoff: Optional[float] = None) -> float:
+    """
+    Edit distance with indel cost 1 and substitution cost costs.get((x, y), 1).
+    With cutoff, returns a value > cutoff as soon as every alignment is over it.
+    """
+    n, m = len(a), len(b)
+    if n == 0:
+        return float(m)
+    if m == 0:
+        return float(n)
+    if cutoff is not None and abs(n - m) > cutoff:
+        return float(abs(n - m))
+
+    get = costs.get
+    prev = [float(j) for j in range(m + 1)]
+    for i in range(1, n + 1):
+        ai = a[i - 1]
+        cur = [float(i)] + [0.0] * m
+        row_min = cur[0]
+        for j in range(1, m + 1):
+            bj = b[j - 1]
+            sub = prev[j - 1] + (0.0 if ai == bj else get((ai, bj), 1.0))
+            v = prev[j] + 1.0
+            if cur[j - 1] + 1.0 < v:
+                v = cur[j - 1] + 1.0
+            if sub < v:
+                v = sub
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if cutoff is not None and row_min > cutoff:
+            return row_min
+        prev = cur
+    return prev[m]
+
+
+def weighted_substring_distance(text: str, pattern: str, costs: CostTable,
+                                cutoff: Optional[float] = None) -> float:
+    """
+    min over substrings t of `text` of weighted_distance(t, pattern): leading
+    and trailing text is free. With cutoff, returns a value > cutoff once no
+    alignment can still get under it.
+    """
+    n, m = len(text), len(pattern)
+    get = costs.get
+    prev = [float(j) for j in range(m + 1)]
+    best = prev[m]
+    for i, ch in enumerate(text, 1):
+        cur = [0.0] * (m + 1)
+        row_min = 0.0
+        for j in range(1, m + 1):
+            pj = pattern[j - 1]
+            sub = prev[j - 1] + (0.0 if ch == pj else get((ch, pj), 1.0))
+            v = prev[j] + 1.0
+            if cur[j - 1] + 1.0 < v:
+                v = cur[j - 1] + 1.0
+            if sub < v:
+                v = sub
+            cur[j] = v
+            if j == 1 or v < row_min:
+                row_min = v
+        if cur[m] < best:
+            best = cur[m]
+        # A match may still start on any later row (cur[0] is always 0), and
+        # one starting there needs at least m - (n - i) insertions. Alignments
+        # already under way cost at least row_min, which skips cur[0].
+        if cutoff is not None and best > cutoff and row_min > cutoff and m - (n - i) > cutoff:
+            return best
+        prev = cur
+    return best
+
+
+def _cost_matrix(costs: CostTable):
+    import numpy as np
+
+    mat = np.ones((128, 128), dtype=np.float32)
+    np.fill_diagonal(mat, 0.0)
+    for (a, b), c in costs.items():
+        if ord(a) < 128 and ord(b) < 128:
+            mat[ord(a), ord(b)] = c
+    return mat
+
+
+_matrices: Dict[int, tuple] = {}
+
+
+def _matrix_for(costs: CostTable):
+    hit = _matrices.get(id(costs))
+    if hit is None or hit[0] is not costs:
+        hit = (costs, _cost_matrix(costs))
+        _matrices[id(costs)] = hit
+    return hit[1]
+
+
+def _codes(strings: Sequence[str]):
+    import numpy as np
+
+    width = max((len(s) for s in strings), default=0)
+    arr = np.zeros((len(strings), max(1, width)), dtype=np.uint8)
+    lens = np.zeros(len(strings), dtype=np.int32)
+    for k, s in enumerate(strings):
+        b = s.encode("ascii", "replace")
+        arr[k, :len(b)] = np.frombuffer(b, dtype=np.uint8) & 0x7F
+        lens[k] = len(b)
+    return arr, lens
+
+
+def weighted_one_to_many(query: str, choices: Sequence[str], costs: CostTable):
+    """
+    weighted_distance(query, c) for every choice, as a float32 array.
+    The DP runs over the choice positions with all choices side by side, so
+    the Python-level work is len(query) x max_len, not x len(choices).
+    """
+    import numpy as np
+
+    if not choices:
+        return np.zeros(0, dtype=np.float32)
+    mat = _matrix_for(costs)
+    arr, lens = _codes(choices)
+    N, M = arr.shape
+    q = [ord(ch) & 0x7F for ch in query]
+
+    prev = np.broadcast_to(np.arange(M + 1, dtype=np.float32), (N, M + 1)).copy()
+    for i, qc in enumerate(q, start=1):
+        sub = mat[qc][arr]  # N x M substitution costs for this query char
+        cur = np.empty_like(prev)
+        cur[:, 0] = i
+        diag = prev[:, :-1] + sub
+        up = prev[:, 1:] + 1.0
+        best = np.minimum(diag, up)
+        # left-to-right dependency (insertions) can't be vectorized across j
+        for j in range(1, M + 1):
+            v = cur[:, j - 1] + 1.0
+            np.minimum(best[:, j - 1], v, out=cur[:, j])
+        prev = cur
+
+    return prev[np.arange(N), lens]
+
+
+def weighted_many_to_many(queries: Sequence[str], choices: Sequence[str], costs: CostTable):
+    """len(queries) x len(choices) weighted distance matrix."""
+    import numpy as np
+
+    out = np.zeros((len(queries), len(choices)), dtype=np.float32)
+    for k, q in enumerate(queries):
+        out[k] = weighted_one_to_many(q, choices, costs)
+    return out
+
+
+# ===========================================================
+#   BIT-PARALLEL SUBSTRING MATCH
+# ===========================================================
+def substring_distance(text: str, pattern: str) -> int:
+    """
+    Min unit edit distance of `pattern` against any substring of `text`
+    (Myers' bit-parallel algorithm, one big-int step per text char).
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best = m
+    for ch in text:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best = score
+    return best
+
+
+# ===========================================================
+#   TOKEN MATCHING
+# ===========================================================
+def initials_match(a_tok: str, b_tok: str) -> bool:
+    # exact, or an initial: "r" matches "reina" and vice versa
+    if a_tok == b_tok:
+        return True
+    if len(a_tok) == 1 and b_tok.startswith(a_tok):
+        return True
+    if len(b_tok) == 1 and a_tok.startswith(b_tok):
+        return True
+    return False
+
+
+def token_f1(A: List[str], B: List[str], match=initials_match) -> float:
+    """Greedy one-to-one token matching (first unused match wins), scored as F1."""
+    if not A or not B:
+        return 0.0
+
+    matched = 0
+    used = set()
+    for at in A:
+        for j, bt in enumerate(B):
+            if j in used:
+                continue
+            if match(at, bt):
+                matched += 1
+                used.add(j)
+                break
+
+    precision = matched / max(1, len(B))
+    recall = matched / max(1, len(A))
+    return (2 * precision * recall / (precision + recall)) if (precision + recall) else 0.0
@@ -0,0 +1,309 @@
+"""
+Invoice line-item tables from OCR word geometry.
+
+ocr_lines_with_bboxes keeps every line's word boxes ("words", a view of the
+page's WORD_DTYPE array). Here they are joined into one array and clustered:
+
+- rows:    words sorted by vertical centre, split where the gap between
+           consecutive centres exceeds half a word height;
+- header:  the first row whose cells name >= 3 table columns
+           (S.No / Description / HSN / Qty / Rate / Taxable / GST / Amount);
+- columns: one per header cell, separated by the widest blank band of the
+           x-projection of the rows below the header (falls back to the
+           midpoint between header cells when text overlaps);
+- body:    rows under the header until the totals block; rows with no
+           number in a numeric column continue the previous description;
+- totals:  Sub Total / Taxable / CGST / SGST / IGST / Total rows after the body.
+
+Everything per word is done with NumPy; Python only loops over rows.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ocr_words import empty_words, words_array
+
+# (role, pattern on the header cell with everything but a-z0-9# removed)
+HEADER_ROLES = [
+    ("sno", re.compile(r"^(?:#|s|sl|sr|serial)?no$|^sn$|^#$")),
+    ("hsn", re.compile(r"hsn|sac")),
+    ("taxable", re.compile(r"taxable")),
+    ("cgst", re.compile(r"cgst")),
+    ("sgst", re.compile(r"sgst|utgst")),
+    ("igst", re.compile(r"igst")),
+    ("qty", re.compile(r"^(?:qty|quantity|nos|units?)")),
+    ("rate", re.compile(r"rate|price|mrp")),
+    ("description", re.compile(r"description|particular|item|product|goods|service|details")),
+    ("amount", re.compile(r"amount|total|value|^amt|^net")),
+]
+NUMERIC_ROLES = {"qty", "rate", "taxable", "cgst", "sgst", "igst", "amount"}
+TAX_ROLES = ("cgst", "sgst", "igst")
+
+# totals block: first matching label wins, checked in order
+TOTAL_LABELS = [
+    ("total", re.compile(r"grand\s*total|total\s*payable|invoice\s*(?:amount|value|total)|net\s*(?:amount|payable)|amount\s*payable")),
+    ("subtotal", re.compile(r"sub\s*-?\s*total")),
+    ("taxable", re.compile(r"taxable")),
+    ("cgst", re.compile(r"cgst")),
+    ("sgst", re.compile(r"sgst|utgst")),
+    ("igst", re.compile(r"igst")),
+    ("round_off", re.compile(r"round")),
+    ("total", re.compile(r"\btotal\b")),
+]
+TABLE_END_RE = re.compile(r"sub\s*-?\s*total|\btotal\b|taxable\s*amount|amount\s*in\s*words")
+TOTALS_END_RE = re.compile(r"in\s*words|terms|declaration|bank|thank|signature|authori[sz]ed")
+MAX_TOTAL_ROWS = 10
+
+_KEY_RE = re.compile(r"[^a-z0-9#]")
+_MONEY_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+Table = Dict[str, Any]
+
+
+def _num(s: str) -> Optional[float]:
+    m = _MONEY_RE.search(s or "")
+    if not m:
+        return None
+    try:
+        return float(m.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _role(cell_text: str) -> Optional[str]:
+    key = _KEY_RE.sub("", cell_text.lower())
+    if not key:
+        return None
+    for role, pat in HEADER_ROLES:
+        if pat.search(key):
+            return role
+    return None
+
+
+# ===========================================================
+#   GEOMETRY
+# ===========================================================
+def word_arrays(lines: List[Dict[str, Any]]):
+    """All word boxes of the page: (texts, x0, y0, x1, y1) with the coordinates as int arrays."""
+    parts = [ln.get("words") for ln in lines]
+    parts = [p if isinstance(p, np.ndarray) else words_array(p) for p in parts if p is not None and len(p)]
+    words = np.concatenate(parts) if parts else empty_words()
+    x0 = words["x"].astype(np.int64)
+    y0 = words["y"].astype(np.int64)
+    return words["text"].tolist(), x0, y0, x0 + words["w"], y0 + words["h"]
+
+
+def cluster_rows(y0: np.ndarray, y1: np.ndarray) -> np.ndarray:
+    """Row id per word; rows are numbered top to bottom."""
+    if len(y0) == 0:
+        return np.zeros(0, dtype=np.int64)
+    cy = (y0 + y1) / 2.0
+    order = np.argsort(cy, kind="stable")
+    tol = 0.5 * max(1.0, float(np.median(y1 - y0)))
+    brk = np.concatenate(([0], (np.diff(cy[order]) > tol).astype(np.int64)))
+    rows = np.empty_like(order)
+    rows[order] = np.cumsum(brk)
+    return rows
+
+
+def _row_members(row_ids: np.ndarray, x0: np.ndarray, n_rows: int) -> List[np.ndarray]:
+    """Word indices of each row, left to right."""
+    order = np.lexsort((x0, row_ids))
+    cuts = np.searchsorted(row_ids[order], np.arange(1, n_rows))
+    return np.split(order, cuts)
+
+
+def _cells(idx: np.ndarray, x0: np.ndarray, x1: np.ndarray, gap: float) -> List[np.ndarray]:
+    """Split one row's words (sorted by x) into cells wherever the horizontal gap exceeds `gap`."""
+    if len(idx) < 2:
+        return [idx]
+    right = np.maximum.accumulate(x1[idx])
+    cut = np.nonzero(x0[idx[1:]] - right[:-1] > gap)[0] + 1
+    return np.split(idx, cut)
+
+
+def _blank_runs(occ: np.ndarray, a: int, b: int):
+    """(start, end) of the longest blank run of occ within [a, b), or None."""
+    seg = ~occ[a:b]
+    if not seg.any():
+        return None
+    d = np.diff(np.concatenate(([0], seg.astype(np.int8), [0])))
+    starts, ends = np.nonzero(d == 1)[0], np.nonzero(d == -1)[0]
+    k = int(np.argmax(ends - starts))
+    return a + int(starts[k]), a + int(ends[k])
+
+
+def column_bounds(header_l: np.ndarray, header_r: np.ndarray, body_x0: np.ndarray, body_x1: np.ndarray) -> np.ndarray:
+    """x separators between consecutive header cells (len = cells - 1)."""
+    if len(header_l) < 2:
+        return np.zeros(0)
+    width = int(max(header_r.max(), body_x1.max() if len(body_x1) else 0)) + 2
+    edges = np.bincount(body_x0, minlength=width) - np.bincount(body_x1, minlength=width)
+    occ = np.cumsum(edges)[:width] > 0
+
+    centres = (header_l + header_r) / 2.0
+    bounds = np.empty(len(header_l) - 1)
+    for i in range(len(bounds)):
+        run = _blank_runs(occ, int(centres[i]), int(centres[i + 1]))
+        if run is not None:
+            bounds[i] = (run[0] + run[1]) / 2.0
+        else:
+            bounds[i] = (header_r[i] + header_l[i + 1]) / 2.0
+    return bounds
+
+
+# ===========================================================
+#   TABLE
+# ===========================================================
+def _find_header(members, texts, x0, x1, gap):
+    for r, idx in enumerate(members):
+        cells = _cells(idx, x0, x1, gap)
+        roles = [_role(" ".join(texts[i] for i in c)) for c in cells]
+        named = {x for x in roles if x}
+        if len(named) >= 3 or (len(named) >= 2 and "description" in named):
+            return r, cells, roles
+    return None
+
+
+def _column_names(roles: List[Optional[str]]) -> List[str]:
+    names, seen = [], {}
+    for k, role in enumerate(roles):
+        role = role or f"col{k}"
+        seen[role] = seen.get(role, 0) + 1
+        names.append(role if seen[role] == 1 else f"{role}_{seen[role]}")
+    return names
+
+
+def _totals(rows_text: List[str]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for text in rows_text[:MAX_TOTAL_ROWS]:
+        low = text.lower()
+        if TOTALS_END_RE.search(low):
+            break
+        nums = _MONEY_RE.findall(text)
+        if not nums:
+            continue
+        val = _num(nums[-1])  # the amount column is the rightmost
+        for name, pat in TOTAL_LABELS:
+            if pat.search(low):
+                if name not in out:
+                    out[name] = val
+                break
+    return out
+
+
+def invoice_table(lines: List[Dict[str, Any]]) -> Optional[Table]:
+    """
+    Structured line-item table of an invoice page, or None when the lines
+    carry no word boxes or no table header is found:
+
+        {"columns": ["sno", "description", "hsn", "qty", "rate", "amount"],
+         "header": ["S.No", "Description", ...],
+         "rows": [{"sno": "1", "description": "...", "qty": 1.0, "amount": 1000.0, ...}],
+         "totals": {"subtotal": ..., "cgst": ..., "total": ...}}
+    """
+    texts, x0, y0, x1, y1 = word_arrays(lines)
+    if len(texts) < 3:
+        return None
+
+    row_ids = cluster_rows(y0, y1)
+    n_rows = int(row_ids.max()) + 1
+    gap = 0.9 * max(1.0, float(np.median(y1 - y0)))
+
+    members = _row_members(row_ids, x0, n_rows)
+    found = _find_header(members, texts, x0, x1, gap)
+    if found is None:
+        return None
+    hdr, cells, roles = found
+    columns = _column_names(roles)
+    header = [" ".join(texts[i] for i in c) for c in cells]
+
+    below = row_ids > hdr
+    hl = np.array([x0[c].min() for c in cells])
+    hr = np.array([x1[c].max() for c in cells])
+    bounds = column_bounds(hl, hr, x0[below], x1[below])
+    col = np.searchsorted(bounds, (x0 + x1) / 2.0)
+
+    rows: List[Dict[str, Any]] = []
+    pending: List[str] = []
+    end_row = n_rows
+    for r in range(hdr + 1, n_rows):
+        idx = members[r]
+        line = " ".join(texts[i] for i in idx)
+        if TABLE_END_RE.search(line.lower()):
+            end_row = r
+            break
+
+        cell_text: Dict[str, str] = {}
+        for i in idx:
+            name = columns[col[i]]
+            cell_text[name] = (cell_text.get(name, "") + " " + texts[i]).strip()
+
+        values: Dict[str, Any] = {}
+        for name, txt in cell_text.items():
+            base = name.split("_")[0]
+            if base in NUMERIC_ROLES:
+                v = _num(txt)
+                if v is not None:
+                    values[name] = v
+            else:
+                values[name] = txt
+
+        is_item = any(k.split("_")[0] in NUMERIC_ROLES for k in values)
+        desc = values.get("description", "")
+        if is_item:
+            if pending:
+                values["description"] = " ".join(pending + [desc]).strip()
+                pending = []
+            rows.append(values)
+        elif desc:
+            if rows:
+                rows[-1]["description"] = (rows[-1].get("description", "") + " " + desc).strip()
+            else:
+                pending.append(desc)
+
+    if not rows:
+        return None
+
+    tail = [" ".join(texts[i] for i in idx) for idx in members[end_row:end_row + MAX_TOTAL_ROWS]]
+
+    return {"columns": columns, "header": header, "rows": rows, "totals": _totals(tail)}
+
+
+def _row_tax(row: Dict[str, Any], base: float) -> float:
+    tax = 0.0
+    for role in TAX_ROLES:
+        # "CGST Rate | CGST Amt": the later column is the amount
+        vals = [v for k, v in row.items() if k.split("_")[0] == role and isinstance(v, float)]
+        if not vals:
+            continue
+        v = vals[-1]
+        if len(vals) == 1 and v <= 28 and base > 100:
+            v = base * v / 100.0  # only a GST rate (%) was printed
+        tax += v
+    return tax
+
+
+def table_total(table: Optional[Table]) -> Optional[float]:
+    """Invoice total from the table: printed total, else subtotal/line amounts plus GST."""
+    if not table:
+        return None
+    totals = table["totals"]
+    if totals.get("total"):
+        return totals["total"]
+
+    rows = table["rows"]
+    line_base = [r.get("taxable", r.get("amount")) for r in rows]
+    line_base = [b for b in line_base if isinstance(b, float)]
+    if not line_base:
+        return None
+
+    base = totals.get("subtotal") or totals.get("taxable") or sum(line_base)
+    if any(t in totals for t in TAX_ROLES):
+        tax = sum(totals.get(t, 0.0) for t in TAX_ROLES)
+    else:
+        tax = sum(_row_tax(r, b) for r, b in zip(rows, line_base))
+        if "taxable" not in table["columns"]:
+            tax = 0.0  # amount column is already the line total
+    return round(base + tax + totals.get("round_off", 0.0), 2)
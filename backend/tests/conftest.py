@@ -0,0 +1,54 @@
+"""
+Shared fixtures. The backend is a flat set of modules run from backend/, so
+the tests import them the same way.
+"""
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_db import STATE_CODES  # noqa: E402
+
+_LETTERS = "ABCDEFGHJKLMNPRSTUVWXYZ"
+_STATES = sorted(STATE_CODES)
+
+
+def random_plate(rng: random.Random) -> str:
+    """STATE RTO SERIES NUMBER, the grammar normalize.decode_rc parses."""
+    return (rng.choice(_STATES)
+            + str(rng.randint(1, 99))
+            + "".join(rng.choice(_LETTERS) for _ in range(rng.randint(1, 2)))
+            + str(rng.randint(1, 9999)).zfill(rng.choice((1, 4))))
+
+
+def ocr_noise(rng: random.Random, plate: str, confusions) -> str:
+    """A plate as OCR might read it: look-alike swaps, a dropped or extra char, junk around it."""
+    chars = list(plate)
+    for i, ch in enumerate(chars):
+        if ch in confusions and rng.random() < 0.2:
+            chars[i] = rng.choice(sorted(confusions[ch]))
+    r = rng.random()
+    if r < 0.2 and len(chars) > 6:
+        del chars[rng.randrange(len(chars))]
+    elif r < 0.4:
+        chars.insert(rng.randrange(len(chars) + 1), rng.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    junk = lambda: "".join(rng.choice("IND 0123456789ABC") for _ in range(rng.randint(0, 3)))
+    return junk() + "".join(chars) + junk()
+
+
+def look_alike(rng: random.Random, plate: str, confusions) -> str:
+    """plate with one character swapped for a look-alike: another vehicle OCR can't tell apart."""
+    spots = [i for i, ch in enumerate(plate) if ch in confusions]
+    if not spots:
+        return plate[:-1] + ("1" if plate[-1] != "1" else "7")
+    i = rng.choice(spots)
+    return plate[:i] + rng.choice(sorted(confusions[plate[i]])) + plate[i + 1:]
+
+
+@pytest.fixture(scope="session")
+def plates():
+    r = random.Random(42)
+    return sorted({random_plate(r) for _ in range(200)})
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+import pytest
+
+from dup_index import DupIndex, SqliteDupStore, fingerprint, minhash, shingles
+
+WORDS = ("fee receipt college tuition hostel amount paid student name roll number semester "
+         "date cash cheque bank branch principal signature total balance due invoice gst "
+         "supplier tractor pump motor quantity rate tax account ifsc district village").split()
+
+
+def document(r: random.Random, n_lines=14):
+    lines = []
+    for _ in range(n_lines):
+        words = [r.choice(WORDS) for _ in range(r.randint(3, 6))]
+        lines.append(" ".join(words) + f" {r.randint(100, 99999)}")
+    return lines
+
+
+def misread(r: random.Random, lines, rate=0.02):
+    """The same page OCR'd again: a few characters swapped."""
+    out = []
+    for line in lines:
+        chars = list(line)
+        for i in range(len(chars)):
+            if chars[i].isalpha() and r.random() < rate:
+                chars[i] = r.choice("aeilnorst")
+        out.append("".join(chars))
+    return out
+
+
+def test_minhash_estimates_jaccard():
+    r = random.Random(1)
+    for _ in range(20):
+        a = document(r)
+        b = a[: r.randint(4, 12)] + document(r, 8)
+        sa, sb = set(shingles("\n".join(a)).tolist()), set(shingles("\n".join(b)).tolist())
+        true = len(sa & sb) / len(sa | sb)
+        est = float((minhash(np.array(sorted(sa), dtype=np.uint64))
+                     == minhash(np.array(sorted(sb), dtype=np.uint64))).mean())
+        assert est == pytest.approx(true, abs=0.15)
+
+
+def test_short_text_has_no_fingerprint():
+    assert fingerprint(["total 500"]) is None
+    assert fingerprint([]) is None
+
+
+def test_lsh_finds_near_duplicates_and_nothing_else(tmp_path):
+    r = random.Random(2)
+    idx = DupIndex(SqliteDupStore(str(tmp_path / "dup.sqlite3")))
+    docs = [document(r) for _ in range(40)]
+    for i, lines in enumerate(docs):
+        assert idx.check(f"d{i}", {"loan_id": f"L{i}", "user_id": "u"}, lines) == []
+
+    found = 0
+    for i, lines in enumerate(docs):
+        hits = idx.check(f"copy{i}", {"loan_id": "other", "user_id": "v"}, misread(r, lines), index=False)
+        if hits and hits[0]["doc_id"] == f"d{i}":
+            found += 1
+        assert all(h["doc_id"] == f"d{i}" for h in hits)
+    assert found >= 38  # ~J 0.8 -> P(candidate) > 99.9% per document
+
+
+def test_same_loan_is_not_a_duplicate(tmp_path):
+    r = random.Random(3)
+    idx = DupIndex(SqliteDupStore(str(tmp_path / "dup.sqlite3")))
+    lines = document(r)
+    idx.check("a", {"loan_id": "L1", "user_id": "u"}, lines)
+    assert idx.check("b", {"loan_id": "L1", "user_id": "u"}, lines, index=False) == []
+    assert [h["doc_id"] for h in idx.check("c", {"loan_id": "L2", "user_id": "u"}, lines)] == ["a"]
+
+
+def test_candidates_rank_by_shared_bands(tmp_path):
+    r = random.Random(4)
+    store = SqliteDupStore(str(tmp_path / "dup.sqlite3"))
+    base = document(r, 20)
+    # same template, different content: each shares only a few bands with base
+    for i in range(60):
+        store.put(f"t{i}", {"loan_id": f"T{i}"}, fingerprint(base[:9] + document(r, 11)))
+    store.put("dup", {"loan_id": "D"}, fingerprint(misread(r, base, rate=0.005)))
+
+    q = fingerprint(base)["bands"]
+    assert len(store.candidates(q)) > 10
+    assert [c["doc_id"] for c in store.candidates(q, limit=1)] == ["dup"]
+    ranked = store.candidates(q, limit=5)
+    assert ranked[0]["doc_id"] == "dup" and len(ranked) <= 5
@@ -0,0 +1,34 @@
+import random
+
+from line_index import KeywordAutomaton, LineIndex
+
+KEYWORDS = ["name", "father", "father name", "date", "date of birth", "dob", "amount", "amt",
+            "total", "total amount", "receipt", "receipt no", "no", "a", "ab", "abc"]
+
+
+def test_automaton_finds_every_substring_keyword():
+    r = random.Random(1)
+    auto = KeywordAutomaton(KEYWORDS)
+    pool = KEYWORDS + ["x", " ", ":", "nam", "fath", "tot"]
+    for _ in range(2000):
+        text = "".join(r.choice(pool) for _ in range(r.randint(0, 8)))
+        assert auto.find(text) == {k for k in KEYWORDS if k in text}, text
+
+
+def test_empty_automaton():
+    assert KeywordAutomaton([]).find("anything") == set()
+    assert KeywordAutomaton([""]).find("anything") == set()
+
+
+def test_views_match_plain_substring_checks():
+    lines = [{"text": "Father Name: RAVI", "x": 0, "y": 0}, {"text": "", "x": 0, "y": 5},
+             {"text": "Total Amount 5,000", "x": 0, "y": 10}, {"text": "DOB 01/01/1990", "x": 0, "y": 40}]
+    idx = LineIndex(lines, KeywordAutomaton(KEYWORDS))
+    v = idx.view()
+    for i, text in enumerate(v.lower):
+        for kw in KEYWORDS + ["ravi", "5,000"]:
+            assert v.has(i, kw) == (kw in text)
+        assert v.has_any(i, ["dob", "ravi"]) == ("dob" in text or "ravi" in text)
+    assert v.first_with(["total"]) == 1
+    assert v.has_word(0, "name") and not v.has_word(0, "nam")
+    assert idx.top_region(0.35) == [0, 1]
@@ -0,0 +1,71 @@
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+from photo_hash import HashIndex, PhotoIndex, SqliteHashStore, hamming, hash_image
+
+
+def flip_bits(r: random.Random, h: int, n: int) -> int:
+    for b in r.sample(range(64), n):
+        h ^= 1 << b
+    return h
+
+
+def linear_scan(rows, ph, radius):
+    return sorted((k, hamming(ph, p)) for k, p in rows if hamming(ph, p) <= radius)
+
+
+@pytest.mark.parametrize("radius", [0, 3, 6, 7])
+def test_multi_index_matches_linear_scan(radius):
+    r = random.Random(radius)
+    idx, rows = HashIndex(), []
+    queries = [r.getrandbits(64) for _ in range(30)]
+    for q in queries:
+        # neighbours on both sides of the radius, plus unrelated hashes
+        for n in range(0, 10):
+            rows.append((f"k{len(rows)}", flip_bits(r, q, n)))
+    rows += [(f"k{len(rows) + i}", r.getrandbits(64)) for i in range(2000)]
+    for k, ph in rows:
+        idx.add(k, ph, 0, {})
+
+    for q in queries:
+        got = sorted((k, d) for k, d, _, _ in idx.query(q, 0, radius))
+        assert got == linear_scan(rows, q, radius)
+
+
+def test_query_is_nearest_first_and_replaces_keys():
+    idx = HashIndex()
+    idx.add("a", 0b111, 0, {"v": 1})
+    idx.add("b", 0b1, 0, {})
+    idx.add("a", 0, 5, {"v": 2})  # re-upload of a
+    assert len(idx) == 2
+    assert idx.query(0, 0, 7) == [("a", 0, 2, {"v": 2}), ("b", 1, 0, {})]
+
+
+def _photo(seed):
+    r = np.random.RandomState(seed)
+    img = cv2.resize(r.randint(0, 255, (12, 16, 3)).astype(np.uint8), (640, 480), interpolation=cv2.INTER_CUBIC)
+    return img
+
+
+def _jpeg(img, quality=90):
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def test_recompressed_photo_is_found_across_loans(tmp_path):
+    photos = PhotoIndex(SqliteHashStore(str(tmp_path / "ph.sqlite3")))
+    for i in range(20):
+        assert photos.check(f"L{i}:u:1", {"loan_id": f"L{i}", "user_id": "u"}, _jpeg(_photo(i))) == []
+
+    copy = _jpeg(cv2.resize(_photo(7), (480, 360)), quality=60)
+    hits = photos.check("L99:u:1", {"loan_id": "L99", "user_id": "u"}, copy, index=False)
+    assert [h["photo_id"] for h in hits] == ["L7:u:1"]
+    # the loan's own earlier upload is not a reuse
+    assert photos.check("L7:u:2", {"loan_id": "L7", "user_id": "u"}, copy, index=False) == []
+
+    # the SQLite store reloads into the same index
+    again = PhotoIndex(SqliteHashStore(str(tmp_path / "ph.sqlite3")))
+    assert len(again.index) == 20
+    assert hash_image(b"not an image") is None
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from conftest import look_alike, ocr_noise, random_plate
+from normalize import CONF, best_prefer_match, only_alnum, wedit
+from plate_index import PlateIndex
+
+
+def window_distance(text: str, plate: str) -> float:
+    """Distance the brute-force scan assigns to one plate (same windows as best_prefer_match)."""
+    s = only_alnum(text)
+    L = len(plate)
+    best = 1e9
+    for win_len in range(max(6, L - 2), min(len(s), L + 2) + 1):
+        for i in range(0, len(s) - win_len + 1):
+            best = min(best, wedit(s[i:i + win_len], plate))
+    return best
+
+
+def assert_same_match(text, got, want):
+    # ties between equally close plates may resolve either way; the distance may not differ
+    if got == want:
+        return
+    assert got and want, (text, got, want)
+    assert window_distance(text, got) == pytest.approx(window_distance(text, want)), (text, got, want)
+
+
+def queries(plates, n, seed):
+    r = random.Random(seed)
+    out = [ocr_noise(r, r.choice(plates), CONF) for _ in range(n)]
+    out += [random_plate(r) for _ in range(n // 4)]  # mostly not in the registry
+    out += ["", "IND", "0000000000", "TN", "HELLO WORLD 1234"]
+    return out
+
+
+def test_plate_index_matches_brute_force(plates):
+    prefer, index = set(plates), PlateIndex(plates)
+    for text in queries(plates, 120, seed=1):
+        assert_same_match(text, index.best_match(only_alnum(text)), best_prefer_match(text, prefer))
+
+
+@pytest.mark.parametrize("text", ["MH12AB1234", "XMH12AB1234", "KA MH12AB1234", "IND MH 12 AB 1234 X"])
+def test_exact_plate_beats_earlier_near_miss(text):
+    # the near-miss is scored first and sets a tight cutoff for the exact plate
+    index = PlateIndex(["MH12AB1Z34", "MH12AB1234"])
+    assert index.best_match(text) == best_prefer_match(text, {"MH12AB1Z34", "MH12AB1234"}) == "MH12AB1234"
+
+
+def test_plate_index_with_near_miss_neighbours(plates):
+    # every plate has a look-alike indexed before it, and the OCR text carries junk
+    r = random.Random(4)
+    family = []
+    for p in plates[:80]:
+        family += [look_alike(r, p, CONF), p]
+    index, prefer = PlateIndex(family), set(family)
+    for p in plates[:80]:
+        text = "".join(r.choice("KAIND0") for _ in range(r.randint(1, 4))) + " " + p
+        assert_same_match(text, index.best_match(text), best_prefer_match(text, prefer))
+
+
+def test_plate_index_with_short_plates():
+    plates = ["AB12", "TN1A1", "KA01AB1234", "DL3CAF0001", "MH12DE1433"]
+    index = PlateIndex(plates)
+    for text in ["KA0IAB1234", "AB12", "XAB12X", "TNIA1", "MHI2DEI433XX", "DL3C4F0001"]:
+        assert_same_match(text, index.best_match(only_alnum(text)), best_prefer_match(text, set(plates)))
+
+
+def test_plate_index_is_a_prefer_set(plates):
+    index = PlateIndex(plates)
+    assert len(index) == len(plates)
+    assert plates[0] in index and "ZZ99ZZ9999" not in index
+    text = ocr_noise(random.Random(3), plates[10], CONF)
+    assert best_prefer_match(text, index) == index.best_match(only_alnum(text))
@@ -0,0 +1,114 @@
+import re
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+
+from conftest import ocr_noise, random_plate
+from mock_db import STATE_CODES
+from normalize import (DIGIT_FROM_LETTER, LETTER_FROM_DIGIT, STATE_LETTER_CONFUSIONS,
+                       decode_rc, find_best_rc, only_alnum)
+
+
+# The candidate expansion find_best_rc used before the Viterbi decoder, kept here
+# as the reference it must agree with.
+def _gen_conversions(raw: str, kind: str) -> List[Tuple[str, int]]:
+    acc = [("", 0)]
+    for ch in raw:
+        nxt = []
+        for pref, cost in acc:
+            if kind == "digit":
+                if ch.isdigit():
+                    nxt.append((pref + ch, cost))
+                elif ch in DIGIT_FROM_LETTER:
+                    nxt += [(pref + d, cost + 1) for d in DIGIT_FROM_LETTER[ch]]
+            else:
+                if ch.isalpha():
+                    nxt.append((pref + ch, cost))
+                elif ch in LETTER_FROM_DIGIT:
+                    nxt += [(pref + c, cost + 1) for c in LETTER_FROM_DIGIT[ch]]
+        acc = nxt
+        if not acc:
+            return []
+    dedup: Dict[str, int] = {}
+    for s, c in acc:
+        if s not in dedup or c < dedup[s]:
+            dedup[s] = c
+    return list(dedup.items())
+
+
+def _state_variants(st: str) -> List[Tuple[str, int]]:
+    out = {(st, 0)}
+    for i, ch in enumerate(st):
+        for rep in STATE_LETTER_CONFUSIONS.get(ch, []):
+            out.add((st[:i] + rep + st[i + 1:], 1))
+    return list(out)
+
+
+def _window_candidates(s: str) -> List[Tuple[int, str]]:
+    out: Dict[str, int] = {}
+    for rto_len in (1, 2):
+        for series_len in (1, 2, 3):
+            num_len = len(s) - (2 + rto_len + series_len)
+            if not 1 <= num_len <= 4:
+                continue
+            parts = (s[:2], s[2:2 + rto_len], s[2 + rto_len:2 + rto_len + series_len], s[2 + rto_len + series_len:])
+            st_opts = _gen_conversions(parts[0], "letter")
+            rto_opts = _gen_conversions(parts[1], "digit")
+            ser_opts = _gen_conversions(parts[2], "letter")
+            num_opts = _gen_conversions(parts[3], "digit")
+            for st, cst in st_opts:
+                for st2, extra in _state_variants(st):
+                    if st2 not in STATE_CODES:
+                        continue
+                    for rto, crto in rto_opts:
+                        for ser, cser in ser_opts:
+                            for num, cnum in num_opts:
+                                cand = f"{st2}{rto}{ser}{num}"
+                                if not re.fullmatch(r"[A-Z]{2}\d{1,2}[A-Z]{1,3}\d{1,4}", cand):
+                                    continue
+                                cost = cst + extra + crto + cser + cnum
+                                if cand not in out or cost < out[cand]:
+                                    out[cand] = cost
+    return sorted(((c, k) for k, c in out.items()), key=lambda x: x[0])
+
+
+def reference_find_best_rc(text: str, prefer=None) -> Tuple[str, Tuple[int, int]]:
+    s = only_alnum(text)
+    best, best_key = "", (2, 10 ** 9)
+    for L in range(8, 13):
+        for i in range(0, len(s) - L + 1):
+            cands = _window_candidates(s[i:i + L])
+            if not cands:
+                continue
+            cost, cand = cands[0]
+            key = (0 if (prefer and cand in prefer) else 1, cost)
+            if key < best_key:
+                best_key, best = key, cand
+    return (best, best_key) if best and best_key[1] <= 6 else ("", best_key)
+
+
+def decoded_key(text: str, plate: str, prefer=None) -> Tuple[int, int]:
+    costs = [c for c, _, p in decode_rc(only_alnum(text)) if p == plate]
+    return (0 if (prefer and plate in prefer) else 1, min(costs))
+
+
+def rc_texts(seed, n=1000):
+    r = random.Random(seed)
+    confusions = {**{k: set(v) for k, v in DIGIT_FROM_LETTER.items()},
+                  **{k: set(v) for k, v in LETTER_FROM_DIGIT.items()}}
+    return [ocr_noise(r, random_plate(r), confusions) for _ in range(n)] + ["", "TN", "IND TN 10 BE 8962", "0000000000"]
+
+
+@pytest.mark.parametrize("use_prefer", [False, True])
+def test_decoder_matches_candidate_expansion(use_prefer):
+    texts = rc_texts(seed=5)
+    prefer = set(reference_find_best_rc(t)[0] for t in texts[::3]) - {""} if use_prefer else None
+    for text in texts:
+        want, want_key = reference_find_best_rc(text, prefer)
+        got = find_best_rc(text, prefer)
+        if got == want:
+            continue
+        # same best (registry hit, cost); which equally cheap reading wins may differ
+        assert got and want, (text, got, want)
+        assert decoded_key(text, got, prefer) == want_key, (text, got, want)
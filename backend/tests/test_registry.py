@@ -0,0 +1,54 @@
+import random
+
+from conftest import look_alike
+from normalize import CONF, best_prefer_match, find_best_rc
+from registry import MemoryRegistry, SqliteRegistry
+from test_plate_index import assert_same_match, queries
+
+
+def sqlite_registry(tmp_path, plates):
+    reg = SqliteRegistry(str(tmp_path / "reg.sqlite3"))
+    assert reg.import_rows({"vehicle_no": p, "maker": "X"} for p in plates) == len(plates)
+    return reg
+
+
+def test_sqlite_best_match_matches_brute_force(tmp_path, plates):
+    reg = sqlite_registry(tmp_path, plates)
+    prefer = set(plates)
+    for text in queries(plates, 60, seed=2):
+        assert_same_match(text, reg.best_match(text), best_prefer_match(text, prefer))
+
+
+def test_sqlite_best_match_with_near_miss_neighbours(tmp_path, plates):
+    r = random.Random(5)
+    family = []
+    for p in plates[:40]:
+        family += [look_alike(r, p, CONF), p]
+    reg = sqlite_registry(tmp_path, family)
+    assert reg.best_match("KA MH12AB1234") == ""
+    for p in plates[:40]:
+        text = "KA " + p
+        assert_same_match(text, reg.best_match(text), best_prefer_match(text, set(family)))
+
+
+def test_import_upserts_and_keeps_the_fuzzy_index(tmp_path):
+    reg = sqlite_registry(tmp_path, ["MH12AB1Z34", "MH12AB1234"])
+    reg.import_rows([{"vehicle_no": "mh12ab1234", "maker": "TATA", "color": ""}])
+    assert len(reg) == 2
+    assert reg.get("MH12AB1234") == {"maker": "TATA"}
+    assert reg.get_many(["MH12AB1234", "KA01AB1234", ""]) == {"MH12AB1234": {"maker": "TATA"}}
+    assert reg.best_match("KA MH12AB1234") == "MH12AB1234"
+
+
+def test_plate_sets_resolve_readings_in_one_lookup(tmp_path, plates):
+    prefer = sqlite_registry(tmp_path, plates).prefer()
+    assert plates[0] in prefer and "ZZ99ZZ9999" not in prefer
+    assert prefer.known(plates[:5] + ["ZZ99ZZ9999"]) == set(plates[:5])
+    assert find_best_rc("IND " + plates[3], prefer) == plates[3]
+
+
+def test_find_best_rc_prefers_registry_plates():
+    prefer = MemoryRegistry().prefer()
+    assert "TN10BE8962" in prefer
+    assert find_best_rc("IND TNI0BE8962", prefer) == "TN10BE8962"
+    assert find_best_rc("TNI0BE8962 XY", prefer, prefer_only=True) == "TN10BE8962"
@@ -0,0 +1,160 @@
+import threading
+from collections import Counter
+
+import pytest
+
+import registry
+from normalize import find_best_rc
+from registry import CachedRegistry, RegistryError
+
+CAR = {"maker": "TATA", "model": "ACE"}
+
+
+class FakeRegistry:
+    """Counts upstream calls; `gate` holds them until the test releases it."""
+    name = "FAKE"
+
+    def __init__(self, data=None):
+        self.data = {"TN10BE8962": CAR} if data is None else data
+        self.calls = Counter()
+        self.gate = None
+        self.fail = False
+
+    def __len__(self):
+        return len(self.data)
+
+    def _call(self, kind):
+        self.calls[kind] += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RegistryError("registry unavailable")
+
+    def get(self, plate):
+        self._call("get")
+        return self.data.get(plate)
+
+    def get_many(self, plates):
+        self._call("get_many")
+        return {p: self.data[p] for p in plates if p in self.data}
+
+    def prefer(self):
+        return FakePlateSet(self)
+
+
+class FakePlateSet:
+    def __init__(self, reg):
+        self._reg = reg
+
+    def __contains__(self, plate):
+        return self._reg.get(plate) is not None
+
+    def __bool__(self):
+        return True
+
+    def best_match(self, text):
+        self._reg._call("match")
+        return ""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(registry.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hits_expire_after_ttl(clock):
+    inner = FakeRegistry()
+    reg = CachedRegistry(inner, ttl=60, negative_ttl=5)
+    assert reg.get("TN10BE8962") == CAR
+    clock[0] += 59
+    assert reg.get("TN10BE8962") == CAR
+    assert inner.calls["get"] == 1
+    clock[0] += 2
+    assert reg.get("TN10BE8962") == CAR
+    assert inner.calls["get"] == 2
+
+
+def test_not_found_uses_negative_ttl(clock):
+    inner = FakeRegistry()
+    reg = CachedRegistry(inner, ttl=60, negative_ttl=5)
+    assert reg.get("KA01AB1234") is None
+    clock[0] += 4
+    assert reg.get("KA01AB1234") is None
+    assert inner.calls["get"] == 1
+    clock[0] += 2
+    reg.get("KA01AB1234")
+    assert inner.calls["get"] == 2
+    assert reg.stats()["negative_hits"] == 1
+
+
+def test_lru_bound():
+    inner = FakeRegistry({f"P{i}": CAR for i in range(10)})
+    reg = CachedRegistry(inner, ttl=60, max_entries=3)
+    for i in range(10):
+        reg.get(f"P{i}")
+    assert reg.stats()["entries"] == 3 and reg.stats()["evictions"] == 7
+    reg.get("P9")
+    assert inner.calls["get"] == 10
+
+
+def test_concurrent_lookups_share_one_upstream_call():
+    inner = FakeRegistry()
+    inner.gate = threading.Event()
+    reg = CachedRegistry(inner, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(reg.get("TN10BE8962"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    while reg.stats()["coalesced"] < 7:
+        threading.Event().wait(0.01)
+    inner.gate.set()
+    for t in threads:
+        t.join()
+    assert results == [CAR] * 8
+    assert inner.calls["get"] == 1
+    assert reg.stats()["inflight"] == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    inner = FakeRegistry()
+    inner.gate, inner.fail = threading.Event(), True
+    reg = CachedRegistry(inner, ttl=60)
+    errors = []
+
+    def lookup():
+        try:
+            reg.get("TN10BE8962")
+        except RegistryError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while reg.stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    inner.gate.set()
+    for t in threads:
+        t.join()
+    assert len(errors) == 4 and inner.calls["get"] == 1
+
+    inner.fail = False
+    assert reg.get("TN10BE8962") == CAR
+    assert inner.calls["get"] == 2
+
+
+def test_get_many_only_fetches_what_is_not_cached(clock):
+    inner = FakeRegistry()
+    reg = CachedRegistry(inner, ttl=60, negative_ttl=60)
+    reg.get("TN10BE8962")
+    assert reg.get_many(["TN10BE8962", "KA01AB1234", "TN10BE8962"]) == {"TN10BE8962": CAR}
+    assert reg.get_many(["TN10BE8962", "KA01AB1234"]) == {"TN10BE8962": CAR}
+    assert (inner.calls["get"], inner.calls["get_many"]) == (1, 1)
+
+
+def test_find_best_rc_checks_all_readings_in_one_round_trip():
+    inner = FakeRegistry()
+    prefer = CachedRegistry(inner, ttl=60).prefer()
+    assert find_best_rc("IND TNI0BE8962 TN10BE8962", prefer) == "TN10BE8962"
+    assert inner.calls["get_many"] == 1 and inner.calls["get"] == 0
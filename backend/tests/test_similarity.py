@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from normalize import CONF_COSTS
+from similarity import (levenshtein, weighted_distance, weighted_one_to_many,
+                        weighted_substring_distance, substring_distance)
+
+ALPHABET = "AB01OIS5"
+
+
+def dp(a, b, costs=None):
+    """Textbook O(nm) edit distance: the reference every kernel must agree with."""
+    costs = costs or {}
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [float(i)] + [0.0] * len(b)
+        for j in range(1, len(b) + 1):
+            sub = 0.0 if a[i - 1] == b[j - 1] else costs.get((a[i - 1], b[j - 1]), 1.0)
+            cur[j] = min(prev[j] + 1.0, cur[j - 1] + 1.0, prev[j - 1] + sub)
+        prev = cur
+    return prev[-1]
+
+
+def substrings(s):
+    return [s[i:j] for i in range(len(s) + 1) for j in range(i, len(s) + 1)]
+
+
+def pairs(n, seed=7, max_len=9):
+    r = random.Random(seed)
+    word = lambda: "".join(r.choice(ALPHABET) for _ in range(r.randint(0, max_len)))
+    return [(word(), word()) for _ in range(n)]
+
+
+@pytest.mark.parametrize("a,b", pairs(300))
+def test_levenshtein_matches_dp(a, b):
+    assert levenshtein(a, b) == dp(a, b)
+
+
+@pytest.mark.parametrize("a,b", pairs(200, seed=8))
+def test_levenshtein_cutoff(a, b):
+    d = dp(a, b)
+    got = levenshtein(a, b, cutoff=2)
+    assert got == d if d <= 2 else got == 3
+
+
+@pytest.mark.parametrize("a,b", pairs(300, seed=9))
+def test_weighted_distance_matches_dp(a, b):
+    assert weighted_distance(a, b, CONF_COSTS) == pytest.approx(dp(a, b, CONF_COSTS))
+
+
+@pytest.mark.parametrize("a,b", pairs(300, seed=10))
+def test_weighted_distance_cutoff_never_hides_a_match(a, b):
+    d = dp(a, b, CONF_COSTS)
+    got = weighted_distance(a, b, CONF_COSTS, cutoff=1.5)
+    if d <= 1.5:
+        assert got == pytest.approx(d)
+    else:
+        assert got > 1.5
+
+
+def test_weighted_one_to_many_matches_pairwise():
+    r = random.Random(11)
+    choices = ["".join(r.choice(ALPHABET) for _ in range(r.randint(1, 10))) for _ in range(80)]
+    for q in ("AB01", "OISS5", "", "B0I1SA5O"):
+        got = weighted_one_to_many(q, choices, CONF_COSTS)
+        assert got.tolist() == pytest.approx([dp(q, c, CONF_COSTS) for c in choices])
+
+
+@pytest.mark.parametrize("text,pattern", pairs(200, seed=12, max_len=12))
+def test_myers_substring_distance_matches_dp(text, pattern):
+    assert substring_distance(text, pattern) == min(dp(t, pattern) for t in substrings(text))
+
+
+@pytest.mark.parametrize("text,pattern", pairs(150, seed=13, max_len=10))
+def test_weighted_substring_distance_matches_dp(text, pattern):
+    want = min(dp(t, pattern, CONF_COSTS) for t in substrings(text))
+    assert weighted_substring_distance(text, pattern, CONF_COSTS) == pytest.approx(want)
+
+
+def junk_then_pattern(n, seed):
+    """Texts where the best match starts after leading junk, where a row-minimum exit goes wrong."""
+    r = random.Random(seed)
+    out = []
+    for _ in range(n):
+        pattern = "".join(r.choice(ALPHABET) for _ in range(r.randint(3, 10)))
+        noisy = list(pattern)
+        for _ in range(r.randint(0, 2)):
+            noisy[r.randrange(len(noisy))] = r.choice(ALPHABET)
+        junk = lambda: "".join(r.choice(ALPHABET + "XYZ") for _ in range(r.randint(0, 4)))
+        out.append((junk() + "".join(noisy) + junk(), pattern))
+    return out
+
+
+@pytest.mark.parametrize("cutoff", [0.0, 0.5, 1.5, 2.5])
+def test_weighted_substring_distance_cutoff(cutoff):
+    cases = junk_then_pattern(300, seed=14) + pairs(100, seed=15, max_len=12)
+    for text, pattern in cases:
+        full = weighted_substring_distance(text, pattern, CONF_COSTS)
+        got = weighted_substring_distance(text, pattern, CONF_COSTS, cutoff)
+        if full <= cutoff:
+            assert got == pytest.approx(full), (text, pattern)
+        else:
+            assert got > cutoff, (text, pattern)
+
+
+def test_weighted_substring_distance_leading_junk():
+    assert weighted_substring_distance("ZMH12AB1234", "MH12AB1234", CONF_COSTS, cutoff=0.5) == 0.0
+    assert weighted_substring_distance("KAMH12AB1234", "MH12AB1234", CONF_COSTS, cutoff=2.5) == 0.0
+    assert weighted_substring_distance("XXXXMH12AB1Z34", "MH12AB1234", CONF_COSTS, cutoff=0.25) == 0.25
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+
+# Regions smaller than this are specks / stamp dots, not text
+MIN_W, MIN_H = 12, 8
+# Too many regions means one tesseract process per region costs more than one full page
+MAX_REGIONS = 24
+# If the blocks cover most of the page there is nothing to skip
+MAX_COVERAGE = 0.85
+
+
+def _to_gray(img):
+    if len(img.shape) == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def _merge_overlapping(rects, pad, pad_y=None):
+    # rects: list of (x0, y0, x1, y1); merge anything that overlaps after padding
+    if pad_y is None:
+        pad_y = pad
+    rects = sorted(rects)
+    merged = []
+    for r in rects:
+        x0, y0, x1, y1 = r
+        hit = False
+        for i, (a0, b0, a1, b1) in enumerate(merged):
+            if x0 <= a1 + pad and a0 <= x1 + pad and y0 <= b1 + pad_y and b0 <= y1 + pad_y:
+                merged[i] = (min(a0, x0), min(b0, y0), max(a1, x1), max(b1, y1))
+                hit = True
+                break
+        if not hit:
+            merged.append(r)
+    if len(merged) != len(rects):
+        return _merge_overlapping(merged, pad, pad_y)
+    return merged
+
+
+def detect_text_blocks(img):
+    """
+    Morphological text detector: finds dense stroke areas (text lines / paragraphs)
+    and returns padded block rectangles as (x, y, w, h), top-to-bottom.
+    Returns [] when detection is not worth it, so callers OCR the full page.
+    """
+    if img is None:
+        return []
+
+    gray = _to_gray(img)
+    H, W = gray.shape[:2]
+
+    # Stroke edges light up text and stay dark on flat logos / margins
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    # Join characters into lines, then nearby lines into blocks
+    kw = max(9, W // 60)
+    bw = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kw, 1)))
+    bw = cv2.dilate(bw, cv2.getStructuringElement(cv2.MORPH_RECT, (kw // 2, max(3, H // 150))))
+
+    contours, _ = cv2.findContours(bw, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    rects = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if w < MIN_W or h < MIN_H:
+            continue
+        # sparse blobs after closing are stamps / logo outlines, not text rows
+        fill = cv2.countNonZero(bw[y:y + h, x:x + w]) / float(w * h)
+        if fill < 0.35:
+            continue
+        rects.append((x, y, x + w, y + h))
+
+    if not rects:
+        return []
+
+    pad = max(4, H // 200)
+    # stack neighbouring lines into paragraph blocks: a gap of about one line
+    # height still belongs to the same block
+    line_h = int(np.median([y1 - y0 for _, y0, _, y1 in rects]))
+    rects = _merge_overlapping(rects, pad, max(pad, line_h))
+
+    if len(rects) > MAX_REGIONS:
+        return []
+
+    out = []
+    area = 0
+    for x0, y0, x1, y1 in rects:
+        x0, y0 = max(0, x0 - pad), max(0, y0 - pad)
+        x1, y1 = min(W, x1 + pad), min(H, y1 + pad)
+        out.append((x0, y0, x1 - x0, y1 - y0))
+        area += (x1 - x0) * (y1 - y0)
+
+    if area >= MAX_COVERAGE * W * H:
+        return []
+
+    out.sort(key=lambda r: (r[1], r[0]))
+    return out
@@ -1,12 +1,13 @@
 import re
 
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
 def norm_text(s: str) -> str:
     if not s:
         return ""
     s = s.lower()
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = _NON_ALNUM_RE.sub(" ", s)
+    return " ".join(s.split())
 
 def tokens(s: str):
     s = norm_text(s)
@@ -0,0 +1,242 @@
+"""
+360 movement video verification ("Record 360 Video" processes, step 9).
+
+The MP4 is streamed from GridFS straight into OpenCV's FFmpeg backend
+(OpenCV >= 4.11 reads Python file objects); older builds spool it to a
+temp file in 1 MB chunks. Either way the whole video is never in memory.
+
+Keyframes are sampled as the video is read, then only a 224x224 copy and a
+32x32 grey thumbnail of each keyframe are kept:
+
+    stride  - one frame every VIDEO_SAMPLE_SECONDS
+    scene   - candidates at that stride, kept when the thumbnail differs
+              from the last keyframe by VIDEO_SCENE_DIFF, or after
+              SCENE_MAX_GAP candidates without one (default)
+
+Long videos widen the stride so at most a few times VIDEO_MAX_FRAMES
+candidates are decoded; wide strides seek instead of grabbing every frame.
+Keyframes go to the warm asset classifier (asset_model) in batches of
+VIDEO_BATCH. At most VIDEO_WORKERS videos are decoded at once per process, so
+a queue of uploads waits rather than piling decoders into worker RAM.
+"""
+import io
+import os
+import math
+import time
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import cv2
+
+import asset_model
+
+VIDEO_SAMPLING = os.environ.get("VIDEO_SAMPLING", "scene").strip().lower()
+VIDEO_SAMPLE_SECONDS = float(os.environ.get("VIDEO_SAMPLE_SECONDS", "0.5"))
+VIDEO_MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", "24"))
+VIDEO_SCENE_DIFF = float(os.environ.get("VIDEO_SCENE_DIFF", "12"))
+VIDEO_MIN_MOTION = float(os.environ.get("VIDEO_MIN_MOTION", "4"))
+VIDEO_MIN_MATCH = float(os.environ.get("VIDEO_MIN_MATCH", "0.5"))
+VIDEO_BATCH = int(os.environ.get("VIDEO_BATCH", "8"))
+VIDEO_WORKERS = int(os.environ.get("VIDEO_WORKERS", "1"))
+VIDEO_DECODE_THREADS = int(os.environ.get("VIDEO_DECODE_THREADS", "2"))
+
+SCENE_MAX_GAP = 3            # candidates without a scene change before one is kept anyway
+CANDIDATES_PER_FRAME = 3     # scene mode decodes at most this many candidates per keyframe
+SEEK_MIN_FRAMES = 48         # wider strides seek to the frame instead of grabbing up to it
+THUMB = 32
+SPOOL_CHUNK = 1 << 20
+
+decode_slots = threading.BoundedSemaphore(max(1, VIDEO_WORKERS))
+
+
+# ===========================================================
+#   STREAMING
+# ===========================================================
+class _Stream(io.BufferedIOBase):
+    """BufferedIOBase over a GridOut (or any seekable file object) for cv2.VideoCapture."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def read1(self, size=-1):
+        return self._f.read(size)
+
+    def readinto(self, b):
+        data = self._f.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+
+class open_video:
+    """cv2.VideoCapture over a file object; use as a context manager."""
+
+    def __init__(self, f):
+        self._f = f
+        self._spool = None
+        self.cap = None
+
+    def __enter__(self):
+        params = [cv2.CAP_PROP_N_THREADS, max(1, VIDEO_DECODE_THREADS)]
+        try:
+            self.cap = cv2.VideoCapture(_Stream(self._f), cv2.CAP_FFMPEG, params)
+        except (TypeError, cv2.error, SystemError):
+            self.cap = None
+        if self.cap is None or not self.cap.isOpened():
+            # no stream support in this OpenCV build: spool to disk, not RAM
+            self._f.seek(0)
+            self._spool = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+            shutil.copyfileobj(self._f, self._spool, SPOOL_CHUNK)
+            self._spool.close()
+            self.cap = cv2.VideoCapture(self._spool.name, cv2.CAP_FFMPEG, params)
+        return self.cap
+
+    def __exit__(self, *exc):
+        if self._spool is not None:
+            self.cap.release()
+        # stream-backed captures are freed by dropping the last reference:
+        # release() drops the Python stream without the GIL (OpenCV 5.0)
+        self.cap = None
+        if self._spool is not None:
+            os.unlink(self._spool.name)
+        return False
+
+
+# ===========================================================
+#   KEYFRAMES
+# ===========================================================
+def _thumb(bgr: np.ndarray) -> np.ndarray:
+    grey = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(grey, (THUMB, THUMB), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _candidate_step(fps: float, n_frames: int, mode: str) -> int:
+    step = max(1, int(round(fps * VIDEO_SAMPLE_SECONDS)))
+    budget = VIDEO_MAX_FRAMES * (CANDIDATES_PER_FRAME if mode == "scene" else 1)
+    if n_frames > 0 and n_frames / step > budget:
+        step = int(math.ceil(n_frames / budget))
+    return step
+
+
+def _candidates(cap, step: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """(frame index, BGR frame) every step frames; only those frames are retrieved."""
+    idx = 0
+    while True:
+        if step > SEEK_MIN_FRAMES and idx:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ok, frame = cap.read()
+        if not ok:
+            return
+        yield idx, frame
+        if step <= SEEK_MIN_FRAMES:
+            for _ in range(step - 1):
+                if not cap.grab():
+                    return
+        idx += step
+
+
+def keyframes(cap, mode: str = VIDEO_SAMPLING) -> Iterator[Tuple[float, np.ndarray, np.ndarray]]:
+    """(seconds, 1x3x224x224 classifier batch, grey thumbnail) per keyframe, at most VIDEO_MAX_FRAMES."""
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    step = _candidate_step(fps, n_frames, mode)
+    # spread the keyframe budget over the whole video, not its first seconds
+    min_gap = max(1, math.ceil(n_frames / step / VIDEO_MAX_FRAMES)) if n_frames and mode == "scene" else 1
+
+    kept, since, last = 0, 0, None
+    for idx, frame in _candidates(cap, step):
+        since += 1
+        if last is not None and since < min_gap:
+            continue
+        th = _thumb(frame)
+        if last is not None and mode == "scene" and since < SCENE_MAX_GAP * min_gap \
+                and float(np.abs(th - last).mean()) < VIDEO_SCENE_DIFF:
+            continue
+        yield idx / fps, asset_model.preprocess_frame(frame), th
+        kept, since, last = kept + 1, 0, th
+        if kept >= VIDEO_MAX_FRAMES:
+            return
+
+
+# ===========================================================
+#   VERIFY
+# ===========================================================
+def _classify(clf, batch: List[np.ndarray]) -> List[Tuple[str, float]]:
+    probs = asset_model.softmax(clf.logits(np.concatenate(batch)))
+    top = probs.argmax(axis=1)
+    return [(clf.names[int(t)], float(p[t])) for t, p in zip(top, probs)]
+
+
+def verify_stream(f, expected: str, clf=None) -> Dict[str, Any]:
+    """
+    Sample keyframes of the video in file object f and classify them.
+    score: share of keyframes showing the expected asset (0-100), 0 when the
+    video barely moves (a still shot is not a 360 recording).
+    """
+    t0 = time.perf_counter()
+    expected = (expected or "").lower().strip()
+    with decode_slots:
+        clf = clf or asset_model.get_classifier()
+        labels: Counter = Counter()
+        frames, conf, motion = [], [], []
+        batch: List[np.ndarray] = []
+        prev = None
+        with open_video(f) as cap:
+            if not cap.isOpened():
+                return {"score": 0, "verified": False, "error": "video could not be decoded"}
+            duration = (cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) / (cap.get(cv2.CAP_PROP_FPS) or 25.0)
+            for t, x, th in keyframes(cap):
+                if prev is not None:
+                    motion.append(float(np.abs(th - prev).mean()))
+                prev = th
+                frames.append(round(t, 2))
+                batch.append(x)
+                if len(batch) == VIDEO_BATCH:
+                    for label, p in _classify(clf, batch):
+                        labels[label] += 1
+                        conf.append(p if label.lower().strip() == expected else 0.0)
+                    batch = []
+            if batch:
+                for label, p in _classify(clf, batch):
+                    labels[label] += 1
+                    conf.append(p if label.lower().strip() == expected else 0.0)
+
+    if not frames:
+        return {"score": 0, "verified": False, "error": "no frames decoded"}
+
+    matched = sum(n for label, n in labels.items() if label.lower().strip() == expected)
+    match_ratio = matched / len(frames)
+    mean_motion = float(np.mean(motion)) if motion else 0.0
+    static = mean_motion < VIDEO_MIN_MOTION
+    return {
+        "score": 0 if static else int(round(100 * match_ratio)),
+        "verified": (not static) and match_ratio >= VIDEO_MIN_MATCH,
+        "expected": expected,
+        "keyframes": len(frames),
+        "keyframe_times": frames,
+        "labels": dict(labels.most_common()),
+        "match_ratio": round(match_ratio, 3),
+        "mean_confidence": round(100 * float(np.mean(conf)), 2),
+        "motion": round(mean_motion, 2),
+        "static": static,
+        "duration_s": round(duration, 2),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
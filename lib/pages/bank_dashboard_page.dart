@@ -1081,7 +1081,7 @@ class _BankDashboardPageState extends State<BankDashboardPage> {
                         final url = (snap.data ?? "").trim();
                         if (url.isNotEmpty) {
                           return Image.network(
-                            url,
+                            sizedMediaUrl(url, 96),
                             fit: BoxFit.cover,
                             errorBuilder: (_, __, ___) => Center(
                               child: Text(
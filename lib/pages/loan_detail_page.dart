@@ -1392,7 +1392,7 @@ class _StepCard extends StatelessWidget {
       child: ClipRRect(
         borderRadius: BorderRadius.circular(12),
         child: Image.network(
-          thumbUrl,
+          sizedMediaUrl(thumbUrl, 480),
           height: h,
           width: double.infinity,
           fit: BoxFit.cover,
@@ -1591,7 +1591,7 @@ class _MediaPreviewDialog extends StatelessWidget {
                 minScale: 1,
                 maxScale: 5,
                 child: Image.network(
-                  url,
+                  sizedMediaUrl(url, 1280),
                   fit: BoxFit.contain,
                   errorBuilder: (_, __, ___) => const Center(
                     child: Icon(Icons.broken_image_outlined, color: Colors.white70, size: 48),
@@ -9,6 +9,14 @@ import 'package:path/path.dart' as path;
 // Change this to your Flask host - REMOVED trailing slash to prevent double slashes
 const String kBaseUrl = 'http://172.20.10.11:5000/';
 
+/// `/media/<id>` URL for a thumbnail about [width] px wide (the server snaps
+/// it to one of its cached sizes). Other URLs are returned unchanged.
+String sizedMediaUrl(String url, int width) {
+  if (!url.contains('/media/')) return url;
+  final uri = Uri.parse(url);
+  return uri.replace(queryParameters: {...uri.queryParameters, 'w': '$width'}).toString();
+}
+
 final Connectivity _connectivity = Connectivity();
 
 Future<void> _checkConnectivity() async {